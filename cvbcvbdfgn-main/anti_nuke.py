@@ -0,0 +1,325 @@
+"""
+Защита от уничтожения сервера (anti-nuke) для Discord бота
+Записи журнала аудита приходят событием сразу после действия и сводятся в одно
+скользящее окно на исполнителя: баны, кики, тайм-ауты, удаления каналов и ролей,
+выдача опасных прав, создание вебхуков и массовое снятие ролей. Как только взвешенная
+сумма окна достигает порога, у исполнителя в том же обработчике снимаются роли с
+опасными правами, а время до сдерживания измеряется и попадает в отчет
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+from event_bus import setup_event_bus, PRIORITY_PROTECTION
+
+logger = logging.getLogger('anti_nuke')
+
+CONTAINED_FILE = "anti_nuke_contained.json"
+WINDOW = 30  # Окно исполнителя (секунды)
+THRESHOLD = 10.0  # Взвешенная сумма действий в окне, при которой исполнитель сдерживается
+MAX_ACTORS = 10_000
+MAX_WINDOW_EVENTS = 200
+REPORT_HISTORY = 20
+
+# Вклад действий в окно: 5 банов, 3 удаления каналов или 2 выдачи опасных прав за 30 секунд
+WEIGHTS = {
+    'ban': 2.0,
+    'kick': 2.0,
+    'timeout': 1.0,
+    'role_removal': 1.0,
+    'webhook_create': 3.0,
+    'channel_delete': 4.0,
+    'role_delete': 4.0,
+    'escalation': 5.0
+}
+
+# Права, выдача которых считается эскалацией и роли с которыми снимаются при сдерживании
+DANGEROUS_PERMISSIONS = discord.Permissions(
+    administrator=True,
+    manage_guild=True,
+    manage_roles=True,
+    manage_channels=True,
+    manage_webhooks=True,
+    ban_members=True,
+    kick_members=True,
+    moderate_members=True,
+    mention_everyone=True
+)
+
+# Пользователи, действия которых не сдерживаются (кроме владельца сервера и самого бота)
+TRUSTED_USERS: List[int] = []
+
+
+def _permissions_value(value) -> int:
+    return value.value if isinstance(value, discord.Permissions) else 0
+
+
+def _dangerous_role(guild: discord.Guild, role) -> bool:
+    if not isinstance(role, discord.Role):
+        role = guild.get_role(role.id)
+    return role is not None and bool(role.permissions.value & DANGEROUS_PERMISSIONS.value)
+
+
+def classify_entry(entry: discord.AuditLogEntry) -> Optional[str]:
+    """Вид действия записи журнала аудита или None, если оно не интересно"""
+    action = entry.action
+    actions = discord.AuditLogAction
+    if action == actions.ban:
+        return 'ban'
+    if action == actions.kick:
+        return 'kick'
+    if action == actions.channel_delete:
+        return 'channel_delete'
+    if action == actions.role_delete:
+        return 'role_delete'
+    if action == actions.webhook_create:
+        return 'webhook_create'
+    if action == actions.member_update:
+        return 'timeout' if getattr(entry.after, 'timed_out_until', None) else None
+    if action in (actions.role_update, actions.role_create):
+        before = _permissions_value(getattr(entry.before, 'permissions', None))
+        after = _permissions_value(getattr(entry.after, 'permissions', None))
+        return 'escalation' if after & ~before & DANGEROUS_PERMISSIONS.value else None
+    if action == actions.member_role_update:
+        # В изменениях before.roles - снятые роли, after.roles - выданные
+        if any(_dangerous_role(entry.guild, role) for role in getattr(entry.after, 'roles', None) or ()):
+            return 'escalation'
+        if getattr(entry.before, 'roles', None):
+            return 'role_removal'
+    return None
+
+
+class ActorWindow:
+    """Действия одного исполнителя за последние WINDOW секунд"""
+
+    __slots__ = ('events', 'score', 'contained')
+
+    def __init__(self):
+        self.events = deque(maxlen=MAX_WINDOW_EVENTS)  # (монотонное время, вид, вес, время записи)
+        self.score = 0.0
+        self.contained = False
+
+    def add(self, now: float, kind: str, weight: float, created_at):
+        self.expire(now)
+        if len(self.events) == self.events.maxlen:
+            self.score -= self.events[0][2]
+        self.events.append((now, kind, weight, created_at))
+        self.score += weight
+
+    def expire(self, now: float):
+        cutoff = now - WINDOW
+        while self.events and self.events[0][0] < cutoff:
+            self.score -= self.events.popleft()[2]
+        if not self.events:
+            self.score = 0.0
+            self.contained = False
+
+    def breakdown(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for _, kind, _, _ in self.events:
+            counts[kind] = counts.get(kind, 0) + 1
+        return counts
+
+
+class AntiNukeCorrelator:
+    """Окна действий исполнителей и мгновенное сдерживание"""
+
+    def __init__(self, bot, storage_file: str = CONTAINED_FILE):
+        self.bot = bot
+        self.storage_file = storage_file
+        self.windows: 'OrderedDict[tuple, ActorWindow]' = OrderedDict()  # (сервер, исполнитель) -> окно
+        # Снятые роли для возврата администратором: сервер -> исполнитель -> id ролей
+        self.contained: Dict[int, Dict[int, List[int]]] = {}
+        self.reports: List[Dict] = []
+        # Вызывается после сдерживания: (сервер, id исполнителя, отчет)
+        self.on_contained: Optional[Callable[..., Awaitable]] = None
+        self.stats = {'entries': 0, 'correlated': 0, 'contained': 0, 'failed': 0}
+        self._load()
+
+    # --- Корреляция ---
+
+    def is_exempt(self, guild: discord.Guild, actor_id: int) -> bool:
+        if self.bot.user and actor_id == self.bot.user.id:
+            return True
+        return actor_id == guild.owner_id or actor_id in TRUSTED_USERS
+
+    async def observe(self, entry: discord.AuditLogEntry) -> Optional[Dict]:
+        """Учитывает запись журнала аудита; возвращает отчет, если исполнитель только что сдержан"""
+        self.stats['entries'] += 1
+        if entry.user_id is None or self.is_exempt(entry.guild, entry.user_id):
+            return None
+        kind = classify_entry(entry)
+        if kind is None:
+            return None
+        return await self.observe_action(entry.guild, entry.user_id, kind, created_at=entry.created_at)
+
+    async def observe_action(self, guild: discord.Guild, actor_id: int, kind: str, count: int = 1,
+                             created_at=None) -> Optional[Dict]:
+        """Учитывает count действий вида kind за исполнителем, в том числе выполненных ботом по его команде"""
+        received = time.monotonic()
+        if self.is_exempt(guild, actor_id):
+            return None
+        self.stats['correlated'] += 1
+
+        key = (guild.id, actor_id)
+        window = self.windows.get(key)
+        if window is None:
+            if len(self.windows) >= MAX_ACTORS:
+                self.windows.popitem(last=False)
+            window = self.windows[key] = ActorWindow()
+        else:
+            self.windows.move_to_end(key)
+        created_at = created_at or discord.utils.utcnow()
+        for _ in range(min(count, MAX_WINDOW_EVENTS)):
+            window.add(received, kind, WEIGHTS[kind], created_at)
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.increment('anti_nuke_events', kind, count)
+
+        if window.contained or window.score < THRESHOLD:
+            return None
+        # Сдерживание в том же обработчике, без очереди и таймеров
+        window.contained = True
+        return await self.contain(guild, actor_id, window, received)
+
+    def is_contained(self, guild_id: int, actor_id: int) -> bool:
+        window = self.windows.get((guild_id, actor_id))
+        return window is not None and window.contained
+
+    # --- Сдерживание ---
+
+    async def contain(self, guild: discord.Guild, actor_id: int, window: ActorWindow, received: float) -> Dict:
+        """Снимает с исполнителя роли с опасными правами (бота без таких ролей - выгоняет)"""
+        member = guild.get_member(actor_id)
+        stripped = []
+        outcome = "не найден на сервере"
+        try:
+            if member is not None:
+                top_role = guild.me.top_role if guild.me else None
+                keep, stripped = [], []
+                for role in member.roles:
+                    if role.is_default():
+                        continue
+                    removable = not role.managed and (top_role is None or role < top_role)
+                    if removable and role.permissions.value & DANGEROUS_PERMISSIONS.value:
+                        stripped.append(role)
+                    else:
+                        keep.append(role)
+                reason = f"Anti-nuke: {window.score:.0f} очков действий за {WINDOW} с"
+                if stripped:
+                    await member.edit(roles=keep, reason=reason)
+                    outcome = "роли сняты"
+                elif member.bot:
+                    # Права бота приходят из его управляемой роли - снять их нельзя
+                    await member.kick(reason=reason)
+                    outcome = "бот выгнан"
+                else:
+                    outcome = "нет ролей, которые можно снять"
+        except Exception as e:
+            self.stats['failed'] += 1
+            outcome = f"ошибка: {e}"
+            logger.error(f"Ошибка сдерживания исполнителя {actor_id}: {e}")
+
+        contained_at = time.monotonic()
+        first_created = window.events[0][3]
+        report = {
+            'guild_id': guild.id,
+            'actor_id': actor_id,
+            'score': round(window.score, 1),
+            'actions': window.breakdown(),
+            'stripped': [role.id for role in stripped],
+            'outcome': outcome,
+            # Реакция бота: от получения записи, на которой пройден порог, до конца сдерживания
+            'reaction': contained_at - received,
+            # Полное время: от первого действия окна по часам Discord до конца сдерживания
+            'time_to_contain': time.time() - first_created.timestamp() if first_created else None
+        }
+        if stripped:
+            self.stats['contained'] += 1
+            self.contained.setdefault(guild.id, {})[actor_id] = report['stripped']
+            self._save()
+        self.reports = (self.reports + [report])[-REPORT_HISTORY:]
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.observe('anti_nuke_contain', 'reaction', report['reaction'])
+            if report['time_to_contain'] is not None:
+                self.bot.metrics.observe('anti_nuke_contain', 'total', report['time_to_contain'])
+        logger.warning(f"Anti-nuke: исполнитель {actor_id} ({report['actions']}) - {outcome}, "
+                       f"реакция {report['reaction'] * 1000:.0f} мс")
+
+        if self.on_contained:
+            try:
+                await self.on_contained(guild, actor_id, report)
+            except Exception as e:
+                logger.error(f"Ошибка уведомления о сдерживании: {e}")
+        return report
+
+    async def restore(self, guild: discord.Guild, member: discord.Member, reason: Optional[str] = None) -> List:
+        """Возвращает участнику роли, снятые при сдерживании"""
+        role_ids = self.contained.get(guild.id, {}).get(member.id)
+        if not role_ids:
+            return []
+        roles = [role for role in (guild.get_role(role_id) for role_id in role_ids) if role is not None]
+        if roles:
+            await member.add_roles(*roles, reason=reason)
+        del self.contained[guild.id][member.id]
+        self.windows.pop((guild.id, member.id), None)
+        self._save()
+        return roles
+
+    def install_listeners(self):
+        bus = setup_event_bus(self.bot)
+
+        @bus.listen(priority=PRIORITY_PROTECTION, name='anti_nuke.on_audit_log_entry_create')
+        async def on_audit_log_entry_create(entry):
+            try:
+                await self.observe(entry)
+            except Exception as e:
+                logger.error(f"Ошибка обработки записи журнала аудита: {e}")
+
+    # --- Сохранение ---
+
+    def _load(self):
+        if not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.contained = {int(guild_id): {int(actor_id): roles for actor_id, roles in actors.items()}
+                              for guild_id, actors in data.items()}
+        except Exception as e:
+            logger.error(f"Ошибка загрузки сдержанных исполнителей: {e}")
+
+    def _save(self):
+        try:
+            data = {str(guild_id): {str(actor_id): roles for actor_id, roles in actors.items()}
+                    for guild_id, actors in self.contained.items() if actors}
+            temp_file = f"{self.storage_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.storage_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения сдержанных исполнителей: {e}")
+
+    def get_stats(self) -> Dict:
+        reactions = sorted(report['reaction'] for report in self.reports)
+        return {
+            'actors': len(self.windows),
+            'contained_now': sum(len(actors) for actors in self.contained.values()),
+            'reaction_p50': reactions[len(reactions) // 2] if reactions else None,
+            'reaction_max': reactions[-1] if reactions else None,
+            **self.stats
+        }
+
+
+def get_anti_nuke(bot) -> AntiNukeCorrelator:
+    """Возвращает защиту от уничтожения сервера, создавая и подписывая её при первом обращении"""
+    if not hasattr(bot, 'anti_nuke'):
+        correlator = AntiNukeCorrelator(bot)
+        bot.anti_nuke = correlator
+        correlator.install_listeners()
+    return bot.anti_nuke
@@ -0,0 +1,286 @@
+"""
+Зеркало вложений для Discord бота
+Ссылки CDN перестают работать вскоре после удаления сообщения, поэтому вложения
+скачиваются заранее: потоком через aiohttp, не больше MAX_CONCURRENT_DOWNLOADS сразу,
+в локальный кэш с адресацией по sha256. Одинаковые файлы хранятся один раз, а при
+превышении DISK_BUDGET вытесняются давно не использованные
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import aiohttp
+import discord
+
+from sqlite_store import get_sqlite_store
+
+logger = logging.getLogger('attachment_mirror')
+
+MIRROR_DIR = "attachment_mirror"
+DATABASE_FILE = os.path.join(MIRROR_DIR, "index.db")
+DISK_BUDGET = 2 * 1024 ** 3  # Байт на диске под вложения
+MAX_FILE_SIZE = 10 * 1024 ** 2  # Вложения больше не скачиваются (лимит загрузки сервера без бустов)
+ALLOWED_TYPES = ('image/', 'video/', 'audio/', 'text/plain', 'application/pdf')  # Префиксы content-type
+MAX_CONCURRENT_DOWNLOADS = 4
+MAX_QUEUED = 500  # Скачиваний в очереди; сверх этого новые вложения пропускаются
+CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=120, sock_read=30)
+MAX_FILES_PER_MESSAGE = 10  # Ограничение Discord на файлы в одном сообщении
+RECENT_REFS = 10_000  # Недавние вложения в памяти, чтобы не ходить в базу
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attachment_blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attachment_refs (
+    attachment_id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+"""
+
+BLOB_SQL = "INSERT OR REPLACE INTO attachment_blobs (sha256, size, last_used) VALUES (?, ?, ?)"
+TOUCH_SQL = "UPDATE attachment_blobs SET last_used = ? WHERE sha256 = ?"
+EVICT_SQL = "DELETE FROM attachment_blobs WHERE sha256 = ?"
+REF_SQL = "INSERT OR REPLACE INTO attachment_refs (attachment_id, sha256) VALUES (?, ?)"
+ORPHAN_REFS_SQL = "DELETE FROM attachment_refs WHERE sha256 NOT IN (SELECT sha256 FROM attachment_blobs)"
+
+
+def describe_attachment(attachment: discord.Attachment) -> Dict:
+    """Данные вложения для резервной копии сообщения"""
+    return {
+        'id': attachment.id,
+        'filename': attachment.filename,
+        'url': attachment.url,
+        'content_type': attachment.content_type,
+        'size': attachment.size
+    }
+
+
+class AttachmentMirror:
+    """Локальные копии вложений с адресацией по содержимому"""
+
+    def __init__(self, bot, directory: str = MIRROR_DIR):
+        self.bot = bot
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.store = get_sqlite_store(bot, os.path.join(directory, os.path.basename(DATABASE_FILE)), SCHEMA)
+        self.blobs: 'OrderedDict[str, int]' = OrderedDict()  # sha256 -> размер, от давно не использованных
+        self.disk_used = 0
+        self.refs: 'OrderedDict[int, str]' = OrderedDict()  # id вложения -> sha256 (недавние)
+        self.inflight: Dict[int, asyncio.Task] = {}
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {'mirrored': 0, 'deduplicated': 0, 'skipped': 0, 'dropped': 0,
+                      'failed': 0, 'evicted': 0, 'restored_files': 0}
+        self._load()
+
+    def _load(self):
+        """Читает индекс и сверяет его с файлами на диске"""
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+        try:
+            rows = self.store.query("SELECT sha256, size FROM attachment_blobs ORDER BY last_used")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки индекса вложений: {e}")
+            return
+        for sha, size in rows:
+            if os.path.exists(self.path_for(sha)):
+                self.blobs[sha] = size
+                self.disk_used += size
+            else:
+                self.store.execute_later(EVICT_SQL, (sha,))
+        if len(self.blobs) != len(rows):
+            self.store.execute_later(ORPHAN_REFS_SQL)
+
+    def path_for(self, sha: str) -> str:
+        return os.path.join(self.directory, sha[:2], sha)
+
+    # --- Скачивание ---
+
+    @staticmethod
+    def eligible(info: Dict) -> bool:
+        content_type = info.get('content_type') or ''
+        return (info.get('size') or 0) <= MAX_FILE_SIZE and content_type.startswith(ALLOWED_TYPES)
+
+    def submit(self, info: Dict):
+        """Ставит вложение в очередь скачивания; повторные и неподходящие пропускаются"""
+        attachment_id = info['id']
+        if attachment_id in self.inflight or attachment_id in self.refs:
+            return
+        if not self.eligible(info):
+            self.stats['skipped'] += 1
+            return
+        if len(self.inflight) >= MAX_QUEUED:
+            self.stats['dropped'] += 1
+            return
+        task = asyncio.create_task(self._mirror(info))
+        self.inflight[attachment_id] = task
+        task.add_done_callback(lambda _: self.inflight.pop(attachment_id, None))
+
+    async def _mirror(self, info: Dict) -> Optional[str]:
+        sha = self._lookup(info['id'])
+        if sha is not None:
+            self._remember(info['id'], sha)
+            return sha
+        async with self.semaphore:
+            try:
+                sha = await self._download(info['url'])
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Ошибка скачивания вложения {info['id']}: {e}")
+                return None
+        if sha is None:
+            return None
+        self._remember(info['id'], sha)
+        self.store.insert(REF_SQL, (info['id'], sha))
+        return sha
+
+    async def _download(self, url: str) -> Optional[str]:
+        """Скачивает файл потоком, считая sha256 на лету; возвращает хэш или None"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=DOWNLOAD_TIMEOUT)
+        digest = hashlib.sha256()
+        size = 0
+        temp_file = os.path.join(self.directory, f"{os.urandom(8).hex()}.tmp")
+        try:
+            async with self.session.get(url) as response:
+                if response.status != 200:
+                    self.stats['failed'] += 1
+                    return None
+                if (response.content_length or 0) > MAX_FILE_SIZE:
+                    self.stats['skipped'] += 1
+                    return None
+                with open(temp_file, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > MAX_FILE_SIZE:
+                            self.stats['skipped'] += 1
+                            return None
+                        digest.update(chunk)
+                        f.write(chunk)
+
+            sha = digest.hexdigest()
+            if sha in self.blobs:
+                self.stats['deduplicated'] += 1
+                self._touch(sha)
+                return sha
+            os.makedirs(os.path.dirname(self.path_for(sha)), exist_ok=True)
+            os.replace(temp_file, self.path_for(sha))
+            self.blobs[sha] = size
+            self.disk_used += size
+            self.store.insert(BLOB_SQL, (sha, size, time.time()))
+            self.stats['mirrored'] += 1
+            if hasattr(self.bot, 'metrics'):
+                self.bot.metrics.increment('attachment_mirror_bytes', 'downloaded', size)
+            self._evict()
+            return sha
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    # --- Индекс ---
+
+    def _remember(self, attachment_id: int, sha: str):
+        self.refs[attachment_id] = sha
+        self.refs.move_to_end(attachment_id)
+        if len(self.refs) > RECENT_REFS:
+            self.refs.popitem(last=False)
+
+    def _lookup(self, attachment_id: int) -> Optional[str]:
+        """sha256 скачанного вложения, если файл еще в кэше"""
+        sha = self.refs.get(attachment_id)
+        if sha is None:
+            try:
+                row = self.store.query_one("SELECT sha256 FROM attachment_refs WHERE attachment_id = ?",
+                                           (attachment_id,))
+            except Exception as e:
+                logger.error(f"Ошибка чтения индекса вложений: {e}")
+                row = None
+            sha = row[0] if row else None
+        return sha if sha in self.blobs else None
+
+    def _touch(self, sha: str):
+        self.blobs.move_to_end(sha)
+        self.store.execute_later(TOUCH_SQL, (time.time(), sha))
+
+    def _evict(self):
+        """Удаляет давно не использованные файлы, пока кэш больше DISK_BUDGET"""
+        evicted = 0
+        while self.disk_used > DISK_BUDGET and len(self.blobs) > 1:
+            sha, size = self.blobs.popitem(last=False)
+            self.disk_used -= size
+            try:
+                os.remove(self.path_for(sha))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Ошибка удаления вложения {sha}: {e}")
+            self.store.execute_later(EVICT_SQL, (sha,))
+            evicted += 1
+        if evicted:
+            self.store.execute_later(ORPHAN_REFS_SQL)
+            self.stats['evicted'] += evicted
+
+    # --- Восстановление ---
+
+    async def local_file(self, info: Dict) -> Optional[str]:
+        """Путь к локальной копии вложения; дожидается скачивания, если оно еще идет"""
+        task = self.inflight.get(info['id'])
+        if task is not None:
+            try:
+                await asyncio.shield(task)
+            except Exception:
+                pass
+        sha = self._lookup(info['id'])
+        if sha is None:
+            return None
+        self._touch(sha)
+        return self.path_for(sha)
+
+    async def files_for(self, attachments: List, size_limit: int = MAX_FILE_SIZE) -> List[discord.File]:
+        """Файлы для повторной загрузки в пределах лимита сервера; ссылки старых копий пропускаются"""
+        files = []
+        total = 0
+        for info in attachments:
+            if not isinstance(info, dict) or len(files) >= MAX_FILES_PER_MESSAGE:
+                continue
+            path = await self.local_file(info)
+            if path is None:
+                continue
+            size = self.blobs.get(os.path.basename(path), 0)
+            if total + size > size_limit:
+                continue
+            total += size
+            files.append(discord.File(path, filename=info['filename']))
+        self.stats['restored_files'] += len(files)
+        return files
+
+    async def close(self):
+        for task in list(self.inflight.values()):
+            task.cancel()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    def get_stats(self) -> Dict:
+        return {
+            'files': len(self.blobs),
+            'disk_used': self.disk_used,
+            'disk_budget': DISK_BUDGET,
+            'downloading': len(self.inflight),
+            **self.stats
+        }
+
+
+def get_attachment_mirror(bot) -> AttachmentMirror:
+    """Возвращает зеркало вложений бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'attachment_mirror'):
+        bot.attachment_mirror = AttachmentMirror(bot)
+    return bot.attachment_mirror
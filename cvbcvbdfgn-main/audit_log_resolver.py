@@ -0,0 +1,261 @@
+"""
+Общий поиск записей журнала аудита для Discord бота
+Записи приходят через событие on_audit_log_entry_create и пачками через REST,
+хранятся в индексе (сервер, действие, цель) с ограниченным временем жизни,
+а обработчики событий ждут нужную запись вместо отдельного запроса audit_logs(limit=1)
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from event_bus import setup_event_bus, PRIORITY_PROTECTION
+
+logger = logging.getLogger('audit_log_resolver')
+
+FRESHNESS_WINDOW = 30  # Запись старше этого возраста (секунды) не относится к текущему событию
+WAIT_TIMEOUT = 5.0  # Сколько обработчик ждет запись (секунды)
+FETCH_DELAY = 0.5  # Пауза перед первым REST-запросом: за это время запись обычно приходит событием
+FETCH_ATTEMPTS = 3  # Сколько REST-запросов делается ради одного ожидающего (с удвоением паузы)
+FETCH_LIMIT = 100  # Записей за один запрос (одна страница API)
+INDEX_TTL = 600  # Время жизни записи в индексе (секунды)
+MAX_INDEX_KEYS = 5000
+ENTRIES_PER_KEY = 5  # Последние записи на ключ: у одного участника может быть несколько изменений подряд
+
+
+class AuditLogWaiter:
+    """Обработчик, ожидающий запись журнала аудита"""
+
+    __slots__ = ('action', 'target_id', 'check', 'max_age', 'future', 'fetches')
+
+    def __init__(self, action, target_id, check, max_age, future):
+        self.action = action
+        self.target_id = target_id
+        self.check = check
+        self.max_age = max_age
+        self.future = future
+        self.fetches = 0
+
+
+class AuditLogResolver:
+    """Индекс записей журнала аудита с объединением запросов по серверу"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        # (сервер, действие, цель или None) -> последние записи (время получения, запись)
+        self.index: 'OrderedDict[Tuple[int, discord.AuditLogAction, Optional[int]], deque]' = OrderedDict()
+        self.waiters: Dict[int, List[AuditLogWaiter]] = {}
+        self.fetch_tasks: Dict[int, asyncio.Task] = {}
+        self.last_fetched: Dict[Tuple[int, Optional[discord.AuditLogAction]], int] = {}
+        self.forbidden_warned = set()
+        self.stats = {
+            'lookups': 0,
+            'index_hits': 0,
+            'pushed': 0,
+            'fetches': 0,
+            'fetched_entries': 0,
+            'resolved_by_wait': 0,
+            'timeouts': 0
+        }
+
+    # --- Поиск ---
+
+    async def resolve(self, guild: discord.Guild, action: discord.AuditLogAction, target_id: Optional[int] = None, *,
+                      check: Optional[Callable] = None, max_age: float = FRESHNESS_WINDOW,
+                      timeout: float = WAIT_TIMEOUT) -> Optional[discord.AuditLogEntry]:
+        """Возвращает свежую запись журнала аудита для действия над целью.
+
+        target_id=None означает последнюю запись этого действия на сервере.
+        check - дополнительное условие для записи. При timeout=0 проверяется только индекс,
+        без ожидания и REST-запросов. Возвращает None, если запись не найдена за timeout.
+        """
+        self.stats['lookups'] += 1
+        entry = self._lookup(guild.id, action, target_id, check, max_age)
+        if entry is not None:
+            self.stats['index_hits'] += 1
+            self._count('index_hit')
+            return entry
+        if timeout <= 0:
+            return None
+
+        waiter = AuditLogWaiter(action, target_id, check, max_age, asyncio.get_running_loop().create_future())
+        self.waiters.setdefault(guild.id, []).append(waiter)
+        self._ensure_fetch(guild)
+        try:
+            entry = await asyncio.wait_for(waiter.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            entry = None
+        finally:
+            waiters = self.waiters.get(guild.id)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+
+        if entry is None:
+            self.stats['timeouts'] += 1
+            self._count('not_found')
+        else:
+            self.stats['resolved_by_wait'] += 1
+            self._count('resolved')
+        return entry
+
+    def _lookup(self, guild_id: int, action, target_id, check, max_age) -> Optional[discord.AuditLogEntry]:
+        bucket = self.index.get((guild_id, action, target_id))
+        if not bucket:
+            return None
+        for _, entry in reversed(bucket):
+            if self._matches(entry, check, max_age):
+                return entry
+        return None
+
+    @staticmethod
+    def _matches(entry: discord.AuditLogEntry, check, max_age: float) -> bool:
+        if (discord.utils.utcnow() - entry.created_at).total_seconds() > max_age:
+            return False
+        if check is not None:
+            try:
+                return bool(check(entry))
+            except Exception:
+                return False
+        return True
+
+    def _count(self, outcome: str):
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.increment('audit_log_lookups', outcome)
+
+    # --- Индекс ---
+
+    def add_entry(self, entry: discord.AuditLogEntry, pushed: bool = False):
+        """Добавляет запись в индекс и отдает её ожидающим обработчикам"""
+        guild_id = entry.guild.id
+        target_id = getattr(entry.target, 'id', None)
+        now = time.monotonic()
+
+        keys = [(guild_id, entry.action, None)]
+        if target_id is not None:
+            keys.append((guild_id, entry.action, target_id))
+        for key in keys:
+            bucket = self.index.get(key)
+            if bucket is None:
+                bucket = self.index[key] = deque(maxlen=ENTRIES_PER_KEY)
+            else:
+                self.index.move_to_end(key)
+            if any(existing.id == entry.id for _, existing in bucket):
+                continue
+            bucket.append((now, entry))
+            # Записи из REST приходят от новых к старым; держим бакет упорядоченным по id
+            if len(bucket) > 1 and bucket[-2][1].id > entry.id:
+                ordered = sorted(bucket, key=lambda item: item[1].id)
+                bucket.clear()
+                bucket.extend(ordered)
+        self._purge(now)
+
+        if pushed:
+            self.stats['pushed'] += 1
+        self._wake_waiters(guild_id, entry, target_id)
+
+    def _wake_waiters(self, guild_id: int, entry: discord.AuditLogEntry, target_id: Optional[int]):
+        waiters = self.waiters.get(guild_id)
+        if not waiters:
+            return
+        for waiter in waiters:
+            if waiter.future.done() or waiter.action != entry.action:
+                continue
+            if waiter.target_id is not None and waiter.target_id != target_id:
+                continue
+            if self._matches(entry, waiter.check, waiter.max_age):
+                waiter.future.set_result(entry)
+
+    def _purge(self, now: float):
+        """Удаляет устаревшие ключи с начала индекса (в начале - давно не обновлявшиеся)"""
+        while self.index:
+            key, bucket = next(iter(self.index.items()))
+            if len(self.index) <= MAX_INDEX_KEYS and bucket and now - bucket[-1][0] < INDEX_TTL:
+                break
+            self.index.popitem(last=False)
+
+    # --- REST-запросы ---
+
+    def _ensure_fetch(self, guild: discord.Guild):
+        task = self.fetch_tasks.get(guild.id)
+        if task is None or task.done():
+            self.fetch_tasks[guild.id] = asyncio.create_task(self._fetch_loop(guild))
+
+    async def _fetch_loop(self, guild: discord.Guild):
+        """Один цикл запросов на сервер: все ожидающие обслуживаются общими запросами"""
+        try:
+            while True:
+                pending = [waiter for waiter in self.waiters.get(guild.id, [])
+                           if not waiter.future.done() and waiter.fetches < FETCH_ATTEMPTS]
+                if not pending:
+                    return
+                await asyncio.sleep(FETCH_DELAY * 2 ** min(waiter.fetches for waiter in pending))
+
+                pending = [waiter for waiter in pending if not waiter.future.done()]
+                if not pending:
+                    continue
+                for waiter in pending:
+                    waiter.fetches += 1
+                await self._fetch(guild, {waiter.action for waiter in pending})
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка цикла запросов журнала аудита сервера {guild.id}: {e}")
+
+    async def _fetch(self, guild: discord.Guild, actions: set):
+        """Загружает новые записи одной страницей; при одном действии запрос фильтруется по нему"""
+        action = next(iter(actions)) if len(actions) == 1 else None
+        stop_id = max(self.last_fetched.get((guild.id, None), 0), self.last_fetched.get((guild.id, action), 0))
+        newest_id = None
+        self.stats['fetches'] += 1
+        try:
+            async for entry in guild.audit_logs(limit=FETCH_LIMIT, action=action):
+                if entry.id <= stop_id:
+                    break
+                if newest_id is None:
+                    newest_id = entry.id
+                self.stats['fetched_entries'] += 1
+                self.add_entry(entry)
+        except discord.Forbidden:
+            if guild.id not in self.forbidden_warned:
+                self.forbidden_warned.add(guild.id)
+                logger.warning(f"Нет доступа к журналу аудита сервера {guild.name}")
+            for waiter in self.waiters.get(guild.id, []):
+                if not waiter.future.done():
+                    waiter.future.set_result(None)
+            return
+        except discord.HTTPException as e:
+            logger.error(f"Ошибка загрузки журнала аудита сервера {guild.name}: {e}")
+            return
+
+        if newest_id is not None:
+            self.last_fetched[(guild.id, action)] = newest_id
+
+    def get_stats(self) -> Dict:
+        return {
+            'index_keys': len(self.index),
+            'waiting': sum(len(waiters) for waiters in self.waiters.values()),
+            **self.stats
+        }
+
+
+def setup_audit_log_resolver(bot) -> AuditLogResolver:
+    """Возвращает общий поиск по журналу аудита, создавая и подписывая его при первом обращении"""
+    if not hasattr(bot, 'audit_log_resolver'):
+        resolver = AuditLogResolver(bot)
+        bot.audit_log_resolver = resolver
+
+        async def on_audit_log_entry_create(entry):
+            # В событии пользователь известен только если он есть в кэше; такие записи придут через REST
+            if entry.user is None:
+                return
+            resolver.add_entry(entry, pushed=True)
+
+        setup_event_bus(bot).subscribe('on_audit_log_entry_create', on_audit_log_entry_create,
+                                       priority=PRIORITY_PROTECTION, name='audit_log_resolver')
+        logger.info("Поиск по журналу аудита создан")
+    return bot.audit_log_resolver
@@ -28,6 +28,7 @@ import difflib
 import subprocess
 import sys
 from collections import defaultdict, Counter
+from event_bus import setup_event_bus, PRIORITY_CORE
 
 logger = logging.getLogger('auto_recovery')
 
@@ -2910,7 +2911,8 @@ async def setup_auto_recovery(bot):
         await auto_recovery.setup()
         
         # Добавляем глобальный обработчик ошибок кнопок
-        @bot.event
+        bus = setup_event_bus(bot)
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_error(event, *args, **kwargs):
             try:
                 # Проверяем, связана ли ошибка с кнопками
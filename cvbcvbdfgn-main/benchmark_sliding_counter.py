@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Сравнение счетчиков спама: прежние deque с datetime и кольцевые корзины sliding_counter
+Моделирует поток сообщений от 100 000 активных пользователей и печатает стоимость
+одного сообщения и память на всех пользователей. Запуск: python benchmark_sliding_counter.py
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+from sliding_counter import SlidingCounterMap
+
+
+def make_stream(users: int, messages: int, duration: float, seed: int = 1):
+    """Сообщения (время, пользователь) в порядке времени; активность пользователей неравномерна"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** 0.5 for rank in range(users)]
+    authors = rng.choices(range(users), weights=weights, k=messages)
+    # Каждый пользователь хотя бы раз пишет в начале, чтобы все 100k были активны
+    authors[:users] = range(users)
+    step = duration / messages
+    return [(index * step, author) for index, author in enumerate(authors)]
+
+
+def run_deque(stream, base: datetime):
+    """Прежний вариант: deque времен на пользователя и подсчет перебором"""
+    user_messages = defaultdict(deque)
+    cutoff_delta = timedelta(minutes=1)
+    start = time.perf_counter()
+    for offset, user_id in stream:
+        now = base + timedelta(seconds=offset)
+        user_messages[user_id].append(now)
+        cutoff = now - cutoff_delta
+        sum(1 for msg_time in user_messages[user_id] if msg_time > cutoff)
+    return time.perf_counter() - start, user_messages
+
+
+def run_counter(stream):
+    """Новый вариант: кольцо посекундных корзин на пользователя"""
+    user_messages = SlidingCounterMap(window=60, resolution=1, max_keys=200_000, typecode='H')
+    start = time.perf_counter()
+    for offset, user_id in stream:
+        user_messages.add(user_id, now=offset)
+    return time.perf_counter() - start, user_messages
+
+
+def measure(label: str, runner, *args):
+    """Время считается в отдельном прогоне: tracemalloc сам по себе замедляет выделения памяти"""
+    count = len(args[0])
+    elapsed, state = runner(*args)
+    del state
+    tracemalloc.start()
+    _, state = runner(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {elapsed / count * 1e6:8.2f} мкс/сообщение   "
+          f"память {current / 2 ** 20:8.1f} МБ (пик {peak / 2 ** 20:.1f} МБ)   ключей {len(state)}")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--duration', type=float, default=600.0, help='Длительность потока в секундах')
+    args = parser.parse_args()
+
+    stream = make_stream(args.users, args.messages, args.duration)
+    print(f"Пользователей: {args.users}, сообщений: {args.messages}, за {args.duration:.0f} с "
+          f"(без очистки cleanup_task, как между её запусками)")
+    measure("deque + datetime", run_deque, stream, datetime(2025, 1, 1))
+    measure("SlidingCounterMap", run_counter, stream)
+
+    # Самый активный пользователь дает худший случай для перебора deque
+    hot = [(offset, 0) for offset, _ in stream[:args.messages // 10]]
+    print("Один пользователь-спамер:")
+    measure("deque + datetime", run_deque, hot, datetime(2025, 1, 1))
+    measure("SlidingCounterMap", run_counter, hot)
+
+
+if __name__ == '__main__':
+    main()
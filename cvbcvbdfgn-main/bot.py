@@ -7,6 +7,7 @@ import discord
 from discord.ext import commands
 import logging
 import asyncio
+from functools import partial
 from support_system import setup_support_system
 from admin_applications import setup_minecraft_admin_applications, setup_discord_admin_applications
 from raid_protection import setup_raid_protection
@@ -19,7 +20,12 @@ from channel_protection_system import setup_channel_protection
 from moderation_logs import setup_moderation_logs
 from enhanced_logging_system import setup_enhanced_logging
 from music_system import setup_music_system
-from auto_recovery_system import setup_auto_recovery, global_error_handler
+from auto_recovery_system import setup_auto_recovery
+from load_protection import setup_load_protection
+from metrics import setup_metrics
+from event_bus import setup_event_bus, PRIORITY_CORE
+from startup_graph import setup_startup_graph
+from message_router import setup_message_router, SCOPE_DM
 from command_system import setup_command_system
 from mafia_system import setup as setup_mafia_system
 
@@ -41,7 +47,6 @@ from config import (
     BOT_COMMAND_PREFIX,
     BOT_ACTIVITY_NAME
 )
-from datetime import datetime, timedelta
 from discord.ui import View, Select
 
 logger = logging.getLogger(__name__)
@@ -64,13 +69,108 @@ class DiscordWelcomeBot:
             help_command=None
         )
 
+        # Шина событий: все системы подписываются через неё, а не через @bot.event
+        self.event_bus = setup_event_bus(self.bot)
+
+        # Граф запуска систем, выполняется из on_ready
+        self.startup_graph = setup_startup_graph(self.bot)
+        self._setup_startup_graph()
+
         # Set up event handlers
         self._setup_events()
 
+    def _setup_startup_graph(self):
+        """Описывает системы бота и зависимости между ними"""
+        graph = self.startup_graph
+        bot = self.bot
+
+        graph.add_stage('commands', partial(setup_command_system, bot),
+                        provides='command_system', description='Система команд')
+        graph.add_stage('metrics', partial(setup_metrics, bot),
+                        provides='metrics', description='Система метрик производительности')
+        graph.add_stage('load_protection', partial(setup_load_protection, bot),
+                        provides='load_protection', description='Система защиты от перегрузки')
+        graph.add_stage('enhanced_logging', partial(setup_enhanced_logging, bot),
+                        provides='enhanced_logs', description='Улучшенная система логирования')
+        graph.add_stage('moderation_logs', partial(setup_moderation_logs, bot),
+                        provides='moderation_logs', description='Система логирования модерации')
+
+        # Независимые системы с панелями в своих каналах
+        graph.add_stage('music', partial(setup_music_system, bot), provides='music_system',
+                        revalidate=self._revalidate_music, description='Система музыки')
+        graph.add_stage('support', partial(setup_support_system, bot),
+                        description='Система тикетов технической поддержки')
+        graph.add_stage('minecraft_applications', partial(setup_minecraft_admin_applications, bot),
+                        description='Система заявок в администрацию Minecraft')
+        graph.add_stage('discord_applications', partial(setup_discord_admin_applications, bot),
+                        description='Система заявок в администрацию Discord')
+        graph.add_stage('verification', partial(setup_verification_system, bot),
+                        provides='verification_system', description='Система верификации')
+        graph.add_stage('mute', partial(setup_mute_system, bot),
+                        provides='mute_system', description='Система мутов')
+        graph.add_stage('private_chats', partial(setup_private_chat_system, bot),
+                        description='Система приватных чатов')
+        graph.add_stage('mafia', partial(setup_mafia_system, bot),
+                        description='Система игры Mafia')
+        graph.add_stage('role_system', self._setup_role_system,
+                        provides='role_system', description='Система ролей')
+        graph.add_stage('debug_commands', self._load_debug_commands,
+                        description='Система отладочных команд')
+
+        # Защита
+        graph.add_stage('raid_protection', partial(setup_raid_protection, bot),
+                        provides='raid_protection', description='Система защиты от рейдов')
+        graph.add_stage('raid_protection_buttons', partial(setup_raid_protection_buttons, bot),
+                        depends_on=('raid_protection',), description='Кнопочная панель защиты от рейдов')
+        graph.add_stage('protection_panel', partial(setup_protection_panel, bot),
+                        depends_on=('raid_protection',), description='Панель управления защитой')
+        graph.add_stage('ping_protection', partial(setup_ping_protection, bot), depends_on=('mute',),
+                        provides='ping_protection', description='Система защиты от пинга')
+        # Резервные копии каналов снимаются после того, как системы разместили в них свои панели
+        graph.add_stage('channel_protection', partial(setup_channel_protection, bot),
+                        depends_on=('support', 'minecraft_applications', 'discord_applications', 'verification'),
+                        provides='channel_protection', description='Система защиты каналов')
+
+        # Автовосстановление проверяет остальные системы, поэтому запускается последним
+        graph.add_stage('auto_recovery', partial(setup_auto_recovery, bot),
+                        depends_on=('commands', 'moderation_logs', 'music', 'support', 'raid_protection',
+                                    'channel_protection', 'ping_protection', 'protection_panel'),
+                        provides='auto_recovery', description='Система автоматического восстановления')
+
+    async def _revalidate_music(self) -> bool:
+        """После переподключения возвращает бота в голосовой канал, если там есть слушатели"""
+        music_system = self.bot.music_system
+        channel = self.bot.get_channel(music_system.voice_channel_id)
+        if channel and len(channel.members) > 0 and not (music_system.voice_client and music_system.voice_client.is_connected()):
+            await music_system.join_voice_channel()
+        return True
+
+    async def _setup_role_system(self):
+        """Настройка системы ролей и отправка задания недели"""
+        await setup_role_system(self.bot)
+        if hasattr(self.bot, 'role_system'):
+            await setup_role_activity_handlers(self.bot, self.bot.role_system)
+            logger.info('Обработчики активности ролей настроены')
+            # Сразу отправляем задание недели при запуске
+            await self.bot.role_system.update_weekly_goal()
+            logger.info('Новое задание недели отправлено сразу после запуска бота')
+
+    async def _load_debug_commands(self):
+        """Загружает отладочные команды"""
+        try:
+            if 'debug_commands' not in self.bot.extensions:
+                await self.bot.load_extension('debug_commands')
+                logger.info('Отладочные команды загружены')
+            else:
+                logger.warning('Отладочные команды уже были загружены, пропускаю повторную загрузку.')
+        except Exception as e:
+            logger.warning(f'Не удалось загрузить отладочные команды: {e}')
+
     def _setup_events(self):
         """Set up bot event handlers"""
+        bus = self.event_bus
 
-        @self.bot.event
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_ready():
             """Event triggered when bot is ready and connected"""
             logger.info(f'{self.bot.user} подключился к Discord!')
@@ -99,152 +199,10 @@ class DiscordWelcomeBot:
             else:
                 logger.error(f'Канал приветствия не найден с ID: {WELCOME_CHANNEL_ID}')
 
-            # --- Система команд ---
-            try:
-                await setup_command_system(self.bot)
-                logger.info('Система команд настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы команд: {e}')
-
-            # Setup enhanced logging system FIRST
-            try:
-                await setup_enhanced_logging(self.bot)
-                logger.info('Улучшенная система логирования настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки улучшенной системы логирования: {e}')
-
-            # Setup music system
-            try:
-                await setup_music_system(self.bot)
-                logger.info('Система музыки настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы музыки: {e}')
-
-            # Setup support ticket system
-            try:
-                await setup_support_system(self.bot)
-                logger.info('Система тикетов технической поддержки настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы поддержки: {e}')
-
-            # Setup admin application systems
-            try:
-                await setup_minecraft_admin_applications(self.bot)
-                logger.info('Система заявок в администрацию Minecraft настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы заявок в администрацию Minecraft: {e}')
-                import traceback
-                logger.error(traceback.format_exc())
-
-            try:
-                await setup_discord_admin_applications(self.bot)
-                logger.info('Система заявок в администрацию Discord настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы заявок в администрацию Discord: {e}')
-                import traceback
-                logger.error(traceback.format_exc())
-
-            # Setup raid protection system
-            try:
-                await setup_raid_protection(self.bot)
-                logger.info('Система защиты от рейдов настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы защиты от рейдов: {e}')
-
-            # Setup raid protection buttons
-            try:
-                await setup_raid_protection_buttons(self.bot)
-                logger.info('Кнопочный интерфейс защиты от рейдов настроен')
-            except Exception as e:
-                logger.error(f'Ошибка настройки кнопочного интерфейса защиты от рейдов: {e}')
-
-            # Setup verification system
-            try:
-                await setup_verification_system(self.bot)
-                logger.info('Система верификации настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы верификации: {e}')
-
-            # Setup mute system
-            try:
-                await setup_mute_system(self.bot)
-                logger.info('Система мутов настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы мутов: {e}')
-
-            # Setup private chat system
-            try:
-                await setup_private_chat_system(self.bot)
-                logger.info('Система приватных чатов настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы приватных чатов: {e}')
-
-            # Setup ping protection system
-            try:
-                await setup_ping_protection(self.bot)
-                logger.info('Система защиты от пинга настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы защиты от пинга: {e}')
-
-            # Setup channel protection system
-            try:
-                await setup_channel_protection(self.bot)
-                logger.info('Система защиты каналов настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы защиты каналов: {e}')
-
-            # Setup role system
-            try:
-                await setup_role_system(self.bot)
-                logger.info('Система ролей настроена')
-                if hasattr(self.bot, 'role_system'):
-                    await setup_role_activity_handlers(self.bot, self.bot.role_system)
-                    logger.info('Обработчики активности ролей настроены')
-                    # Сразу отправляем задание недели при запуске
-                    await self.bot.role_system.update_weekly_goal()
-                    logger.info('Новое задание недели отправлено сразу после запуска бота')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы ролей: {e}')
-
-            # Setup moderation logs system
-            try:
-                await setup_moderation_logs(self.bot)
-                logger.info('Система логирования модерации настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы логирования модерации: {e}')
+            # Системы запускаются графом: независимые параллельно, готовые при переподключении только перепроверяются
+            await self.startup_graph.run()
 
-            # Загружаем отладочные команды
-            try:
-                if 'debug_commands' not in self.bot.extensions:
-                    await self.bot.load_extension('debug_commands')
-                    logger.info('Отладочные команды загружены')
-                else:
-                    logger.warning('Отладочные команды уже были загружены, пропускаю повторную загрузку.')
-            except Exception as e:
-                logger.warning(f'Не удалось загрузить отладочные команды: {e}')
-
-            # Setup auto recovery system
-            try:
-                await setup_auto_recovery(self.bot)
-                logger.info('Система автоматического восстановления настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы автоматического восстановления: {e}')
-
-            # Setup Mafia game system
-            try:
-                await setup_mafia_system(self.bot)
-                logger.info('Система игры Mafia настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки системы игры Mafia: {e}')
-
-            # Setup protection panel system
-            try:
-                await setup_protection_panel(self.bot)
-                logger.info('Панель управления защитой настроена')
-            except Exception as e:
-                logger.error(f'Ошибка настройки панели управления защитой: {e}')
-
-        @self.bot.event
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_member_join(member):
             """Event triggered when a member joins the server"""
             try:
@@ -356,7 +314,7 @@ class DiscordWelcomeBot:
                 import traceback
                 logger.error(traceback.format_exc())
 
-        @self.bot.event
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_member_remove(member):
             """Event triggered when a member leaves the server"""
             try:
@@ -439,130 +397,20 @@ class DiscordWelcomeBot:
                 import traceback
                 logger.error(traceback.format_exc())
 
-        @self.bot.event
-        async def on_message(message):
-            """Event triggered when a message is sent"""
-            # Игнорируем сообщения от ботов
-            if message.author.bot:
-                return
-
-            try:
-                # Обработка сообщений в ЛС
-                if isinstance(message.channel, discord.DMChannel):
-                    logger.info(f"Получено ЛС от {message.author.name} ({message.author.id}): {message.content}")
-                    
-                    # Проверяем, идет ли процесс верификации
-                    if hasattr(self.bot, 'verification_system'):
-                        verification_system = self.bot.verification_system
-                        if message.author.id in verification_system.pending_verifications:
-                            # Обрабатываем ответ на капчу
-                            try:
-                                success, response_message = await verification_system.check_captcha_response(
-                                    message.author, message.content
-                                )
-                                logger.info(f"Обработка капчи для {message.author.name}: {response_message}")
-                                return  # Не отправляем автоматический ответ во время верификации
-                            except Exception as e:
-                                logger.error(f"Ошибка при обработке капчи: {e}")
-                    
-                    # Автоматический ответ в ЛС (только если не идет верификация)
-                    try:
-                        help_embed = discord.Embed(
-                            title="🤖 Привет!",
-                            description="Я бот сервера Limonericx.\n\n🔐 **Верификация проходит через капчу в ЛС** - перейдите на сервер и нажмите кнопку.",
-                            color=0x9932cc
-                        )
-                        help_embed.add_field(
-                            name="📍 Как пройти верификацию:",
-                            value="1. Перейдите в канал верификации\n2. Нажмите кнопку '🔐 Пройти верификацию'\n3. Решите капчу в этих личных сообщениях\n4. Получите роль участника!",
-                            inline=False
-                        )
-                        help_embed.add_field(
-                            name="🔗 Полезные каналы",
-                            value="• Канал верификации\n• Техническая поддержка\n• Правила сервера",
-                            inline=False
-                        )
-                        await message.author.send(embed=help_embed)
-                        logger.info(f"Отправлено информационное сообщение пользователю {message.author.name}")
-                    except Exception as e:
-                        logger.error(f"Ошибка при отправке информационного сообщения: {e}")
-                    
-                    # Возвращаемся, чтобы не обрабатывать команды в ЛС
-                    return
-
-                # Очистка канала верификации от лишних сообщений
-                if hasattr(self.bot, 'verification_system'):
-                    verification_system = self.bot.verification_system
-                    if hasattr(verification_system, 'verification_channel_id') and message.channel.id == verification_system.verification_channel_id:
-                        try:
-                            # Удаляем любые сообщения пользователей в канале верификации
-                            await message.delete()
-                            
-                            # Отправляем напоминание о кнопке
-                            reminder_embed = discord.Embed(
-                                title="🔘 Используйте кнопку",
-                                description=f"{message.author.mention}, для верификации нажмите кнопку выше!",
-                                color=0xff8c00
-                            )
-                            reminder = await message.channel.send(embed=reminder_embed)
-                            asyncio.create_task(self._delete_reminder_later(reminder, 5))
-                            
-                        except Exception as e:
-                            logger.error(f"Ошибка при очистке канала верификации: {e}")
-                            try:
-                                await message.delete()
-                            except:
-                                pass
-
-                        except Exception as e:
-                            logger.error(f"Ошибка в обработке сообщения от {message.author}: {e}")
-
-                # Проверяем защиту от пинга (до обработки команд)
-                if hasattr(self.bot, 'ping_protection'):
-                    await self.bot.ping_protection.check_protected_ping(message)
-
-                # Добавляем опыт за сообщение (система уровней)
-                if hasattr(self.bot, 'level_system'):
-                    await self.bot.level_system.add_message_xp(message.author)
-
-                # Обрабатываем команды (только не в ЛС)
-                if not isinstance(message.channel, discord.DMChannel):
-                    # Проверяем ограничения нагрузки
-                    if hasattr(self.bot, 'load_protection'):
-                        # Проверяем rate limiting
-                        if self.bot.load_protection.is_rate_limited(message.author.id, message.author):
-                            await message.channel.send("⚠️ Слишком много запросов! Подождите немного.\n\n💡 **Для снятия ограничений нужна роль** <@&1385306542781497425>")
-                            return
-                            
-                        # Проверяем отключенные функции
-                        if self.bot.load_protection.is_feature_disabled('commands', message.author):
-                            await message.channel.send("⚠️ Команды временно недоступны из-за высокой нагрузки.\n\n💡 **Для снятия ограничений нужна роль** <@&1385306542781497425>")
-                            return
-                    
-                    # Записываем метрики нагрузки
-                    if hasattr(self.bot, 'load_protection'):
-                        self.bot.load_protection.record_request(
-                            message.author.id, 
-                            message.channel.id
-                        )
-                    
-                    await self.bot.process_commands(message)
-            
-            except Exception as e:
-                logger.error(f"Ошибка в обработке сообщения от {message.author}: {e}")
+        # Сообщения разбирает маршрутизатор: системы регистрируют свои маршруты сами
+        router = setup_message_router(self.bot)
+        router.route('direct_messages', self._handle_direct_message, dm=SCOPE_DM)
+        router.route('commands', self._handle_command_message, prefix=BOT_COMMAND_PREFIX)
 
-        @self.bot.event
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_error(event, *args, **kwargs):
             """Global error handler for bot events"""
             logger.error(f'Ошибка в событии {event}: {args}')
             import traceback
             logger.error(traceback.format_exc())
-            
-            # Запускаем автоматическое восстановление
-            if hasattr(self.bot, 'auto_recovery'):
-                await global_error_handler(self.bot, Exception(f"Event error: {event}"), context={"event": event, "args": args, "kwargs": kwargs})
+            # Автоматическое восстановление запускает собственный подписчик on_error из auto_recovery_system
 
-        @self.bot.event
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_interaction(interaction):
             """Handle all interactions including buttons"""
             try:
@@ -577,12 +425,16 @@ class DiscordWelcomeBot:
                 import traceback
                 logger.error(traceback.format_exc())
 
-        @self.bot.event
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_command_error(ctx, error):
             """Handle command errors"""
             if isinstance(error, commands.CommandNotFound):
                 return  # Ignore unknown commands
 
+            # Если система команд настроена, она сама отвечает пользователю об ошибке
+            if hasattr(self.bot, 'command_system'):
+                return
+
             logger.error(f'Ошибка команды в {ctx.channel}: {error}')
 
             try:
@@ -630,7 +482,8 @@ class DiscordWelcomeBot:
                         name="💻 Системные ресурсы",
                         value=f"**CPU:** {stats.get('cpu_percent', 0):.1f}%\n"
                               f"**RAM:** {stats.get('memory_percent', 0):.1f}% ({stats.get('memory_mb', 0):.1f} MB)\n"
-                              f"**Время ответа:** {stats.get('average_response_time', 0):.2f}s",
+                              f"**Время ответа:** {stats.get('average_response_time', 0):.2f}s\n"
+                              f"**p50 / p95:** {stats.get('p50_response_time', 0):.2f}s / {stats.get('p95_response_time', 0):.2f}s",
                         inline=True
                     )
                     
@@ -638,7 +491,8 @@ class DiscordWelcomeBot:
                         name="📈 Активность",
                         value=f"**Запросы/мин:** {stats.get('requests_per_minute', 0)}\n"
                               f"**Всего запросов:** {stats.get('total_requests', 0)}\n"
-                              f"**Медленные ответы:** {stats.get('slow_responses', 0)}",
+                              f"**Медленные ответы:** {stats.get('slow_responses', 0)}\n"
+                              f"**Ограничено:** {stats.get('rate_limited', 0)}",
                         inline=True
                     )
                     
@@ -649,6 +503,43 @@ class DiscordWelcomeBot:
                               f"**Время работы:** {stats.get('uptime_hours', 0):.1f}ч",
                         inline=True
                     )
+
+                    if hasattr(self.bot, 'metrics'):
+                        summary = self.bot.metrics.get_summary()
+                        hot_paths = "\n".join(
+                            f"`{item['name'][-40:]}` — {item['total']:.1f}s, p95 {item['p95'] * 1000:.0f}ms ({item['count']})"
+                            for item in summary['hot_paths']
+                        )
+                        embed.add_field(
+                            name="🔥 Горячие обработчики",
+                            value=f"**Задержка цикла p99:** {summary['loop_lag_p99'] * 1000:.1f}ms (макс. {summary['loop_lag_max'] * 1000:.0f}ms)\n"
+                                  f"**REST-запросов:** {summary['rest_requests']}\n"
+                                  f"{hot_paths or 'Нет данных'}"[:1024],
+                            inline=False
+                        )
+
+                    if hasattr(self.bot, 'log_sink'):
+                        sink_stats = self.bot.log_sink.get_stats()
+                        embed.add_field(
+                            name="📨 Очередь логов",
+                            value=f"**Отправлено:** {sink_stats['sent']} (ошибок: {sink_stats['failed']})\n"
+                                  f"**Выброшено:** {sink_stats['dropped']}\n"
+                                  f"**Задержка:** средн. {sink_stats['average_lag']:.1f}s, макс. {sink_stats['max_lag']:.1f}s\n"
+                                  f"**В очереди:** {sum(sink_stats['backlog'].values())}",
+                            inline=True
+                        )
+
+                    if hasattr(self.bot, 'audit_log_resolver'):
+                        audit_stats = self.bot.audit_log_resolver.get_stats()
+                        embed.add_field(
+                            name="📜 Журнал аудита",
+                            value=f"**Запросов к журналу:** {audit_stats['lookups']}\n"
+                                  f"**Из индекса:** {audit_stats['index_hits']}, "
+                                  f"**дождались:** {audit_stats['resolved_by_wait']}\n"
+                                  f"**REST-запросов:** {audit_stats['fetches']}\n"
+                                  f"**Из событий:** {audit_stats['pushed']}, **не найдено:** {audit_stats['timeouts']}",
+                            inline=True
+                        )
                     
                     await ctx.send(embed=embed)
                 else:
@@ -676,6 +567,79 @@ class DiscordWelcomeBot:
                 logger.error(f"Ошибка сброса оптимизаций: {e}")
                 await ctx.send("❌ Ошибка сброса оптимизаций!")
 
+        @self.bot.command(name='startupstats')
+        async def startup_stats(ctx):
+            """Показывает время готовности систем при запуске"""
+            if not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ У вас нет прав для использования этой команды!")
+                return
+
+            try:
+                graph = self.startup_graph
+                state_icons = {
+                    'ready': '✅',
+                    'running': '⏳',
+                    'pending': '⏸️',
+                    'failed': '❌',
+                    'skipped': '⏭️'
+                }
+
+                lines = []
+                for stage in graph.get_report():
+                    line = (f"{state_icons.get(stage['state'], '❔')} **{stage['name']}** — "
+                            f"готов через {stage['time_to_ready']:.2f}s (этап {stage['duration']:.2f}s, запусков: {stage['runs']})")
+                    if stage['error']:
+                        line += f"\n　└ {stage['error'][:100]}"
+                    lines.append(line)
+
+                embed = discord.Embed(
+                    title="🚀 Запуск систем бота",
+                    description="\n".join(lines)[:4000] or "Запуск еще не выполнялся",
+                    color=0x00ff00,
+                    timestamp=discord.utils.utcnow()
+                )
+                embed.set_footer(text=f"Запусков графа: {graph.run_count} • последний: {graph.last_run_time:.2f}s")
+                await ctx.send(embed=embed)
+
+            except Exception as e:
+                logger.error(f"Ошибка получения статистики запуска: {e}")
+                await ctx.send("❌ Ошибка получения статистики запуска!")
+
+        @self.bot.command(name='routestats')
+        async def route_stats(ctx):
+            """Показывает статистику маршрутов сообщений"""
+            if not ctx.author.guild_permissions.administrator:
+                await ctx.send("❌ У вас нет прав для использования этой команды!")
+                return
+
+            try:
+                stats = self.bot.message_router.get_stats()
+
+                embed = discord.Embed(
+                    title="🧭 Маршрутизация сообщений",
+                    description=f"**Сообщений:** {stats['messages_total']}\n"
+                                f"**Без маршрута:** {stats['messages_unmatched']}\n"
+                                f"**Классификация:** {stats['average_classify_time'] * 1_000_000:.1f} мкс",
+                    color=0x00ff00,
+                    timestamp=discord.utils.utcnow()
+                )
+
+                for route in stats['routes'][:20]:
+                    embed.add_field(
+                        name=f"📬 {route['name']}",
+                        value=f"**Вызовов:** {route['calls']}\n"
+                              f"**Ошибок:** {route['errors']}\n"
+                              f"**Среднее:** {route['average_time'] * 1000:.1f} мс\n"
+                              f"**Максимум:** {route['max_time'] * 1000:.1f} мс",
+                        inline=True
+                    )
+
+                await ctx.send(embed=embed)
+
+            except Exception as e:
+                logger.error(f"Ошибка получения статистики маршрутов: {e}")
+                await ctx.send("❌ Ошибка получения статистики маршрутов!")
+
         @self.bot.command(name='welcome_test')
         async def welcome_test(ctx):
             """Тестирует систему приветствий"""
@@ -1261,14 +1225,12 @@ class DiscordWelcomeBot:
                     )
                     
                     # Статистика действий модераторов
-                    total_actions = 0
-                    for mod_actions in protection.moderator_actions.values():
-                        for action_list in mod_actions.values():
-                            total_actions += len(action_list)
+                    action_counts = protection.get_moderator_action_counts()
+                    total_actions = sum(sum(mod_actions.values()) for mod_actions in action_counts.values())
                     
                     embed.add_field(
                         name="📈 Статистика действий",
-                        value=f"**Всего действий:** {total_actions}\n**Активных модераторов:** {len(protection.moderator_actions)}",
+                        value=f"**Всего действий:** {total_actions}\n**Активных модераторов:** {len(action_counts)}",
                         inline=True
                     )
                     
@@ -1315,11 +1277,18 @@ class DiscordWelcomeBot:
                 await ctx.send(f"❌ Ошибка тестирования: {e}")
 
         @self.bot.command(name='moderator_stats')
-        async def moderator_stats(ctx):
-            """Показать статистику действий модераторов"""
+        async def moderator_stats(ctx, period: str = 'hour'):
+            """Показать статистику действий модераторов (период: hour, day или week)"""
             if not ctx.author.guild_permissions.manage_guild:
                 await ctx.send("❌ У вас нет прав для просмотра статистики модераторов!")
                 return
+            
+            from moderator_action_store import WINDOWS
+            period_names = {'hour': 'последний час', 'day': 'последние сутки', 'week': 'последнюю неделю'}
+            period = period.lower()
+            if period not in WINDOWS:
+                await ctx.send("❌ Период должен быть одним из: hour, day, week")
+                return
                 
             try:
                 if not hasattr(self.bot, 'raid_protection'):
@@ -1330,19 +1299,22 @@ class DiscordWelcomeBot:
                 
                 embed = discord.Embed(
                     title="📊 Статистика действий модераторов",
-                    description="Подробная информация о действиях модераторов за последний час",
+                    description=f"Подробная информация о действиях модераторов за {period_names[period]}",
                     color=0x0099ff,
                     timestamp=discord.utils.utcnow()
                 )
                 
-                if not protection.moderator_actions:
+                moderator_counts = protection.get_moderator_action_counts(WINDOWS[period])
+                if not moderator_counts:
                     embed.add_field(
                         name="📈 Активность",
-                        value="За последний час действий модераторов не зафиксировано",
+                        value=f"За {period_names[period]} действий модераторов не зафиксировано",
                         inline=False
                     )
                 else:
-                    for mod_id, actions in protection.moderator_actions.items():
+                    # Самые активные модераторы первыми; в embed помещается не больше 25 полей
+                    ranked = sorted(moderator_counts.items(), key=lambda item: sum(item[1].values()), reverse=True)
+                    for mod_id, action_counts in ranked[:25]:
                         member = ctx.guild.get_member(mod_id)
                         if member:
                             mod_name = member.display_name
@@ -1351,16 +1323,6 @@ class DiscordWelcomeBot:
                             mod_name = f"Пользователь {mod_id}"
                             mod_mention = f"<@{mod_id}>"
                         
-                        # Подсчитываем действия за последний час
-                        now = datetime.now()
-                        cutoff = now - timedelta(hours=1)
-                        
-                        action_counts = {}
-                        for action_type, action_times in actions.items():
-                            recent_actions = sum(1 for action_time in action_times if action_time > cutoff)
-                            if recent_actions > 0:
-                                action_counts[action_type] = recent_actions
-                        
                         if action_counts:
                             action_text = ""
                             for action_type, count in action_counts.items():
@@ -1483,13 +1445,72 @@ class DiscordWelcomeBot:
             logger.info("Бот отключен")
             raise
 
-    async def _delete_reminder_later(self, message, delay_seconds):
-        """Удалить напоминание через указанное время"""
+    async def _handle_direct_message(self, message):
+        """Обработка сообщений в ЛС"""
+        logger.info(f"Получено ЛС от {message.author.name} ({message.author.id}): {message.content}")
+
+        # Проверяем, идет ли процесс верификации
+        if hasattr(self.bot, 'verification_system'):
+            verification_system = self.bot.verification_system
+            if message.author.id in verification_system.pending_verifications:
+                # Обрабатываем ответ на капчу
+                try:
+                    success, response_message = await verification_system.check_captcha_response(
+                        message.author, message.content
+                    )
+                    logger.info(f"Обработка капчи для {message.author.name}: {response_message}")
+                    return True  # Не отправляем автоматический ответ во время верификации
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке капчи: {e}")
+
+        # Автоматический ответ в ЛС (только если не идет верификация)
         try:
-            await asyncio.sleep(delay_seconds)
-            await message.delete()
-        except:
-            pass
+            help_embed = discord.Embed(
+                title="🤖 Привет!",
+                description="Я бот сервера Limonericx.\n\n🔐 **Верификация проходит через капчу в ЛС** - перейдите на сервер и нажмите кнопку.",
+                color=0x9932cc
+            )
+            help_embed.add_field(
+                name="📍 Как пройти верификацию:",
+                value="1. Перейдите в канал верификации\n2. Нажмите кнопку '🔐 Пройти верификацию'\n3. Решите капчу в этих личных сообщениях\n4. Получите роль участника!",
+                inline=False
+            )
+            help_embed.add_field(
+                name="🔗 Полезные каналы",
+                value="• Канал верификации\n• Техническая поддержка\n• Правила сервера",
+                inline=False
+            )
+            await message.author.send(embed=help_embed)
+            logger.info(f"Отправлено информационное сообщение пользователю {message.author.name}")
+        except Exception as e:
+            logger.error(f"Ошибка при отправке информационного сообщения: {e}")
+
+        # Команды в ЛС не обрабатываются
+        return True
+
+    async def _handle_command_message(self, message):
+        """Обработка команд с учетом ограничений нагрузки"""
+        if hasattr(self.bot, 'load_protection'):
+            # Проверяем rate limiting
+            if self.bot.load_protection.is_rate_limited(message.author.id, message.author, message.channel.id):
+                # Предупреждение не чаще раза в несколько секунд, чтобы спам не превращался в спам бота
+                if self.bot.load_protection.should_notify(message.author.id):
+                    await message.channel.send(f"⚠️ Слишком много запросов! Подождите немного.\n\n💡 **Для снятия ограничений нужна роль** <@&{self.bot.load_protection.bypass_role_id}>")
+                return True
+
+            # Проверяем отключенные функции
+            if self.bot.load_protection.is_feature_disabled('commands', message.author):
+                if self.bot.load_protection.should_notify(message.author.id):
+                    await message.channel.send(f"⚠️ Команды временно недоступны из-за высокой нагрузки.\n\n💡 **Для снятия ограничений нужна роль** <@&{self.bot.load_protection.bypass_role_id}>")
+                return True
+
+            # Записываем метрики нагрузки
+            self.bot.load_protection.record_request(
+                message.author.id,
+                message.channel.id
+            )
+
+        await self.bot.process_commands(message)
 
     async def simulate_member_join(self, member):
         """Симуляция события присоединения участника для тестирования"""
@@ -1591,8 +1612,16 @@ class DiscordWelcomeBot:
     async def stop_bot(self):
         """Gracefully stop the bot"""
         logger.info('Остановка бота...')
+        if hasattr(self.bot, 'attachment_mirror'):
+            await self.bot.attachment_mirror.close()
         if not self.bot.is_closed():
             await self.bot.close()
+        # Строки, накопленные для пакетной записи, иначе теряются при выходе
+        for path, store in getattr(self.bot, 'sqlite_stores', {}).items():
+            try:
+                store.close()
+            except Exception as e:
+                logger.error(f"Ошибка закрытия базы {path}: {e}")
 
 async def setup_extensions(bot):
     """Настройка всех расширений"""
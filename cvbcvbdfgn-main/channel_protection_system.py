@@ -10,6 +10,10 @@ import json
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+from event_bus import setup_event_bus, PRIORITY_PROTECTION
+from timer_scheduler import get_timer_scheduler
+from audit_log_resolver import setup_audit_log_resolver
+from attachment_mirror import get_attachment_mirror, describe_attachment
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +25,10 @@ class ChannelProtectionSystem:
         self.punished_users = {}      # ID пользователя -> время наказания
         self.backup_file = "channel_backups.json"
         self.ignored_category_ids = [1386751637330071695, 1383385103178268672]  # Категории, которые игнорируются защитой
+        self.attachment_mirror = get_attachment_mirror(bot)  # Локальные копии вложений
         self.load_backups()
+        # Окончание наказаний обрабатывает планировщик таймеров
+        get_timer_scheduler(bot).register('channel_punishment_expire', self._expire_punishment)
         
     def load_backups(self):
         """Загружает резервные копии каналов из файла"""
@@ -54,12 +61,15 @@ class ChannelProtectionSystem:
             # Получаем последние сообщения (до 100)
             messages = []
             async for message in channel.history(limit=100):
+                attachments = [describe_attachment(att) for att in message.attachments]
+                for attachment in attachments:
+                    self.attachment_mirror.submit(attachment)
                 messages.append({
                     'author_id': message.author.id,
                     'author_name': message.author.name,
                     'content': message.content,
                     'timestamp': message.created_at.isoformat(),
-                    'attachments': [att.url for att in message.attachments],
+                    'attachments': attachments,
                     'embeds': [embed.to_dict() for embed in message.embeds]
                 })
             
@@ -141,10 +151,13 @@ class ChannelProtectionSystem:
                         icon_url="https://cdn.discordapp.com/emojis/✅.png"
                     )
                     
+                    files = []
                     if message_data['attachments']:
+                        files = await self.attachment_mirror.files_for(message_data['attachments'],
+                                                                       channel.guild.filesize_limit)
                         embed.add_field(
                             name="📎 Вложения",
-                            value=f"Количество: {len(message_data['attachments'])}",
+                            value=f"Количество: {len(message_data['attachments'])}, восстановлено файлов: {len(files)}",
                             inline=True
                         )
                     
@@ -155,7 +168,7 @@ class ChannelProtectionSystem:
                             inline=True
                         )
                     
-                    await channel.send(embed=embed)
+                    await channel.send(embed=embed, files=files)
                     
                     # Небольшая задержка между сообщениями
                     await asyncio.sleep(0.5)
@@ -186,6 +199,15 @@ class ChannelProtectionSystem:
                 'reason': reason
             }
             
+            # Роли вернет планировщик; исходные роли сохраняются вместе с таймером на случай перезапуска
+            get_timer_scheduler(self.bot).schedule(
+                'channel_punishment_expire',
+                when=punishment_end.timestamp(),
+                key=f"channel_punishment:{user.guild.id}:{user.id}",
+                payload={'guild_id': user.guild.id, 'user_id': user.id, **self.punished_users[user.id]},
+                persist=True
+            )
+            
             # Отправляем уведомление
             embed = discord.Embed(
                 title="🚫 Наказание за удаление канала",
@@ -228,6 +250,7 @@ class ChannelProtectionSystem:
             
             # Удаляем из списка наказанных
             del self.punished_users[user.id]
+            get_timer_scheduler(self.bot).cancel(f"channel_punishment:{user.guild.id}:{user.id}")
             
             # Отправляем уведомление
             embed = discord.Embed(
@@ -245,31 +268,21 @@ class ChannelProtectionSystem:
         except Exception as e:
             logger.error(f"Ошибка восстановления ролей пользователя {user.name}: {e}")
     
-    async def check_punishments(self):
-        """Проверяет и восстанавливает роли пользователей после наказания"""
-        while True:
-            try:
-                current_time = datetime.now()
-                users_to_restore = []
-                
-                for user_id, punishment_data in self.punished_users.items():
-                    punishment_end = datetime.fromisoformat(punishment_data['punishment_end'])
-                    if current_time >= punishment_end:
-                        users_to_restore.append(user_id)
-                
-                for user_id in users_to_restore:
-                    guild = self.bot.get_guild(1375772175373566012)  # ID вашего сервера
-                    if guild:
-                        user = guild.get_member(user_id)
-                        if user:
-                            await self.restore_user_roles(user)
-                
-                # Проверяем каждые 5 минут
-                await asyncio.sleep(300)
-                
-            except Exception as e:
-                logger.error(f"Ошибка проверки наказаний: {e}")
-                await asyncio.sleep(60)
+    async def _expire_punishment(self, payload):
+        """Восстанавливает роли по окончании наказания (таймер планировщика)"""
+        guild = self.bot.get_guild(payload['guild_id'])
+        if not guild:
+            return
+        user = guild.get_member(payload['user_id'])
+        if not user:
+            return
+        # После перезапуска бота данные наказания восстанавливаются из таймера
+        self.punished_users.setdefault(user.id, {
+            'original_roles': payload['original_roles'],
+            'punishment_end': payload['punishment_end'],
+            'reason': payload['reason']
+        })
+        await self.restore_user_roles(user)
     
     async def setup_protection(self):
         """Настраивает систему защиты"""
@@ -294,9 +307,6 @@ class ChannelProtectionSystem:
                 if channel:
                     await self.backup_channel(channel)
             
-            # Запускаем проверку наказаний
-            asyncio.create_task(self.check_punishments())
-            
             logger.info("Система защиты каналов настроена")
             
         except Exception as e:
@@ -307,8 +317,10 @@ async def setup_channel_protection(bot):
     try:
         protection_system = ChannelProtectionSystem(bot)
         bot.channel_protection = protection_system
+        bus = setup_event_bus(bot)
+        audit_logs = setup_audit_log_resolver(bot)
         
-        @bot.event
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_guild_channel_delete(channel):
             """Событие удаления канала"""
             try:
@@ -320,27 +332,26 @@ async def setup_channel_protection(bot):
                 if str(channel.id) in protection_system.protected_channels:
                     logger.warning(f"🚨 УДАЛЕН ЗАЩИЩЕННЫЙ КАНАЛ: {channel.name} (ID: {channel.id})")
                     # Определяем, кто удалил канал
-                    async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.channel_delete, limit=1):
-                        if entry.target.id == channel.id:
-                            user = entry.user
-                            reason = f"Удаление защищенного канала {channel.name}"
-                            # Наказываем пользователя
-                            await protection_system.punish_user(user, reason)
-                            # Восстанавливаем канал
-                            restored_channel = await protection_system.restore_channel(channel.guild, str(channel.id))
-                            if restored_channel:
-                                # Отправляем уведомление о восстановлении
-                                embed = discord.Embed(
-                                    title="🛡️ Канал восстановлен",
-                                    description=f"Защищенный канал {restored_channel.mention} был автоматически восстановлен",
-                                    color=0x00ff00
-                                )
-                                embed.add_field(name="Удален пользователем", value=user.mention, inline=True)
-                                embed.add_field(name="Время", value=f"<t:{int(datetime.now().timestamp())}:F>", inline=True)
-                                system_channel = channel.guild.system_channel
-                                if system_channel:
-                                    await system_channel.send(embed=embed)
-                            break
+                    entry = await audit_logs.resolve(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
+                    if entry:
+                        user = entry.user
+                        reason = f"Удаление защищенного канала {channel.name}"
+                        # Наказываем пользователя
+                        await protection_system.punish_user(user, reason)
+                        # Восстанавливаем канал
+                        restored_channel = await protection_system.restore_channel(channel.guild, str(channel.id))
+                        if restored_channel:
+                            # Отправляем уведомление о восстановлении
+                            embed = discord.Embed(
+                                title="🛡️ Канал восстановлен",
+                                description=f"Защищенный канал {restored_channel.mention} был автоматически восстановлен",
+                                color=0x00ff00
+                            )
+                            embed.add_field(name="Удален пользователем", value=user.mention, inline=True)
+                            embed.add_field(name="Время", value=f"<t:{int(datetime.now().timestamp())}:F>", inline=True)
+                            system_channel = channel.guild.system_channel
+                            if system_channel:
+                                await system_channel.send(embed=embed)
             except Exception as e:
                 logger.error(f"Ошибка обработки удаления канала: {e}")
         
@@ -10,6 +10,7 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Optional
 from config import LIMONERICX_SERVER_ID, BOT_COMMAND_PREFIX
+from event_bus import setup_event_bus, PRIORITY_CORE
 
 logger = logging.getLogger('command_system')
 
@@ -502,7 +503,8 @@ async def setup_command_system(bot):
         bot.command_system = command_system
         
         # Настройка обработчика ошибок команд
-        @bot.event
+        bus = setup_event_bus(bot)
+        @bus.listen(priority=PRIORITY_CORE)
         async def on_command_error(ctx, error):
             if isinstance(error, commands.CommandNotFound):
                 embed = discord.Embed(
@@ -151,6 +151,19 @@ PROTECTED_ROLES = [
     # Добавьте другие важные роли здесь
 ]
 
+# Load Protection Configuration
+LOAD_BYPASS_ROLE_ID = 1385306542781497425  # Роль без ограничений нагрузки
+LOAD_USER_RATE = 0.5  # Пополнение лимита пользователя (запросов в секунду)
+LOAD_USER_BURST = 5  # Максимум запросов пользователя подряд
+LOAD_CHANNEL_RATE = 3.0  # Пополнение лимита канала (запросов в секунду)
+LOAD_CHANNEL_BURST = 20  # Максимум запросов в канале подряд
+LOAD_SAMPLE_INTERVAL = 10  # Интервал замера CPU и памяти (секунды)
+
+# Metrics Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # HTTP-эндпоинт /metrics
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Только локальный доступ по умолчанию
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
 # Bot Settings
 BOT_COMMAND_PREFIX = "!"
 BOT_ACTIVITY_NAME = "Добро пожаловать на Limonericx!"
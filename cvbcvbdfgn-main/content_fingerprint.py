@@ -0,0 +1,178 @@
+"""
+Обнаружение одинакового контента от разных авторов (спам-рейды) для Discord бота
+Каждое сообщение превращается в небольшой набор отпечатков: хэш нормализованного текста,
+коды приглашений и полосы MinHash-подписи для почти одинаковых текстов. Отпечатки
+ищутся в словаре недавних, поэтому проверка не зависит от числа сообщений в окне
+"""
+
+import random
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+WINDOW = 120  # Сколько секунд отпечаток живет без новых сообщений
+MAX_FINGERPRINTS = 50_000
+
+MIN_TEXT_LENGTH = 20  # Короткие фразы ("всем привет") пишут все, их не сравниваем
+MAX_TEXT_LENGTH = 400  # Для подписи хватает начала сообщения
+SHINGLE_SIZE = 5
+MIN_AUTHORS = 5  # Разных авторов одного текста для срабатывания
+MIN_INVITE_AUTHORS = 3  # Одно приглашение от разных новых аккаунтов подозрительнее текста
+
+# 16 хэшей в 4 полосах по 4: тексты со сходством шинглов выше ~0.7 почти наверняка совпадут хотя бы в одной полосе
+BANDS = 4
+ROWS = 4
+# Совпадение полосы - только кандидат: сообщение учитывается, если вся подпись похожа на подпись кластера.
+# Иначе короткие сообщения с одним общим длинным словом собираются в одну полосу
+MIN_SIGNATURE_SIMILARITY = 0.5
+
+_rng = random.Random(0x5EED)
+# Хэши вида (a * x + b) >> 32: в отличие от XOR с маской, минимумы разных хэшей почти независимы
+_HASHES = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(BANDS * ROWS)]
+_MASK32 = 0xFFFFFFFF
+
+_INVITE = re.compile(r'(?:discord(?:app)?\.com/invite|discord\.gg)/([a-z0-9-]+)', re.IGNORECASE)
+_URL = re.compile(r'https?://\S+')
+_MENTION = re.compile(r'<[@#:][^>]+>')
+_NON_WORD = re.compile(r'[\W_\d]+')
+_REPEATS = re.compile(r'(.)\1{2,}')
+
+
+def normalize_text(content: str) -> str:
+    """Текст без регистра, упоминаний, ссылок, цифр, диакритики, знаков и растянутых букв"""
+    text = unicodedata.normalize('NFKD', content.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = _MENTION.sub(' ', text)
+    text = _URL.sub(' ', text)
+    text = _NON_WORD.sub(' ', text)
+    text = _REPEATS.sub(r'\1\1', text)
+    return ' '.join(text.split())[:MAX_TEXT_LENGTH]
+
+
+def extract_invites(content: str) -> List[str]:
+    return [code.lower() for code in _INVITE.findall(content)]
+
+
+def minhash_signature(text: str) -> Tuple[int, ...]:
+    """MinHash-подпись по символьным шинглам текста"""
+    shingles = {zlib.crc32(text[index:index + SHINGLE_SIZE].encode())
+                for index in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    return tuple(min(((a * value + b) >> 32) & _MASK32 for value in shingles) for a, b in _HASHES)
+
+
+def signature_similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Оценка сходства шинглов (Жаккара) по доле совпавших хэшей"""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def fingerprint_message(content: str) -> Tuple[List, Optional[Tuple[int, ...]]]:
+    """Отпечатки сообщения: ('invite', код), ('text', хэш) и ('band', хэш), плюс MinHash-подпись"""
+    keys = [('invite', code) for code in extract_invites(content)]
+    signature = None
+    text = normalize_text(content)
+    if len(text) >= MIN_TEXT_LENGTH:
+        keys.append(('text', zlib.crc32(text.encode())))
+        signature = minhash_signature(text)
+        keys.extend(('band', hash((band,) + signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS))
+    return keys, signature
+
+
+class ContentCluster:
+    """Авторы, отправившие один и тот же (или почти тот же) контент"""
+
+    __slots__ = ('kind', 'authors', 'author_count', 'messages', 'first_seen', 'last_seen', 'sample', 'signature',
+                 'reported')
+
+    def __init__(self, kind: str, now: float, sample: str, signature: Optional[Tuple[int, ...]] = None):
+        self.kind = kind
+        self.signature = signature  # Подпись первого сообщения полосы
+        self.authors: Dict[int, int] = {}  # id автора -> число сообщений
+        self.author_count = 0
+        self.messages = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.sample = sample
+        self.reported = False
+
+    def add(self, author_id: int, now: float) -> bool:
+        """Учитывает сообщение; True, если автор новый"""
+        self.messages += 1
+        self.last_seen = now
+        if author_id in self.authors:
+            self.authors[author_id] += 1
+            return False
+        self.author_count += 1
+        self.authors[author_id] = 1
+        return True
+
+    @property
+    def threshold(self) -> int:
+        return MIN_INVITE_AUTHORS if self.kind == 'invite' else MIN_AUTHORS
+
+
+class ContentFingerprintIndex:
+    """Недавние отпечатки всех авторов в окне WINDOW"""
+
+    def __init__(self):
+        self.clusters: 'OrderedDict[tuple, ContentCluster]' = OrderedDict()  # По времени последнего сообщения
+        self.stats = {'messages': 0, 'fingerprinted': 0, 'clusters_reported': 0, 'evicted': 0}
+
+    def observe(self, author_id: int, content: str, now: Optional[float] = None) -> Optional[ContentCluster]:
+        """Учитывает сообщение. Возвращает кластер, если он только что набрал достаточно авторов."""
+        if now is None:
+            now = time.monotonic()
+        self.stats['messages'] += 1
+        self._expire(now)
+
+        keys, signature = fingerprint_message(content)
+        if not keys:
+            return None
+        self.stats['fingerprinted'] += 1
+
+        sample = content[:200]
+        triggered = None
+        for key in keys:
+            cluster = self.clusters.get(key)
+            if cluster is None:
+                if len(self.clusters) >= MAX_FINGERPRINTS:
+                    self.clusters.popitem(last=False)
+                    self.stats['evicted'] += 1
+                # Подпись нужна только полосам: текст и приглашение совпадают точно
+                band_signature = signature if key[0] == 'band' else None
+                cluster = self.clusters[key] = ContentCluster(key[0], now, sample, band_signature)
+            elif (cluster.signature is not None
+                  and signature_similarity(signature, cluster.signature) < MIN_SIGNATURE_SIMILARITY):
+                continue
+            else:
+                self.clusters.move_to_end(key)
+            cluster.add(author_id, now)
+
+            if not cluster.reported and cluster.author_count >= cluster.threshold:
+                cluster.reported = True
+                if triggered is None:
+                    triggered = cluster
+
+        # Отпечатки одного сообщения описывают один и тот же контент: отчитываемся о нем один раз
+        if triggered is not None:
+            for key in keys:
+                cluster = self.clusters.get(key)
+                if cluster is not None:
+                    cluster.reported = True
+            self.stats['clusters_reported'] += 1
+        return triggered
+
+    def _expire(self, now: float):
+        cutoff = now - WINDOW
+        clusters = self.clusters
+        while clusters:
+            for key in clusters:
+                break
+            if clusters[key].last_seen >= cutoff:
+                break
+            del clusters[key]
+
+    def get_stats(self) -> Dict:
+        return {'fingerprints': len(self.clusters), **self.stats}
@@ -16,6 +16,8 @@ import psutil
 import platform
 import aiohttp
 import time
+from event_bus import setup_event_bus, PRIORITY_LOGGING
+from log_sink import get_log_sink, LANE_MODERATION, LANE_ACTIVITY
 
 # Настройка логирования
 logging.basicConfig(
@@ -269,7 +271,7 @@ class EnhancedLoggingSystem:
         with open('error_log.json', 'w', encoding='utf-8') as f:
             json.dump(self.error_log, f, ensure_ascii=False, indent=2)
         
-        await self.send_log(embed)
+        await self.send_log(embed, LANE_MODERATION)
     
     async def log_performance(self, operation: str, duration: float, details: str = ""):
         """Логирует производительность операций"""
@@ -361,7 +363,7 @@ class EnhancedLoggingSystem:
             inline=True
         )
         
-        await self.send_log(embed)
+        await self.send_log(embed, LANE_MODERATION)
     
     async def log_system_status(self):
         """Логирует статус системы"""
@@ -420,6 +422,8 @@ class EnhancedLoggingSystem:
     async def log_message_activity(self, message, action: str):
         """Логирует активность сообщений"""
         self.stats['messages_sent'] += 1
+        if hasattr(self.bot, 'load_protection') and self.bot.load_protection.is_feature_disabled('message_logging'):
+            return
         
         embed = discord.Embed(
             title=f"💬 Активность сообщений: {action}",
@@ -498,6 +502,9 @@ class EnhancedLoggingSystem:
     
     async def log_reaction_activity(self, payload, action: str):
         """Логирует активность реакций"""
+        if hasattr(self.bot, 'load_protection') and self.bot.load_protection.is_feature_disabled('message_logging'):
+            return
+        
         embed = discord.Embed(
             title=f"😀 Активность реакций: {action}",
             description=f"Реакция {payload.emoji}",
@@ -563,7 +570,7 @@ class EnhancedLoggingSystem:
                 inline=False
             )
         
-        await self.send_log(embed)
+        await self.send_log(embed, LANE_MODERATION)
     
     async def log_role_activity(self, role, action: str):
         """Логирует активность ролей"""
@@ -610,15 +617,15 @@ class EnhancedLoggingSystem:
             inline=True
         )
         
-        await self.send_log(embed)
+        await self.send_log(embed, LANE_MODERATION)
     
-    async def send_log(self, embed):
-        """Отправляет лог в канал"""
+    async def send_log(self, embed, lane: int = LANE_ACTIVITY):
+        """Ставит лог в очередь канала (логи отправляются пачками)"""
         if not self.enabled or not self.log_channel:
             return
         
         try:
-            await self.log_channel.send(embed=embed)
+            get_log_sink(self.bot).submit(self.log_channel, embed, lane)
         except Exception as e:
             logger.error(f"Ошибка отправки лога: {e}")
     
@@ -664,8 +671,9 @@ async def setup_enhanced_logging(bot):
 
 async def setup_enhanced_log_handlers(bot, enhanced_logs):
     """Устанавливает обработчики событий для улучшенного логирования"""
+    bus = setup_event_bus(bot)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_command(ctx):
         """Логирует использование команд"""
         start_time = time.time()
@@ -673,82 +681,82 @@ async def setup_enhanced_log_handlers(bot, enhanced_logs):
         # Сохраняем время начала для вычисления длительности
         ctx._command_start_time = start_time
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_command_completion(ctx):
         """Логирует завершение команд"""
         if hasattr(ctx, '_command_start_time'):
             execution_time = (time.time() - ctx._command_start_time) * 1000  # в миллисекундах
             await enhanced_logs.log_command_usage(ctx, ctx.command.name, execution_time)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_command_error(ctx, error):
         """Логирует ошибки команд"""
         await enhanced_logs.log_error(error, f"Команда: {ctx.command.name if ctx.command else 'Неизвестно'}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_member_join(member):
         """Логирует присоединение участников"""
         await enhanced_logs.log_member_join(member)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_member_remove(member):
         """Логирует выход участников"""
         await enhanced_logs.log_member_leave(member)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_message(message):
         """Логирует сообщения"""
         if not message.author.bot:
             await enhanced_logs.log_message_activity(message, "Отправлено")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_message_edit(before, after):
         """Логирует редактирование сообщений"""
         if not before.author.bot:
             await enhanced_logs.log_message_activity(after, "Отредактировано")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_message_delete(message):
         """Логирует удаление сообщений"""
         if not message.author.bot:
             await enhanced_logs.log_message_activity(message, "Удалено")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_voice_state_update(member, before, after):
         """Логирует изменения голосового состояния"""
         await enhanced_logs.log_voice_activity(member, before, after)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_raw_reaction_add(payload):
         """Логирует добавление реакций"""
         await enhanced_logs.log_reaction_activity(payload, "Добавлена")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_raw_reaction_remove(payload):
         """Логирует удаление реакций"""
         await enhanced_logs.log_reaction_activity(payload, "Удалена")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_channel_create(channel):
         """Логирует создание каналов"""
         await enhanced_logs.log_channel_activity(channel, "Создан")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_channel_delete(channel):
         """Логирует удаление каналов"""
         await enhanced_logs.log_channel_activity(channel, "Удален")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_role_create(role):
         """Логирует создание ролей"""
         await enhanced_logs.log_role_activity(role, "Создана")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_role_delete(role):
         """Логирует удаление ролей"""
         await enhanced_logs.log_role_activity(role, "Удалена")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_error(event, *args, **kwargs):
         """Логирует общие ошибки"""
         await enhanced_logs.log_error(Exception(f"Ошибка в событии {event}"), f"Событие: {event}")
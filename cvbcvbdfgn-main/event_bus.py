@@ -0,0 +1,175 @@
+"""
+Внутренняя шина событий для Discord бота
+Позволяет нескольким системам подписываться на одно событие discord.py,
+не перезаписывая обработчики друг друга через @bot.event
+"""
+
+import asyncio
+import logging
+import time
+import traceback
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('event_bus')
+
+# Приоритеты подписчиков: чем больше число, тем раньше стартует обработчик
+PRIORITY_INDEX = 200       # Индексы и кэши, которые должны обновиться раньше их потребителей
+PRIORITY_PROTECTION = 100  # Системы защиты (рейды, каналы)
+PRIORITY_CORE = 50         # Основная логика бота
+PRIORITY_LOGGING = 10      # Системы логирования
+
+
+class EventSubscriber:
+    """Подписчик на событие шины со статистикой выполнения"""
+
+    def __init__(self, name, handler, priority):
+        self.name = name
+        self.handler = handler
+        self.priority = priority
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+
+class EventBus:
+    """Шина событий с приоритетами, параллельной рассылкой и изоляцией ошибок"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.subscribers: Dict[str, List[EventSubscriber]] = {}
+        self.slow_handler_threshold = 1.0  # Порог медленного обработчика (секунды)
+        self.timing_hooks = []  # Функции (событие, подписчик, время, ошибка), например сбор метрик
+
+    def subscribe(self, event_name: str, handler, priority: int = PRIORITY_CORE, name: Optional[str] = None):
+        """Подписывает обработчик на событие.
+
+        Повторная подписка с тем же именем заменяет прежний обработчик,
+        поэтому повторный вызов setup_* не приводит к двойной обработке.
+        """
+        if not asyncio.iscoroutinefunction(handler):
+            raise TypeError(f"Обработчик события {event_name} должен быть корутиной")
+
+        name = name or f"{handler.__module__}.{handler.__qualname__}"
+        subscribers = self.subscribers.get(event_name)
+        if subscribers is None:
+            subscribers = self.subscribers[event_name] = []
+            self._install_dispatcher(event_name)
+
+        subscribers[:] = [subscriber for subscriber in subscribers if subscriber.name != name]
+        subscribers.append(EventSubscriber(name, handler, priority))
+        subscribers.sort(key=lambda subscriber: -subscriber.priority)
+
+        logger.debug(f"Подписчик {name} добавлен на событие {event_name} (приоритет {priority})")
+        return handler
+
+    def listen(self, event_name: Optional[str] = None, *, priority: int = PRIORITY_CORE, name: Optional[str] = None):
+        """Декоратор подписки; имя события по умолчанию берется из имени функции, как у @bot.event"""
+        def decorator(handler):
+            self.subscribe(event_name or handler.__name__, handler, priority=priority, name=name)
+            return handler
+        return decorator
+
+    def unsubscribe(self, event_name: str, name: str) -> bool:
+        """Отписывает обработчик по имени"""
+        subscribers = self.subscribers.get(event_name, [])
+        remaining = [subscriber for subscriber in subscribers if subscriber.name != name]
+        removed = len(remaining) != len(subscribers)
+        subscribers[:] = remaining
+        return removed
+
+    def add_timing_hook(self, hook):
+        """Добавляет синхронную функцию, которая получает время выполнения каждого обработчика"""
+        if hook not in self.timing_hooks:
+            self.timing_hooks.append(hook)
+
+    def _install_dispatcher(self, event_name: str):
+        """Регистрирует в discord.py единственный обработчик, который рассылает событие подписчикам"""
+        async def dispatcher(*args, **kwargs):
+            await self.dispatch(event_name, *args, **kwargs)
+
+        dispatcher.__name__ = event_name
+        self.bot.event(dispatcher)
+
+    async def dispatch(self, event_name: str, *args, **kwargs):
+        """Рассылает событие всем подписчикам параллельно.
+
+        Задачи создаются в порядке приоритета, поэтому синхронная часть
+        обработчиков с более высоким приоритетом выполняется первой.
+        """
+        subscribers = self.subscribers.get(event_name)
+        if not subscribers:
+            return
+
+        if len(subscribers) == 1:
+            await self._run_subscriber(event_name, subscribers[0], args, kwargs)
+            return
+
+        await asyncio.gather(*(
+            self._run_subscriber(event_name, subscriber, args, kwargs)
+            for subscriber in tuple(subscribers)
+        ))
+
+    async def _run_subscriber(self, event_name, subscriber, args, kwargs):
+        """Выполняет одного подписчика с замером времени и изоляцией ошибок"""
+        start = time.perf_counter()
+        failed = False
+        try:
+            await subscriber.handler(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = True
+            subscriber.errors += 1
+            logger.error(f"Ошибка в обработчике {subscriber.name} события {event_name}: {e}")
+            logger.error(traceback.format_exc())
+            if event_name != 'on_error':
+                await self._report_error(event_name, args, kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            subscriber.calls += 1
+            subscriber.total_time += elapsed
+            if elapsed > subscriber.max_time:
+                subscriber.max_time = elapsed
+            if elapsed > self.slow_handler_threshold:
+                logger.warning(f"Медленный обработчик {subscriber.name} события {event_name}: {elapsed:.2f}с")
+            for hook in self.timing_hooks:
+                try:
+                    hook(event_name, subscriber.name, elapsed, failed)
+                except Exception as e:
+                    logger.error(f"Ошибка в функции замера времени для {subscriber.name}: {e}")
+
+    async def _report_error(self, event_name, args, kwargs):
+        """Передает ошибку подписчикам on_error (автовосстановление, логирование)"""
+        if not self.subscribers.get('on_error'):
+            return
+        try:
+            await self.dispatch('on_error', event_name, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"Ошибка при передаче ошибки события {event_name} в on_error: {e}")
+
+    def get_stats(self) -> List[Dict]:
+        """Возвращает статистику обработчиков, отсортированную по суммарному времени"""
+        stats = []
+        for event_name, subscribers in self.subscribers.items():
+            for subscriber in subscribers:
+                stats.append({
+                    'event': event_name,
+                    'name': subscriber.name,
+                    'priority': subscriber.priority,
+                    'calls': subscriber.calls,
+                    'errors': subscriber.errors,
+                    'total_time': subscriber.total_time,
+                    'average_time': subscriber.total_time / subscriber.calls if subscriber.calls else 0.0,
+                    'max_time': subscriber.max_time
+                })
+        stats.sort(key=lambda item: item['total_time'], reverse=True)
+        return stats
+
+
+def setup_event_bus(bot) -> EventBus:
+    """Возвращает шину событий бота, создавая её при первом обращении"""
+    if not hasattr(bot, 'event_bus'):
+        bot.event_bus = EventBus(bot)
+        logger.info("Шина событий создана")
+    return bot.event_bus
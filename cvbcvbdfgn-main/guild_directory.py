@@ -0,0 +1,261 @@
+"""
+Справочник каналов, категорий и ролей сервера для Discord бота
+Индекс по имени строится один раз на сервер и дальше обновляется событиями
+создания, изменения и удаления; поиск по ключевым словам запоминается вместе с промахами
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from event_bus import setup_event_bus, PRIORITY_INDEX
+
+logger = logging.getLogger('guild_directory')
+
+
+class GuildIndex:
+    """Индекс одного сервера: имена хранятся отдельно от объектов, объекты берутся из кэша discord.py"""
+
+    def __init__(self, guild: discord.Guild):
+        self.guild_id = guild.id
+        self.channels_by_name: Dict[str, List[int]] = {}
+        self.channels_by_category: Dict[int, List[int]] = {}
+        self.channel_records: Dict[int, Tuple[str, Optional[int]]] = {}  # id -> (имя, категория)
+        self.roles_by_name: Dict[str, List[int]] = {}
+        self.role_names: Dict[int, str] = {}
+        # (ключевые слова, тип) -> id найденного канала или None, если подходящего нет
+        self.keyword_memo: Dict[Tuple[Tuple[str, ...], Optional[type]], Optional[int]] = {}
+
+        for channel in guild.channels:
+            self.add_channel(channel)
+        for role in guild.roles:
+            self.add_role(role)
+
+    # --- Каналы ---
+
+    def add_channel(self, channel):
+        if channel.id in self.channel_records:
+            self.remove_channel(channel.id)
+        self.channel_records[channel.id] = (channel.name, channel.category_id)
+        self.channels_by_name.setdefault(channel.name, []).append(channel.id)
+        if channel.category_id is not None:
+            self.channels_by_category.setdefault(channel.category_id, []).append(channel.id)
+
+        # Новый канал может подойти под запомненный промах
+        name = channel.name.lower()
+        for key, found_id in list(self.keyword_memo.items()):
+            keywords, kind = key
+            if found_id is None and (kind is None or isinstance(channel, kind)) \
+                    and any(word in name for word in keywords):
+                del self.keyword_memo[key]
+
+    def remove_channel(self, channel_id: int):
+        record = self.channel_records.pop(channel_id, None)
+        if record is None:
+            return
+        name, category_id = record
+        _discard(self.channels_by_name, name, channel_id)
+        if category_id is not None:
+            _discard(self.channels_by_category, category_id, channel_id)
+        self.channels_by_category.pop(channel_id, None)
+
+        for key, found_id in list(self.keyword_memo.items()):
+            if found_id == channel_id:
+                del self.keyword_memo[key]
+
+    # --- Роли ---
+
+    def add_role(self, role):
+        if role.id in self.role_names:
+            self.remove_role(role.id)
+        self.role_names[role.id] = role.name
+        self.roles_by_name.setdefault(role.name, []).append(role.id)
+
+    def remove_role(self, role_id: int):
+        name = self.role_names.pop(role_id, None)
+        if name is not None:
+            _discard(self.roles_by_name, name, role_id)
+
+
+def _discard(index: Dict, key, object_id: int):
+    ids = index.get(key)
+    if ids is None:
+        return
+    try:
+        ids.remove(object_id)
+    except ValueError:
+        pass
+    if not ids:
+        del index[key]
+
+
+class GuildDirectory:
+    """Поиск каналов, категорий и ролей по имени без перебора сервера"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.indexes: Dict[int, GuildIndex] = {}
+        self.stats = {'lookups': 0, 'memo_hits': 0, 'scans': 0, 'rebuilds': 0}
+
+    def _index(self, guild: discord.Guild) -> GuildIndex:
+        index = self.indexes.get(guild.id)
+        if index is None:
+            index = self.indexes[guild.id] = GuildIndex(guild)
+            self.stats['rebuilds'] += 1
+        return index
+
+    def _rebuild(self, guild: discord.Guild) -> GuildIndex:
+        """Индекс разошелся с кэшем (пропущено событие) - строим заново"""
+        logger.warning(f"Справочник сервера {guild.name} устарел, перестраиваем")
+        self.indexes.pop(guild.id, None)
+        return self._index(guild)
+
+    # --- Поиск ---
+
+    def channel(self, guild: discord.Guild, name: str, kind: Optional[type] = None):
+        """Канал с точным именем (первый по порядку сервера); kind - тип канала, например discord.TextChannel"""
+        self.stats['lookups'] += 1
+        for attempt in range(2):
+            index = self._index(guild) if attempt == 0 else self._rebuild(guild)
+            stale = False
+            for channel_id in index.channels_by_name.get(name, ()):
+                channel = guild.get_channel(channel_id)
+                if channel is None or channel.name != name:
+                    stale = True
+                    break
+                if kind is None or isinstance(channel, kind):
+                    return channel
+            if not stale:
+                return None
+        return None
+
+    def category(self, guild: discord.Guild, name: str) -> Optional[discord.CategoryChannel]:
+        """Категория с точным именем"""
+        return self.channel(guild, name, discord.CategoryChannel)
+
+    def channels_in(self, category: discord.CategoryChannel, kind: Optional[type] = None) -> List:
+        """Каналы категории без перебора всех каналов сервера"""
+        index = self._index(category.guild)
+        channels = []
+        for channel_id in index.channels_by_category.get(category.id, ()):
+            channel = category.guild.get_channel(channel_id)
+            if channel is not None and (kind is None or isinstance(channel, kind)):
+                channels.append(channel)
+        return channels
+
+    def role(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        """Роль с точным именем"""
+        self.stats['lookups'] += 1
+        for attempt in range(2):
+            index = self._index(guild) if attempt == 0 else self._rebuild(guild)
+            role_ids = index.roles_by_name.get(name)
+            if not role_ids:
+                return None
+            role = guild.get_role(role_ids[0])
+            if role is not None and role.name == name:
+                return role
+        return None
+
+    def find_channel(self, guild: discord.Guild, keywords, kind: Optional[type] = None):
+        """Первый канал, в имени которого есть одно из ключевых слов (без учета регистра).
+
+        Результат запоминается, включая отсутствие подходящего канала, до изменения каналов сервера.
+        """
+        self.stats['lookups'] += 1
+        index = self._index(guild)
+        key = (tuple(word.lower() for word in keywords), kind)
+        if key in index.keyword_memo:
+            channel_id = index.keyword_memo[key]
+            if channel_id is None:
+                self.stats['memo_hits'] += 1
+                return None
+            channel = guild.get_channel(channel_id)
+            if channel is not None:
+                self.stats['memo_hits'] += 1
+                return channel
+
+        self.stats['scans'] += 1
+        found = None
+        for channel in guild.channels:
+            if (kind is None or isinstance(channel, kind)) and any(word in channel.name.lower() for word in key[0]):
+                found = channel
+                break
+        index.keyword_memo[key] = found.id if found else None
+        return found
+
+    # --- Обновление ---
+
+    def track(self, obj):
+        """Добавляет только что созданный канал или роль, не дожидаясь события от Discord"""
+        index = self.indexes.get(obj.guild.id)
+        if index is None:
+            return
+        if isinstance(obj, discord.Role):
+            index.add_role(obj)
+        else:
+            index.add_channel(obj)
+
+    def forget_guild(self, guild_id: int):
+        self.indexes.pop(guild_id, None)
+
+    def install_listeners(self):
+        """Подписывает справочник на события раньше остальных систем"""
+        bus = setup_event_bus(self.bot)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_channel_create')
+        async def on_guild_channel_create(channel):
+            self.track(channel)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_channel_update')
+        async def on_guild_channel_update(before, after):
+            if before.name != after.name or before.category_id != after.category_id:
+                self.track(after)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_channel_delete')
+        async def on_guild_channel_delete(channel):
+            index = self.indexes.get(channel.guild.id)
+            if index is not None:
+                index.remove_channel(channel.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_role_create')
+        async def on_guild_role_create(role):
+            self.track(role)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_role_update')
+        async def on_guild_role_update(before, after):
+            if before.name != after.name:
+                self.track(after)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_role_delete')
+        async def on_guild_role_delete(role):
+            index = self.indexes.get(role.guild.id)
+            if index is not None:
+                index.remove_role(role.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_remove')
+        async def on_guild_remove(guild):
+            self.forget_guild(guild.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='guild_directory.on_guild_available')
+        async def on_guild_available(guild):
+            # После переподключения кэш discord.py собран заново
+            self.forget_guild(guild.id)
+
+    def get_stats(self) -> Dict:
+        return {
+            'guilds': len(self.indexes),
+            'channels': sum(len(index.channel_records) for index in self.indexes.values()),
+            'roles': sum(len(index.role_names) for index in self.indexes.values()),
+            'keyword_memos': sum(len(index.keyword_memo) for index in self.indexes.values()),
+            **self.stats
+        }
+
+
+def get_guild_directory(bot) -> GuildDirectory:
+    """Возвращает справочник сервера бота, создавая и подписывая его при первом обращении"""
+    if not hasattr(bot, 'guild_directory'):
+        directory = GuildDirectory(bot)
+        bot.guild_directory = directory
+        directory.install_listeners()
+    return bot.guild_directory
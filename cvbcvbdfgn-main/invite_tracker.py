@@ -0,0 +1,360 @@
+"""
+Учет приглашений для Discord бота
+Снимок приглашений сервера обновляется событиями создания и удаления, а входы
+собираются в пачку и сверяются с одним запросом guild.invites(): выросший счетчик
+использований показывает, через какое приглашение зашли участники. Если через одно
+приглашение идет поток входов, оно приостанавливается (удаляется с сохранением
+настроек) - остальные приглашения и сервер продолжают работать
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+from event_bus import setup_event_bus, PRIORITY_INDEX
+from sliding_counter import SlidingCounterMap
+
+logger = logging.getLogger('invite_tracker')
+
+PAUSED_FILE = "paused_invites.json"
+SYNC_DELAY = 1.0  # Входы за это время сверяются одним запросом (секунды)
+BURST_WINDOW = 60  # Окно подсчета использований приглашения (секунды)
+BURST_USES = 8  # Использований одного приглашения за окно, после которых оно приостанавливается
+DELETED_TTL = 30  # Сколько помнить удаленное приглашение: вход по последнему использованию приходит после удаления
+MAX_ATTRIBUTIONS = 10_000
+VANITY = 'vanity'
+
+
+class InviteRecord:
+    """Настройки и счетчик использований приглашения"""
+
+    __slots__ = ('code', 'uses', 'max_uses', 'max_age', 'temporary', 'channel_id', 'inviter_id')
+
+    def __init__(self, code: str, uses: int, max_uses: int, max_age: int, temporary: bool,
+                 channel_id: Optional[int], inviter_id: Optional[int]):
+        self.code = code
+        self.uses = uses
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.temporary = temporary
+        self.channel_id = channel_id
+        self.inviter_id = inviter_id
+
+    @classmethod
+    def from_invite(cls, invite: discord.Invite) -> 'InviteRecord':
+        return cls(
+            invite.code,
+            invite.uses or 0,
+            invite.max_uses or 0,
+            invite.max_age or 0,
+            bool(invite.temporary),
+            invite.channel.id if invite.channel else None,
+            invite.inviter.id if invite.inviter else None
+        )
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'InviteRecord':
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+
+class GuildInvites:
+    """Снимок приглашений одного сервера и входы, ожидающие сверки"""
+
+    def __init__(self):
+        self.records: Dict[str, InviteRecord] = {}
+        self.deleted: Dict[str, tuple] = {}  # код -> (запись, время удаления)
+        self.pending: List[int] = []  # id вошедших участников
+        self.primed = False
+        self.sync_task: Optional[asyncio.Task] = None
+
+
+class InviteTracker:
+    """Приписывает входы приглашениям и приостанавливает приглашения с потоком входов"""
+
+    def __init__(self, bot, storage_file: str = PAUSED_FILE):
+        self.bot = bot
+        self.storage_file = storage_file
+        self.guilds: Dict[int, GuildInvites] = {}
+        self.attributions: 'OrderedDict[tuple, Optional[str]]' = OrderedDict()  # (сервер, участник) -> код
+        self.uses = SlidingCounterMap(BURST_WINDOW, resolution=1, max_keys=10_000)  # (сервер, код) -> входы
+        self.paused: Dict[int, Dict[str, InviteRecord]] = {}  # Сервер -> код -> настройки для возобновления
+        # (сервер, код) -> когда о потоке сообщено: одно уведомление на код за окно, даже если приостановить не вышло
+        self.burst_reported: Dict[tuple, float] = {}
+        # Вызывается при потоке входов: (сервер, код, входов за окно, приостановлено ли)
+        self.on_burst: Optional[Callable[..., Awaitable]] = None
+        self.forbidden_warned = set()
+        self.stats = {'joins': 0, 'attributed': 0, 'ambiguous': 0, 'syncs': 0, 'paused': 0}
+        self._load()
+
+    def _guild(self, guild_id: int) -> GuildInvites:
+        state = self.guilds.get(guild_id)
+        if state is None:
+            state = self.guilds[guild_id] = GuildInvites()
+        return state
+
+    # --- Снимок ---
+
+    async def _fetch(self, guild: discord.Guild) -> Optional[List[discord.Invite]]:
+        try:
+            return await guild.invites()
+        except discord.Forbidden:
+            if guild.id not in self.forbidden_warned:
+                self.forbidden_warned.add(guild.id)
+                logger.warning(f"Нет права управления сервером для чтения приглашений {guild.name}")
+        except Exception as e:
+            logger.error(f"Ошибка получения приглашений сервера {guild.name}: {e}")
+        return None
+
+    async def prime(self, guild: discord.Guild):
+        """Полный снимок приглашений; дальше он обновляется событиями и сверками"""
+        invites = await self._fetch(guild)
+        if invites is None:
+            return
+        state = self._guild(guild.id)
+        state.records = {invite.code: InviteRecord.from_invite(invite) for invite in invites}
+        state.deleted.clear()
+        state.primed = True
+        logger.info(f"Снимок приглашений {guild.name}: {len(state.records)}")
+
+    def track_created(self, invite: discord.Invite):
+        if invite.guild is None:
+            return
+        self._guild(invite.guild.id).records[invite.code] = InviteRecord.from_invite(invite)
+
+    def track_deleted(self, invite: discord.Invite):
+        if invite.guild is None:
+            return
+        state = self._guild(invite.guild.id)
+        record = state.records.pop(invite.code, None)
+        if record is not None:
+            state.deleted[invite.code] = (record, time.monotonic())
+
+    # --- Входы ---
+
+    def track_join(self, member: discord.Member):
+        """Ставит вход в очередь; сверка выполняется одним запросом на пачку входов"""
+        self.stats['joins'] += 1
+        state = self._guild(member.guild.id)
+        state.pending.append(member.id)
+        if state.sync_task is None or state.sync_task.done():
+            state.sync_task = asyncio.create_task(self._sync_later(member.guild))
+
+    async def _sync_later(self, guild: discord.Guild):
+        state = self._guild(guild.id)
+        # Входы во время сверки попадают в следующую пачку
+        while state.pending:
+            await asyncio.sleep(SYNC_DELAY)
+            try:
+                await self._sync(guild)
+            except Exception as e:
+                logger.error(f"Ошибка сверки приглашений: {e}")
+
+    async def _sync(self, guild: discord.Guild):
+        state = self._guild(guild.id)
+        # Счетчик использований растет до события входа, поэтому эти входы уже видны в ответе
+        pending, state.pending = state.pending, []
+        if not state.primed:
+            # Без исходного снимка разницу посчитать нельзя: эти входы остаются без приглашения
+            await self.prime(guild)
+            return
+
+        invites = await self._fetch(guild)
+        if invites is None:
+            return
+        self.stats['syncs'] += 1
+
+        deltas: Dict[str, int] = {}
+        fresh = {}
+        for invite in invites:
+            record = InviteRecord.from_invite(invite)
+            fresh[invite.code] = record
+            previous = state.records.get(invite.code)
+            if previous is not None and record.uses > previous.uses:
+                deltas[invite.code] = record.uses - previous.uses
+
+        # Приглашение с ограничением использований исчезает после последнего входа;
+        # каждое исчезнувшее учитывается одной сверкой, приостановленные ботом - ни одной
+        now = time.monotonic()
+        paused = self.paused.get(guild.id, {})
+        vanished = [(code, record) for code, record in state.records.items() if code not in fresh]
+        vanished += [(code, record) for code, (record, deleted_at) in state.deleted.items()
+                     if now - deleted_at <= DELETED_TTL and code not in fresh]
+        for code, record in vanished:
+            if code not in paused and record.max_uses and record.uses < record.max_uses:
+                deltas[code] = max(deltas.get(code, 0), record.max_uses - record.uses)
+        state.records = fresh
+        state.deleted = {}
+
+        if not deltas and pending and guild.vanity_url_code:
+            deltas[VANITY] = len(pending)
+
+        code = next(iter(deltas)) if len(deltas) == 1 else None
+        if code is None and deltas:
+            self.stats['ambiguous'] += len(pending)
+        for member_id in pending:
+            self._attribute(guild.id, member_id, code)
+
+        for changed_code, delta in deltas.items():
+            if changed_code == VANITY:
+                # Личную ссылку приостановить нельзя, а сюда же попадают входы без найденного приглашения
+                continue
+            count = self.uses.add((guild.id, changed_code), delta)
+            if count >= BURST_USES:
+                await self._handle_burst(guild, changed_code, count)
+
+    def _attribute(self, guild_id: int, member_id: int, code: Optional[str]):
+        if code is not None:
+            self.stats['attributed'] += 1
+        key = (guild_id, member_id)
+        self.attributions[key] = code
+        self.attributions.move_to_end(key)
+        if len(self.attributions) > MAX_ATTRIBUTIONS:
+            self.attributions.popitem(last=False)
+
+    def invite_for(self, guild_id: int, member_id: int) -> Optional[str]:
+        """Код приглашения, через которое зашел участник (None - неизвестно)"""
+        return self.attributions.get((guild_id, member_id))
+
+    def summarize(self, guild_id: int, member_ids) -> str:
+        """Распределение участников по приглашениям для отчета"""
+        counts: Dict[str, int] = {}
+        for member_id in member_ids:
+            code = self.invite_for(guild_id, member_id) or "неизвестно"
+            counts[code] = counts.get(code, 0) + 1
+        return ", ".join(f"{code}: {count}" for code, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+    # --- Приостановка ---
+
+    async def _handle_burst(self, guild: discord.Guild, code: str, count: int):
+        if code in self.paused.get(guild.id, {}):
+            return
+        now = time.monotonic()
+        key = (guild.id, code)
+        reported_at = self.burst_reported.get(key)
+        if reported_at is not None and now - reported_at < BURST_WINDOW:
+            return
+        self.burst_reported = {other: at for other, at in self.burst_reported.items() if now - at < BURST_WINDOW}
+        self.burst_reported[key] = now
+        paused = await self.pause(guild, code, reason=f"Поток входов: {count} за {BURST_WINDOW} с")
+        if self.on_burst:
+            try:
+                await self.on_burst(guild, code, count, paused)
+            except Exception as e:
+                logger.error(f"Ошибка обработки потока входов по приглашению {code}: {e}")
+
+    async def pause(self, guild: discord.Guild, code: str, reason: Optional[str] = None) -> bool:
+        """Удаляет приглашение, сохранив настройки для !invite_resume"""
+        if code == VANITY:
+            return False
+        record = self._guild(guild.id).records.get(code)
+        if record is None:
+            return False
+        # Настройки сохраняются до удаления: событие удаления и перезапуск не должны их потерять
+        self.paused.setdefault(guild.id, {})[code] = record
+        self._save()
+        try:
+            await self.bot.delete_invite(code, reason=reason)
+        except discord.NotFound:
+            self.paused.get(guild.id, {}).pop(code, None)
+            self._save()
+            return False
+        except Exception as e:
+            self.paused.get(guild.id, {}).pop(code, None)
+            self._save()
+            logger.error(f"Ошибка приостановки приглашения {code}: {e}")
+            return False
+        self.stats['paused'] += 1
+        logger.warning(f"Приглашение {code} приостановлено: {reason}")
+        return True
+
+    async def resume(self, guild: discord.Guild, code: str, reason: Optional[str] = None) -> Optional[discord.Invite]:
+        """Создает приглашение с настройками приостановленного (код у него будет новый)"""
+        record = self.paused.get(guild.id, {}).get(code)
+        if record is None:
+            return None
+        channel = guild.get_channel(record.channel_id) if record.channel_id else None
+        if channel is None:
+            raise ValueError(f"Канал приглашения {code} не найден")
+        invite = await channel.create_invite(
+            max_age=record.max_age, max_uses=record.max_uses, temporary=record.temporary,
+            unique=True, reason=reason
+        )
+        del self.paused[guild.id][code]
+        self._save()
+        self.track_created(invite)
+        return invite
+
+    def paused_invites(self, guild_id: int) -> Dict[str, InviteRecord]:
+        return dict(self.paused.get(guild_id, {}))
+
+    # --- События ---
+
+    def install_listeners(self):
+        bus = setup_event_bus(self.bot)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='invite_tracker.on_invite_create')
+        async def on_invite_create(invite):
+            self.track_created(invite)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='invite_tracker.on_invite_delete')
+        async def on_invite_delete(invite):
+            self.track_deleted(invite)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='invite_tracker.on_member_join')
+        async def on_member_join(member):
+            self.track_join(member)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='invite_tracker.on_guild_available')
+        async def on_guild_available(guild):
+            # События приглашений за время отключения потеряны - снимок делается заново
+            await self.prime(guild)
+
+    # --- Сохранение ---
+
+    def _load(self):
+        if not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for guild_id, invites in data.items():
+                self.paused[int(guild_id)] = {code: InviteRecord.from_dict(item) for code, item in invites.items()}
+        except Exception as e:
+            logger.error(f"Ошибка загрузки приостановленных приглашений: {e}")
+
+    def _save(self):
+        try:
+            data = {str(guild_id): {code: record.to_dict() for code, record in invites.items()}
+                    for guild_id, invites in self.paused.items() if invites}
+            temp_file = f"{self.storage_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.storage_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения приостановленных приглашений: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            'guilds': len(self.guilds),
+            'invites': sum(len(state.records) for state in self.guilds.values()),
+            'paused_now': sum(len(invites) for invites in self.paused.values()),
+            **self.stats
+        }
+
+
+def get_invite_tracker(bot) -> InviteTracker:
+    """Возвращает учет приглашений бота, создавая и подписывая его при первом обращении"""
+    if not hasattr(bot, 'invite_tracker'):
+        tracker = InviteTracker(bot)
+        bot.invite_tracker = tracker
+        tracker.install_listeners()
+    return bot.invite_tracker
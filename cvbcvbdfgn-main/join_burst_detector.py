@@ -0,0 +1,259 @@
+"""
+Потоковое обнаружение скоординированных входов (рейдов альтов) для Discord бота
+Каждый вход раскладывается по хэш-корзинам признаков (основа имени, префикс имени,
+час создания аккаунта) и сравнивается только с недавними входами из тех же корзин,
+поэтому стоимость одного входа не растет вместе с окном наблюдения
+"""
+
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+WINDOW = 3600  # Сколько секунд помнить входы: медленный поток альтов растягивается на десятки минут
+BUCKET_LIMIT = 32  # Последних входов в одной корзине признаков; ограничивает число сравнений
+MAX_CLUSTERS = 2000
+MAX_REPORTED_MEMBERS = 200  # Сколько участников кластера хранить для отчета
+
+# Сходство пары, при котором входы попадают в один кластер. Одно похожее имя с близким временем входа
+# порог не проходит: нужен еще признак аккаунта (время создания или стандартный аватар)
+LINK_THRESHOLD = 0.55
+MIN_CLUSTER_SIZE = 5
+MIN_CLUSTER_SUSPICION = 0.4  # Средняя подозрительность участников кластера для срабатывания
+
+_DIGITS = re.compile(r'\d+')
+_SEPARATORS = re.compile(r'[\W_]+')
+_TRAILING_DIGITS = re.compile(r'\d{3,}$')
+
+
+def name_stem(name: str) -> str:
+    """Основа имени без цифр и разделителей: 'Raider_0423' и 'raider.77' дают 'raider'"""
+    return _SEPARATORS.sub('', _DIGITS.sub('', name.lower()))
+
+
+def member_suspicion(account_age_days: float, default_avatar: bool, name: str) -> float:
+    """Насколько вход похож на альт сам по себе (0..1)"""
+    score = 0.0
+    if account_age_days < 1:
+        score += 0.5
+    elif account_age_days < 7:
+        score += 0.35
+    elif account_age_days < 30:
+        score += 0.15
+    if default_avatar:
+        score += 0.25
+    if _TRAILING_DIGITS.search(name):
+        score += 0.15
+    return min(score, 1.0)
+
+
+class JoinRecord:
+    """Признаки одного входа"""
+
+    __slots__ = ('member_id', 'name', 'stem', 'joined', 'created', 'default_avatar', 'suspicion', 'cluster')
+
+    def __init__(self, member_id: int, name: str, joined: float, created: float, default_avatar: bool):
+        self.member_id = member_id
+        self.name = name
+        self.stem = name_stem(name)
+        self.joined = joined
+        self.created = created
+        self.default_avatar = default_avatar
+        self.suspicion = member_suspicion((joined - created) / 86400, default_avatar, name)
+        self.cluster: Optional['JoinCluster'] = None
+
+    def bucket_keys(self) -> List:
+        """Корзины, в которые запись кладется"""
+        keys = [('created', int(self.created // 3600))]
+        if len(self.stem) >= 3:
+            keys.append(('stem', self.stem))
+            keys.append(('prefix', self.stem[:4]))
+        return keys
+
+    def lookup_keys(self) -> List:
+        """Корзины, в которых ищутся похожие входы (соседние часы создания тоже)"""
+        hour = int(self.created // 3600)
+        keys = [('created', hour - 1), ('created', hour), ('created', hour + 1)]
+        if len(self.stem) >= 3:
+            keys.append(('stem', self.stem))
+            keys.append(('prefix', self.stem[:4]))
+        return keys
+
+
+def pair_similarity(a: JoinRecord, b: JoinRecord) -> float:
+    """Сходство двух входов по признакам"""
+    score = 0.0
+    if a.stem and a.stem == b.stem and len(a.stem) >= 3:
+        score += 0.4
+    elif len(a.stem) >= 4 and a.stem[:4] == b.stem[:4]:
+        score += 0.2
+
+    created_gap = abs(a.created - b.created)
+    if created_gap < 3600:
+        score += 0.3
+    elif created_gap < 86400:
+        score += 0.15
+
+    if a.default_avatar and b.default_avatar:
+        score += 0.15
+    if abs(a.joined - b.joined) < 120:
+        score += 0.1
+    return score
+
+
+class JoinCluster:
+    """Группа похожих входов"""
+
+    __slots__ = ('cluster_id', 'records', 'members', 'size', 'suspicion_total', 'link_total', 'links',
+                 'first_join', 'last_join', 'reported')
+
+    def __init__(self, cluster_id: int, record: JoinRecord):
+        self.cluster_id = cluster_id
+        self.records: List[JoinRecord] = [record]  # Все входы кластера, без ограничения
+        self.members: List[JoinRecord] = [record]  # Первые MAX_REPORTED_MEMBERS входов для отчета
+        self.size = 1
+        self.suspicion_total = record.suspicion
+        self.link_total = 0.0
+        self.links = 0
+        self.first_join = record.joined
+        self.last_join = record.joined
+        self.reported = False
+
+    @property
+    def suspicion(self) -> float:
+        return self.suspicion_total / self.size
+
+    @property
+    def cohesion(self) -> float:
+        """Среднее сходство связей внутри кластера"""
+        return self.link_total / self.links if self.links else 0.0
+
+    def describe(self) -> str:
+        """Общие признаки кластера для лога"""
+        stems = {record.stem for record in self.members if record.stem}
+        avatarless = sum(1 for record in self.members if record.default_avatar)
+        created = [record.created for record in self.members]
+        parts = [f"без аватара: {avatarless}/{len(self.members)}"]
+        if len(stems) <= 3:
+            parts.append(f"имена: {', '.join(sorted(stems))}")
+        parts.append(f"аккаунты созданы в пределах {(max(created) - min(created)) / 3600:.1f} ч")
+        return "; ".join(parts)
+
+
+class JoinBurstDetector:
+    """Потоковая кластеризация входов"""
+
+    def __init__(self):
+        self.buckets: Dict = {}
+        self.buckets_by_age: 'OrderedDict' = OrderedDict()  # Ключ корзины по времени последнего входа
+        self.clusters: 'OrderedDict[int, JoinCluster]' = OrderedDict()
+        self.next_cluster_id = 1
+        self.stats = {'joins': 0, 'comparisons': 0, 'clusters_reported': 0}
+
+    def observe(self, member_id: int, name: str, created: float, default_avatar: bool,
+                joined: Optional[float] = None) -> Optional[JoinCluster]:
+        """Учитывает вход. Возвращает кластер, если он только что стал похож на рейд."""
+        now = time.time() if joined is None else joined
+        record = JoinRecord(member_id, name, now, created, default_avatar)
+        self.stats['joins'] += 1
+        self._expire(now)
+
+        # Кандидаты только из своих корзин: не больше BUCKET_LIMIT на корзину
+        candidates = {}
+        for key in record.lookup_keys():
+            bucket = self.buckets.get(key)
+            if bucket:
+                for other in bucket:
+                    if other.member_id != member_id:
+                        candidates[other.member_id] = other
+
+        best_links: Dict[int, float] = {}
+        for other in candidates.values():
+            self.stats['comparisons'] += 1
+            similarity = pair_similarity(record, other)
+            if similarity >= LINK_THRESHOLD and other.cluster is not None:
+                cluster_id = other.cluster.cluster_id
+                best_links[cluster_id] = max(best_links.get(cluster_id, 0.0), similarity)
+
+        cluster = self._attach(record, best_links)
+
+        for key in record.bucket_keys():
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = deque(maxlen=BUCKET_LIMIT)
+            bucket.append(record)
+            self.buckets_by_age[key] = now
+            self.buckets_by_age.move_to_end(key)
+
+        if (not cluster.reported and cluster.size >= MIN_CLUSTER_SIZE
+                and cluster.suspicion >= MIN_CLUSTER_SUSPICION):
+            cluster.reported = True
+            self.stats['clusters_reported'] += 1
+            return cluster
+        return None
+
+    def _attach(self, record: JoinRecord, links: Dict[int, float]) -> JoinCluster:
+        """Добавляет запись в самый большой связанный кластер, остальные связанные кластеры сливает в него"""
+        linked = [self.clusters[cluster_id] for cluster_id in links if cluster_id in self.clusters]
+        if not linked:
+            cluster = JoinCluster(self.next_cluster_id, record)
+            self.next_cluster_id += 1
+            self.clusters[cluster.cluster_id] = cluster
+            if len(self.clusters) > MAX_CLUSTERS:
+                self.clusters.popitem(last=False)
+            record.cluster = cluster
+            return cluster
+
+        linked.sort(key=lambda item: item.size, reverse=True)
+        cluster = linked[0]
+        for other in linked[1:]:
+            self._merge(cluster, other)
+
+        record.cluster = cluster
+        cluster.size += 1
+        cluster.suspicion_total += record.suspicion
+        cluster.link_total += max(links.values())
+        cluster.links += 1
+        cluster.last_join = record.joined
+        cluster.records.append(record)
+        if len(cluster.members) < MAX_REPORTED_MEMBERS:
+            cluster.members.append(record)
+        self.clusters.move_to_end(cluster.cluster_id)
+        return cluster
+
+    def _merge(self, target: JoinCluster, source: JoinCluster):
+        # Источник всегда меньше цели, поэтому каждая запись переносится O(log n) раз
+        for record in source.records:
+            record.cluster = target
+        target.records.extend(source.records)
+        target.members.extend(source.members[:MAX_REPORTED_MEMBERS - len(target.members)])
+        target.size += source.size
+        target.suspicion_total += source.suspicion_total
+        target.link_total += source.link_total
+        target.links += source.links
+        target.first_join = min(target.first_join, source.first_join)
+        target.reported = target.reported or source.reported
+        self.clusters.pop(source.cluster_id, None)
+
+    def _expire(self, now: float):
+        """Удаляет корзины и кластеры без входов за окно (с начала упорядоченных словарей)"""
+        cutoff = now - WINDOW
+        while self.buckets_by_age:
+            key, last_seen = next(iter(self.buckets_by_age.items()))
+            if last_seen >= cutoff:
+                break
+            del self.buckets_by_age[key]
+            self.buckets.pop(key, None)
+        while self.clusters:
+            cluster = next(iter(self.clusters.values()))
+            if cluster.last_join >= cutoff:
+                break
+            self.clusters.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        return {
+            'buckets': len(self.buckets),
+            'clusters': len(self.clusters),
+            'largest_cluster': max((cluster.size for cluster in self.clusters.values()), default=0),
+            **self.stats
+        }
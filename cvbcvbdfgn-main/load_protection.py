@@ -0,0 +1,362 @@
+"""
+Система защиты бота от перегрузки
+Ограничивает частоту запросов пользователей и каналов, следит за CPU, памятью и временем ответа
+и при росте нагрузки поэтапно отключает дорогие функции
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from event_bus import setup_event_bus, PRIORITY_CORE
+from privilege_cache import get_privilege_cache, PRIV_BYPASS
+from config import (
+    LOAD_BYPASS_ROLE_ID,
+    LOAD_USER_RATE,
+    LOAD_USER_BURST,
+    LOAD_CHANNEL_RATE,
+    LOAD_CHANNEL_BURST,
+    LOAD_SAMPLE_INTERVAL
+)
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger('load_protection')
+
+# Уровни нагрузки по возрастанию: пороги входа, множитель лимитов и отключаемые функции
+LOAD_LEVELS = [
+    ('normal', {'cpu': 0, 'memory': 0, 'p95': 0.0, 'rate_factor': 1.0, 'disabled': ()}),
+    ('medium', {'cpu': 60, 'memory': 70, 'p95': 1.0, 'rate_factor': 0.75, 'disabled': ('message_logging',)}),
+    ('high', {'cpu': 75, 'memory': 80, 'p95': 2.0, 'rate_factor': 0.5, 'disabled': ('message_logging', 'music')}),
+    ('critical', {'cpu': 90, 'memory': 90, 'p95': 4.0, 'rate_factor': 0.25, 'disabled': ('message_logging', 'music', 'commands')}),
+]
+LEVEL_NAMES = [name for name, _ in LOAD_LEVELS]
+
+LEVEL_DOWN_MARGIN = 0.85  # Для снижения уровня метрики должны опуститься ниже 85% порога
+LEVEL_DOWN_SAMPLES = 3  # Столько замеров подряд нужно для снижения уровня
+SLOW_RESPONSE_THRESHOLD = 2.0  # Медленный ответ (секунды)
+RESPONSE_SAMPLES = 500  # Размер выборки времени ответа для перцентилей
+NOTICE_COOLDOWN = 30  # Как часто предупреждать пользователя об ограничении (секунды)
+
+
+class TokenBucket:
+    """Корзина токенов: пополняется с постоянной скоростью, запрос забирает один токен"""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, rate: float, capacity: float, now: float) -> bool:
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class RequestsPerMinute:
+    """Скользящее окно запросов за минуту из 60 секундных ячеек"""
+
+    def __init__(self):
+        self.counts = [0] * 60
+        self.seconds = [0] * 60
+
+    def add(self, now: float):
+        second = int(now)
+        index = second % 60
+        if self.seconds[index] != second:
+            self.seconds[index] = second
+            self.counts[index] = 0
+        self.counts[index] += 1
+
+    def total(self, now: float) -> int:
+        second = int(now)
+        return sum(count for count, stamp in zip(self.counts, self.seconds) if second - stamp < 60)
+
+
+class LoadProtectionSystem:
+    """Ограничение частоты запросов и градуированное снижение нагрузки"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.bypass_role_id = LOAD_BYPASS_ROLE_ID
+        self.privileges = get_privilege_cache(bot)
+        self.privileges.assign_roles(PRIV_BYPASS, [self.bypass_role_id])
+        self.user_buckets: Dict[int, TokenBucket] = {}
+        self.channel_buckets: Dict[int, TokenBucket] = {}
+        self.last_notice: Dict[int, float] = {}
+        self.requests_per_minute = RequestsPerMinute()
+        self.response_times = deque(maxlen=RESPONSE_SAMPLES)
+        self.pending_commands: Dict[int, float] = {}
+
+        self.level_index = 0
+        self.calm_samples = 0
+        self.cpu_percent = 0.0
+        self.memory_percent = 0.0
+        self.memory_mb = 0.0
+
+        self.stats = {
+            'total_requests': 0,
+            'rate_limited': 0,
+            'slow_responses': 0,
+            'overload_events': 0,
+            'optimizations_applied': 0
+        }
+        self.start_time = time.time()
+        self.monitor_task: Optional[asyncio.Task] = None
+        self.process = psutil.Process() if psutil else None
+
+    @property
+    def current_level(self) -> str:
+        return LEVEL_NAMES[self.level_index]
+
+    @property
+    def level_settings(self) -> Dict:
+        return LOAD_LEVELS[self.level_index][1]
+
+    def has_bypass(self, member) -> bool:
+        """Участники с ролью обхода не ограничиваются"""
+        if member is None:
+            return False
+        return self.privileges.has(member, PRIV_BYPASS)
+
+    def is_rate_limited(self, user_id: int, member=None, channel_id: Optional[int] = None) -> bool:
+        """Проверяет лимиты пользователя и канала и списывает токен, если запрос пропущен"""
+        if self.has_bypass(member):
+            return False
+
+        now = time.monotonic()
+        factor = self.level_settings['rate_factor']
+
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self.user_buckets[user_id] = TokenBucket(LOAD_USER_BURST, now)
+        if not bucket.consume(LOAD_USER_RATE * factor, LOAD_USER_BURST, now):
+            self.stats['rate_limited'] += 1
+            return True
+
+        if channel_id is not None:
+            bucket = self.channel_buckets.get(channel_id)
+            if bucket is None:
+                bucket = self.channel_buckets[channel_id] = TokenBucket(LOAD_CHANNEL_BURST, now)
+            if not bucket.consume(LOAD_CHANNEL_RATE * factor, LOAD_CHANNEL_BURST, now):
+                self.stats['rate_limited'] += 1
+                return True
+
+        return False
+
+    def should_notify(self, user_id: int) -> bool:
+        """Предупреждение об ограничении отправляется не чаще раза в NOTICE_COOLDOWN секунд"""
+        now = time.monotonic()
+        if now - self.last_notice.get(user_id, 0.0) < NOTICE_COOLDOWN:
+            return False
+        self.last_notice[user_id] = now
+        return True
+
+    def is_feature_disabled(self, feature: str, member=None) -> bool:
+        """Проверяет, отключена ли функция на текущем уровне нагрузки"""
+        if feature not in self.level_settings['disabled']:
+            return False
+        return not self.has_bypass(member)
+
+    def record_request(self, user_id: int, channel_id: int):
+        """Учитывает запрос в метриках нагрузки"""
+        self.stats['total_requests'] += 1
+        self.requests_per_minute.add(time.time())
+
+    def record_response_time(self, seconds: float):
+        """Учитывает время ответа"""
+        self.response_times.append(seconds)
+        if seconds > SLOW_RESPONSE_THRESHOLD:
+            self.stats['slow_responses'] += 1
+
+    def get_percentile(self, percentile: float) -> float:
+        """Возвращает перцентиль времени ответа по последним замерам"""
+        if not self.response_times:
+            return 0.0
+        samples = sorted(self.response_times)
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def sample_resources(self):
+        """Замеряет CPU и память"""
+        if not psutil:
+            return
+        try:
+            # interval=None не блокирует цикл событий: процент считается с прошлого вызова
+            self.cpu_percent = psutil.cpu_percent(interval=None)
+            self.memory_percent = psutil.virtual_memory().percent
+            self.memory_mb = self.process.memory_info().rss / 1024 / 1024
+        except Exception as e:
+            logger.warning(f"Ошибка замера ресурсов: {e}")
+
+    def _target_level(self, p95: float) -> int:
+        """Самый высокий уровень, порог которого превышен хотя бы одной метрикой"""
+        target = 0
+        for index, (_, settings) in enumerate(LOAD_LEVELS):
+            if index and (self.cpu_percent >= settings['cpu'] or
+                          self.memory_percent >= settings['memory'] or
+                          p95 >= settings['p95']):
+                target = index
+        return target
+
+    def _below_current_level(self, p95: float) -> bool:
+        """Метрики с запасом ниже порогов текущего уровня"""
+        settings = self.level_settings
+        return (self.cpu_percent < settings['cpu'] * LEVEL_DOWN_MARGIN and
+                self.memory_percent < settings['memory'] * LEVEL_DOWN_MARGIN and
+                p95 < settings['p95'] * LEVEL_DOWN_MARGIN)
+
+    async def evaluate_load(self):
+        """Пересчитывает уровень нагрузки: вверх сразу, вниз по одному уровню после нескольких спокойных замеров"""
+        p95 = self.get_percentile(95)
+        target = self._target_level(p95)
+
+        if target > self.level_index:
+            self.calm_samples = 0
+            self.stats['overload_events'] += 1
+            await self._set_level(target)
+        elif self.level_index and self._below_current_level(p95):
+            self.calm_samples += 1
+            if self.calm_samples >= LEVEL_DOWN_SAMPLES:
+                self.calm_samples = 0
+                await self._set_level(self.level_index - 1)
+        else:
+            self.calm_samples = 0
+
+    async def _set_level(self, index: int):
+        """Переключает уровень и применяет изменения функций"""
+        previous = self.level_settings['disabled']
+        old_level = self.current_level
+        self.level_index = index
+        current = self.level_settings['disabled']
+
+        if index > 0:
+            self.stats['optimizations_applied'] += 1
+        logger.warning(f"Уровень нагрузки: {old_level} -> {self.current_level} "
+                       f"(CPU {self.cpu_percent:.1f}%, RAM {self.memory_percent:.1f}%, p95 {self.get_percentile(95):.2f}с)")
+
+        for feature in current:
+            if feature not in previous:
+                logger.warning(f"Функция {feature} отключена из-за нагрузки")
+        for feature in previous:
+            if feature not in current:
+                logger.info(f"Функция {feature} снова включена")
+
+        # Музыка - единственная функция, которую нужно остановить или запустить явно
+        if hasattr(self.bot, 'music_system'):
+            try:
+                if 'music' in current and 'music' not in previous:
+                    await self.bot.music_system.stop_playing()
+                elif 'music' in previous and 'music' not in current:
+                    await self.bot.music_system.start_playing()
+            except Exception as e:
+                logger.error(f"Ошибка переключения музыки при смене уровня нагрузки: {e}")
+
+    def _prune_buckets(self):
+        """Удаляет полностью восстановившиеся корзины неактивных пользователей и каналов"""
+        now = time.monotonic()
+        for buckets, rate, capacity in ((self.user_buckets, LOAD_USER_RATE, LOAD_USER_BURST),
+                                        (self.channel_buckets, LOAD_CHANNEL_RATE, LOAD_CHANNEL_BURST)):
+            idle = capacity / (rate * LOAD_LEVELS[-1][1]['rate_factor'])
+            stale = [key for key, bucket in buckets.items() if now - bucket.updated > idle]
+            for key in stale:
+                del buckets[key]
+        stale = [user_id for user_id, stamp in self.last_notice.items() if now - stamp > NOTICE_COOLDOWN]
+        for user_id in stale:
+            del self.last_notice[user_id]
+
+    async def monitor_loop(self):
+        """Фоновый замер нагрузки"""
+        if psutil:
+            psutil.cpu_percent(interval=None)  # Первый вызов только задает точку отсчета
+        while True:
+            try:
+                await asyncio.sleep(LOAD_SAMPLE_INTERVAL)
+                self.sample_resources()
+                await self.evaluate_load()
+                self._prune_buckets()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка мониторинга нагрузки: {e}")
+
+    def start(self):
+        """Запускает фоновый мониторинг"""
+        if self.monitor_task is None or self.monitor_task.done():
+            self.monitor_task = asyncio.create_task(self.monitor_loop())
+
+    async def get_load_stats(self) -> Dict:
+        """Возвращает статистику нагрузки"""
+        response_times = list(self.response_times)
+        return {
+            'current_load_level': self.current_level,
+            'optimization_mode': self.level_index > 0,
+            'disabled_features': list(self.level_settings['disabled']),
+            'cpu_percent': self.cpu_percent,
+            'memory_percent': self.memory_percent,
+            'memory_mb': self.memory_mb,
+            'average_response_time': sum(response_times) / len(response_times) if response_times else 0.0,
+            'p50_response_time': self.get_percentile(50),
+            'p95_response_time': self.get_percentile(95),
+            'requests_per_minute': self.requests_per_minute.total(time.time()),
+            'total_requests': self.stats['total_requests'],
+            'rate_limited': self.stats['rate_limited'],
+            'slow_responses': self.stats['slow_responses'],
+            'overload_events': self.stats['overload_events'],
+            'optimizations_applied': self.stats['optimizations_applied'],
+            'tracked_users': len(self.user_buckets),
+            'uptime_hours': (time.time() - self.start_time) / 3600
+        }
+
+    async def reset_optimizations(self):
+        """Возвращает нормальный уровень и сбрасывает лимиты"""
+        if self.level_index:
+            await self._set_level(0)
+        self.calm_samples = 0
+        self.user_buckets.clear()
+        self.channel_buckets.clear()
+        self.last_notice.clear()
+        self.response_times.clear()
+        logger.info("Оптимизации нагрузки сброшены")
+
+
+async def setup_load_protection(bot):
+    """Настройка системы защиты от перегрузки"""
+    try:
+        load_protection = LoadProtectionSystem(bot)
+        bot.load_protection = load_protection
+        bus = setup_event_bus(bot)
+
+        @bus.listen(priority=PRIORITY_CORE, name='load_protection.on_command')
+        async def on_command(ctx):
+            load_protection.pending_commands[ctx.message.id] = time.perf_counter()
+
+        @bus.listen(priority=PRIORITY_CORE, name='load_protection.on_command_completion')
+        async def on_command_completion(ctx):
+            start = load_protection.pending_commands.pop(ctx.message.id, None)
+            if start is not None:
+                load_protection.record_response_time(time.perf_counter() - start)
+
+        @bus.listen(priority=PRIORITY_CORE, name='load_protection.on_command_error')
+        async def on_command_error(ctx, error):
+            start = load_protection.pending_commands.pop(ctx.message.id, None)
+            if start is not None:
+                load_protection.record_response_time(time.perf_counter() - start)
+
+        load_protection.start()
+        if not psutil:
+            logger.warning("psutil не установлен, уровень нагрузки считается только по времени ответа")
+
+        logger.info("Система защиты от перегрузки настроена")
+
+    except Exception as e:
+        logger.error(f"Ошибка настройки системы защиты от перегрузки: {e}")
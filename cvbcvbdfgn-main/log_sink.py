@@ -0,0 +1,230 @@
+"""
+Очередь отправки логов в каналы Discord
+Собирает эмбеды в сообщения по 10 штук, отправляет их с учетом лимитов канала
+и обслуживает полосы по приоритету: события безопасности идут раньше активности
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, List
+
+import discord
+
+logger = logging.getLogger('log_sink')
+
+# Полосы приоритета: меньше число - раньше отправка
+LANE_SECURITY = 0     # Рейды, защита, блокировки
+LANE_MODERATION = 1   # Действия модераторов
+LANE_ACTIVITY = 2     # Сообщения, реакции, голосовые каналы
+LANE_NAMES = ('security', 'moderation', 'activity')
+
+MAX_EMBEDS_PER_MESSAGE = 10  # Ограничение Discord
+MAX_EMBED_CHARS_PER_MESSAGE = 6000  # Суммарный размер эмбедов в одном сообщении
+MIN_SEND_INTERVAL = 1.0  # Пауза между отправками в один канал (секунды)
+BATCH_WINDOW = 0.5  # Сколько ждать попутных логов, если в очереди нет событий безопасности
+MAX_BACKLOG = 500  # Максимум ожидающих эмбедов на канал
+BACKLOG_WARNING_INTERVAL = 60  # Как часто предупреждать о переполнении (секунды)
+
+
+class LogEntry:
+    """Эмбед в очереди и future, который получит (сообщение, индекс эмбеда)"""
+
+    __slots__ = ('embed', 'lane', 'future', 'submitted')
+
+    def __init__(self, embed: discord.Embed, lane: int, future: asyncio.Future):
+        self.embed = embed
+        self.lane = lane
+        self.future = future
+        self.submitted = time.monotonic()
+
+
+class ChannelQueue:
+    """Очередь одного канала с полосами приоритета и собственной задачей отправки"""
+
+    def __init__(self, sink, channel):
+        self.sink = sink
+        self.channel = channel
+        self.lanes = [deque() for _ in LANE_NAMES]
+        self.wakeup = asyncio.Event()
+        self.last_send = 0.0
+        self.last_backlog_warning = 0.0
+        self.worker = asyncio.create_task(self._run())
+
+    def __len__(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def push(self, entry: LogEntry):
+        self.lanes[entry.lane].append(entry)
+        if len(self) > MAX_BACKLOG:
+            self._drop_one()
+        self.wakeup.set()
+
+    def _drop_one(self):
+        """Выбрасывает самый старый лог из наименее важной непустой полосы"""
+        for lane_index in range(len(self.lanes) - 1, -1, -1):
+            lane = self.lanes[lane_index]
+            if lane:
+                entry = lane.popleft()
+                if not entry.future.done():
+                    entry.future.set_result(None)
+                self.sink.record_drop(self.channel, lane_index)
+                break
+
+        now = time.monotonic()
+        if now - self.last_backlog_warning > BACKLOG_WARNING_INTERVAL:
+            self.last_backlog_warning = now
+            logger.warning(f"Очередь логов канала {self.channel} переполнена ({MAX_BACKLOG}), "
+                           f"выброшено всего: {self.sink.stats['dropped']}")
+
+    def _take_batch(self) -> List[LogEntry]:
+        """Берет до 10 эмбедов, начиная с самой приоритетной полосы"""
+        batch = []
+        size = 0
+        for lane in self.lanes:
+            while lane and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                embed_size = len(lane[0].embed)
+                if batch and size + embed_size > MAX_EMBED_CHARS_PER_MESSAGE:
+                    return batch
+                batch.append(lane.popleft())
+                size += embed_size
+        return batch
+
+    async def _run(self):
+        while True:
+            try:
+                if not len(self):
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+
+                await self._wait_batch_window()
+
+                pause = self.last_send + MIN_SEND_INTERVAL - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+
+                batch = self._take_batch()
+                if batch:
+                    await self._send(batch)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка очереди логов канала {self.channel}: {e}")
+                await asyncio.sleep(1)
+
+    async def _wait_batch_window(self):
+        """Если ждут только обычные логи и их мало, дает соседним событиям попасть в ту же пачку.
+        Событие безопасности прерывает ожидание сразу."""
+        deadline = time.monotonic() + BATCH_WINDOW
+        while not self.lanes[LANE_SECURITY] and len(self) < MAX_EMBEDS_PER_MESSAGE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+
+    async def _send(self, batch: List[LogEntry]):
+        self.last_send = time.monotonic()
+        try:
+            try:
+                message = await self.channel.send(embeds=[entry.embed for entry in batch])
+                results = [(message, index) for index in range(len(batch))]
+            except discord.HTTPException as e:
+                logger.error(f"Ошибка отправки пачки логов ({len(batch)}) в канал {self.channel}: {e}")
+                results = [None] * len(batch)
+                # Один некорректный эмбед не должен терять всю пачку: отправляем по одному
+                if e.status == 400 and len(batch) > 1:
+                    for index, entry in enumerate(batch):
+                        try:
+                            results[index] = (await self.channel.send(embed=entry.embed), 0)
+                        except Exception:
+                            pass
+                    self.last_send = time.monotonic()
+            except Exception as e:
+                # Сетевые ошибки и тайм-ауты aiohttp - не HTTPException
+                logger.error(f"Ошибка отправки пачки логов ({len(batch)}) в канал {self.channel}: {e}")
+                results = [None] * len(batch)
+
+            now = time.monotonic()
+            for entry, result in zip(batch, results):
+                if result:
+                    self.sink.record_sent(self.channel, entry.lane, now - entry.submitted)
+                else:
+                    self.sink.stats['failed'] += 1
+                if not entry.future.done():
+                    entry.future.set_result(result)
+        finally:
+            # Кто ждет отправки (например, запрос причины), не должен зависнуть, даже если задачу отменили
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_result(None)
+
+
+class LogSink:
+    """Общая очередь логов для всех систем бота"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.queues: Dict[int, ChannelQueue] = {}
+        self.stats = {
+            'submitted': 0,
+            'sent': 0,
+            'failed': 0,
+            'dropped': 0,
+            'dropped_by_lane': [0] * len(LANE_NAMES),
+            'max_lag': 0.0,
+            'total_lag': 0.0
+        }
+
+    def submit(self, channel, embed: discord.Embed, lane: int = LANE_ACTIVITY) -> asyncio.Future:
+        """Ставит эмбед в очередь канала.
+
+        Возвращает future с (сообщение, индекс эмбеда в сообщении) после отправки
+        или None, если лог выброшен при переполнении или отправка не удалась.
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.get(channel.id)
+        if queue is None or queue.worker.done():
+            queue = self.queues[channel.id] = ChannelQueue(self, channel)
+        self.stats['submitted'] += 1
+        queue.push(LogEntry(embed, lane, future))
+        return future
+
+    def record_sent(self, channel, lane: int, lag: float):
+        self.stats['sent'] += 1
+        self.stats['total_lag'] += lag
+        if lag > self.stats['max_lag']:
+            self.stats['max_lag'] = lag
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.observe('log_sink_lag', LANE_NAMES[lane], lag)
+
+    def record_drop(self, channel, lane: int):
+        self.stats['dropped'] += 1
+        self.stats['dropped_by_lane'][lane] += 1
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.increment('log_sink_dropped', LANE_NAMES[lane])
+
+    def get_stats(self) -> Dict:
+        sent = self.stats['sent']
+        return {
+            'submitted': self.stats['submitted'],
+            'sent': sent,
+            'failed': self.stats['failed'],
+            'dropped': self.stats['dropped'],
+            'dropped_by_lane': dict(zip(LANE_NAMES, self.stats['dropped_by_lane'])),
+            'average_lag': self.stats['total_lag'] / sent if sent else 0.0,
+            'max_lag': self.stats['max_lag'],
+            'backlog': {queue.channel.id: len(queue) for queue in self.queues.values()}
+        }
+
+
+def get_log_sink(bot) -> LogSink:
+    """Возвращает очередь логов бота, создавая её при первом обращении"""
+    if not hasattr(bot, 'log_sink'):
+        bot.log_sink = LogSink(bot)
+    return bot.log_sink
@@ -23,10 +23,9 @@ logger = logging.getLogger(__name__)
 
 async def main():
     """Main function to start the Discord bot"""
+    # Initialize the bot
+    bot = DiscordWelcomeBot()
     try:
-        # Initialize the bot
-        bot = DiscordWelcomeBot()
-        
         # Start the bot
         await bot.start_bot()
     except KeyboardInterrupt:
@@ -34,6 +33,9 @@ async def main():
     except Exception as e:
         logger.error(f"Fatal error occurred: {e}")
         raise
+    finally:
+        # Flush pending database writes and close connections
+        await bot.stop_bot()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,282 @@
+"""
+Хранилище резервных копий сообщений для Discord бота
+Два уровня: недавние копии в памяти (LRU с вытеснением за O(1)) и все копии в SQLite
+с доступом по id сообщения. У каждого канала свой бюджет копий, а копии старше
+RETENTION_DAYS удаляются по первичному ключу: id сообщения Discord растет со временем.
+Правки хранятся в копии обратными разностями: текущий текст и как из него получить прежние
+"""
+
+import asyncio
+import difflib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from sqlite_store import get_sqlite_store
+
+logger = logging.getLogger('message_backup_store')
+
+DATABASE_FILE = "message_backups.db"
+MEMORY_ENTRIES = 1000  # Копий в памяти
+DEFAULT_CHANNEL_BUDGET = 5000  # Копий на канал на диске
+CHANNEL_BUDGETS: Dict[int, int] = {}  # Бюджеты отдельных каналов: id канала -> копий
+TRIM_FRACTION = 0.1  # При превышении бюджета удаляется столько старых копий канала сразу
+RETENTION_DAYS = 7
+PRUNE_INTERVAL = 3600  # Как часто удалять устаревшие копии (секунды)
+PRUNE_CHUNK = 5000  # Устаревших копий за одну транзакцию; между частями проходят обычные пачки записи
+MAX_EDIT_HISTORY = 20  # Правок в копии; более старые версии текста забываются
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS message_backups (
+    message_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_message_backups_channel ON message_backups (channel_id, message_id);
+"""
+
+INSERT_SQL = "INSERT OR REPLACE INTO message_backups (message_id, channel_id, data) VALUES (?, ?, ?)"
+DELETE_SQL = "DELETE FROM message_backups WHERE message_id = ?"
+MAX_QUERY_PARAMS = 500  # id в одном запросе IN (...) (лимит параметров SQLite - 999)
+PRUNE_SQL = ("DELETE FROM message_backups WHERE message_id IN "
+             "(SELECT message_id FROM message_backups WHERE message_id < ? ORDER BY message_id LIMIT ?)")
+TRIM_SQL = ("DELETE FROM message_backups WHERE message_id IN "
+            "(SELECT message_id FROM message_backups WHERE channel_id = ? ORDER BY message_id LIMIT ?)")
+
+
+def make_delta(new: str, old: str) -> List:
+    """Обратная разность: измененные участки нового текста и чем их заменить, чтобы получить старый"""
+    matcher = difflib.SequenceMatcher(None, new, old, autojunk=False)
+    return [[i1, i2, old[j1:j2]] for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def apply_delta(text: str, delta: List) -> str:
+    parts = []
+    position = 0
+    for start, end, replacement in delta:
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def content_versions(data: Dict) -> List[str]:
+    """Все сохраненные версии текста копии: от самой ранней до текущей"""
+    versions = [data['content']]
+    for edit in reversed(data.get('edits', ())):
+        versions.append(apply_delta(versions[-1], edit['delta']))
+    versions.reverse()
+    return versions
+
+
+class MessageBackupStore:
+    """Резервные копии сообщений: LRU в памяти перед таблицей SQLite"""
+
+    def __init__(self, bot, path: str = DATABASE_FILE):
+        self.bot = bot
+        self.store = get_sqlite_store(bot, path, SCHEMA)
+        self.memory: 'OrderedDict[int, Dict]' = OrderedDict()
+        self.channel_counts: Dict[int, int] = {}  # Копий канала на диске (включая очередь записи)
+        self.last_prune = time.monotonic()
+        self._prune_task: Optional[asyncio.Task] = None
+        self.stats = {'stored': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'trimmed': 0, 'edits': 0}
+        self._count_channels()
+
+    def _count_channels(self):
+        try:
+            rows = self.store.query("SELECT channel_id, COUNT(*) FROM message_backups GROUP BY channel_id")
+            self.channel_counts = {channel_id: count for channel_id, count in rows}
+        except Exception as e:
+            logger.error(f"Ошибка подсчета резервных копий: {e}")
+
+    @staticmethod
+    def budget(channel_id: int) -> int:
+        return CHANNEL_BUDGETS.get(channel_id, DEFAULT_CHANNEL_BUDGET)
+
+    # --- Запись ---
+
+    def put(self, message_id: int, channel_id: int, data: Dict):
+        """Сохраняет копию в памяти и ставит её в очередь записи на диск"""
+        self.memory[message_id] = data
+        self.memory.move_to_end(message_id)
+        if len(self.memory) > MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+
+        self.store.insert(INSERT_SQL, (message_id, channel_id, json.dumps(data, ensure_ascii=False)))
+        self.stats['stored'] += 1
+        count = self.channel_counts.get(channel_id, 0) + 1
+        budget = self.budget(channel_id)
+        if count > budget:
+            # Старые копии канала удаляются пачкой по индексу, а не по одной на каждую новую
+            trim = count - budget + max(1, int(budget * TRIM_FRACTION))
+            self.store.execute_later(TRIM_SQL, (channel_id, trim))
+            self.stats['trimmed'] += trim
+            count -= trim
+        self.channel_counts[channel_id] = count
+
+        if time.monotonic() - self.last_prune >= PRUNE_INTERVAL and (self._prune_task is None or self._prune_task.done()):
+            self.last_prune = time.monotonic()
+            self._prune_task = asyncio.create_task(self.prune())
+
+    def record_edit(self, message_id: int, content: str, edited_at: str) -> Optional[Tuple[str, Dict]]:
+        """Сохраняет правку разностью; возвращает (прежний текст, обновленная копия) или None"""
+        data = self.get(message_id)
+        if data is None or data['content'] == content:
+            return None
+        previous = data['content']
+        edits = data.get('edits', [])
+        edits.append({'at': edited_at, 'delta': make_delta(content, data['content'])})
+        data = {**data, 'content': content, 'edits': edits[-MAX_EDIT_HISTORY:]}
+        # Замена строки: число копий канала не меняется
+        self.memory[message_id] = data
+        self.memory.move_to_end(message_id)
+        if len(self.memory) > MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+        self.store.insert(INSERT_SQL, (message_id, data['channel_id'], json.dumps(data, ensure_ascii=False)))
+        self.stats['edits'] += 1
+        return previous, data
+
+    # --- Чтение ---
+
+    def get(self, message_id: int) -> Optional[Dict]:
+        """Копия сообщения: из памяти, из очереди записи или с диска по первичному ключу"""
+        data = self.memory.get(message_id)
+        if data is not None:
+            self.memory.move_to_end(message_id)
+            self.stats['memory_hits'] += 1
+            return data
+
+        # Очередь записи просматривается по порядку: последняя команда для сообщения главнее диска
+        raw, queued = None, False
+        for sql, params in self.store.queued():
+            if params and params[0] == message_id and sql in (INSERT_SQL, DELETE_SQL):
+                raw, queued = (params[2] if sql == INSERT_SQL else None), True
+        if not queued:
+            try:
+                row = self.store.query_one("SELECT data FROM message_backups WHERE message_id = ?", (message_id,))
+            except Exception as e:
+                logger.error(f"Ошибка чтения резервной копии {message_id}: {e}")
+                row = None
+            raw = row[0] if row else None
+        if raw is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['disk_hits'] += 1
+        return json.loads(raw)
+
+    def get_many(self, message_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Копии нескольких сообщений (массовое удаление): очередь записи - один проход, диск - пачки IN (...)"""
+        found: Dict[int, Optional[str]] = {}
+        wanted = []
+        for message_id in message_ids:
+            data = self.memory.get(message_id)
+            if data is not None:
+                found[message_id] = data
+            else:
+                wanted.append(message_id)
+        self.stats['memory_hits'] += len(found)
+
+        queued: Dict[int, Optional[str]] = {}
+        if wanted:
+            wanted_set = set(wanted)
+            for sql, params in self.store.queued():
+                if sql in (INSERT_SQL, DELETE_SQL) and params and params[0] in wanted_set:
+                    queued[params[0]] = params[2] if sql == INSERT_SQL else None
+        on_disk = [message_id for message_id in wanted if message_id not in queued]
+        raw: Dict[int, Optional[str]] = dict(queued)
+        for start in range(0, len(on_disk), MAX_QUERY_PARAMS):
+            chunk = on_disk[start:start + MAX_QUERY_PARAMS]
+            try:
+                rows = self.store.query(
+                    f"SELECT message_id, data FROM message_backups WHERE message_id IN ({','.join('?' * len(chunk))})",
+                    chunk)
+            except Exception as e:
+                logger.error(f"Ошибка чтения резервных копий: {e}")
+                rows = []
+            raw.update(rows)
+
+        for message_id, value in raw.items():
+            if value is not None:
+                found[message_id] = json.loads(value)
+                self.stats['disk_hits'] += 1
+        self.stats['misses'] += sum(1 for message_id in wanted if message_id not in found)
+        return found
+
+    def __contains__(self, message_id: int) -> bool:
+        return self.get(message_id) is not None
+
+    def __len__(self) -> int:
+        return sum(self.channel_counts.values())
+
+    # --- Удаление ---
+
+    def discard(self, message_id: int, channel_id: Optional[int] = None):
+        """Удаляет копию (например, после восстановления сообщения)"""
+        self.memory.pop(message_id, None)
+        self.store.execute_later(DELETE_SQL, (message_id,))
+        if channel_id is not None and self.channel_counts.get(channel_id):
+            self.channel_counts[channel_id] -= 1
+
+    def discard_many(self, backups: Dict[int, Dict]):
+        """Удаляет несколько копий одной пачкой записи; backups - id сообщения -> копия"""
+        # Команды удаления встают в очередь подряд и уходят одним executemany
+        for message_id, data in backups.items():
+            self.discard(message_id, data.get('channel_id'))
+
+    async def prune(self):
+        """Удаляет копии старше RETENTION_DAYS и пересчитывает бюджеты каналов"""
+        cutoff = discord.utils.time_snowflake(datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS))
+
+        def delete_chunk(connection):
+            return connection.execute(PRUNE_SQL, (cutoff, PRUNE_CHUNK)).rowcount
+
+        def count_channels(connection):
+            return connection.execute("SELECT channel_id, COUNT(*) FROM message_backups GROUP BY channel_id").fetchall()
+
+        deleted = 0
+        try:
+            while True:
+                chunk = await self.store.run(delete_chunk)
+                deleted += chunk
+                if chunk < PRUNE_CHUNK:
+                    break
+            counts = await self.store.run(count_channels)
+        except Exception as e:
+            logger.error(f"Ошибка удаления устаревших резервных копий: {e}")
+            return
+        # Копии, поставленные в очередь во время удаления, учитываются поверх пересчета
+        pending: Dict[int, int] = {}
+        for _, channel_id, _ in self.store.pending_for(INSERT_SQL):
+            pending[channel_id] = pending.get(channel_id, 0) + 1
+        self.channel_counts = {channel_id: count + pending.pop(channel_id, 0) for channel_id, count in counts}
+        self.channel_counts.update(pending)
+        for message_id in [message_id for message_id in self.memory if message_id < cutoff]:
+            del self.memory[message_id]
+        if deleted:
+            logger.info(f"Удалено устаревших резервных копий: {deleted}")
+
+    def clear(self):
+        self.memory.clear()
+        self.store.execute_later("DELETE FROM message_backups", ())
+        self.channel_counts.clear()
+
+    def get_stats(self) -> Dict:
+        return {
+            'memory': len(self.memory),
+            'stored_now': len(self),
+            'channels': len(self.channel_counts),
+            **self.stats
+        }
+
+
+def get_message_backup_store(bot) -> MessageBackupStore:
+    """Возвращает хранилище резервных копий сообщений бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'message_backup_store'):
+        bot.message_backup_store = MessageBackupStore(bot)
+    return bot.message_backup_store
@@ -0,0 +1,205 @@
+"""
+Маршрутизатор сообщений для Discord бота
+Классифицирует каждое сообщение один раз и вызывает только те системы,
+чьи условия (ЛС, канал, префикс, упоминания, автор) совпали
+"""
+
+import logging
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from event_bus import setup_event_bus, PRIORITY_CORE
+
+logger = logging.getLogger('message_router')
+
+# Значения параметра dm у маршрута
+SCOPE_GUILD = False   # Только сообщения на сервере
+SCOPE_DM = True       # Только личные сообщения
+SCOPE_ANY = None      # И там, и там
+
+
+class MessageRoute:
+    """Маршрут: условия сообщения и обработчик, который вызывается при совпадении"""
+
+    def __init__(self, name, handler, priority, dm, channel_ids, prefix, mention_ids, author_ids, bots):
+        self.name = name
+        self.handler = handler
+        self.priority = priority
+        self.dm = dm
+        self.channel_ids = frozenset(channel_ids) if channel_ids is not None else None
+        self.prefix = prefix
+        self.mention_ids = frozenset(mention_ids) if mention_ids is not None else None
+        # Контейнер не копируется: маршрут видит актуальное содержимое (например, словарь ожидающих)
+        self.author_ids = author_ids
+        self.bots = bots
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def matches(self, is_dm: bool, content: str, author, mentioned_ids) -> bool:
+        """Проверяет условия, которые не покрыты индексом маршрутизатора"""
+        if self.dm is not None and self.dm != is_dm:
+            return False
+        if self.channel_ids is not None and self.mention_ids is not None:
+            # Маршрут проиндексирован по каналу, упоминания проверяются здесь
+            if self.mention_ids.isdisjoint(mentioned_ids):
+                return False
+        if author.bot and not self.bots:
+            return False
+        if self.author_ids is not None and author.id not in self.author_ids:
+            return False
+        if self.prefix is not None and not content.startswith(self.prefix):
+            return False
+        return True
+
+
+class MessageRouter:
+    """Маршрутизатор сообщений с индексами по каналу, упоминаниям и префиксу"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.routes: Dict[str, MessageRoute] = {}
+        self.messages_total = 0
+        self.messages_unmatched = 0
+        self.classify_time = 0.0
+        self._rebuild_index()
+
+    def route(self, name: str, handler, *, priority: int = PRIORITY_CORE, dm: Optional[bool] = SCOPE_GUILD,
+              channel_ids=None, prefix: Optional[str] = None, mention_ids=None, author_ids=None,
+              bots: bool = False) -> MessageRoute:
+        """Регистрирует маршрут. Сообщение попадает в маршрут, если выполнены все заданные условия.
+
+        Обработчик получает сообщение; если он вернет True, маршруты с меньшим приоритетом
+        для этого сообщения не вызываются. Повторная регистрация с тем же именем заменяет маршрут.
+        """
+        route = MessageRoute(name, handler, priority, dm, channel_ids, prefix, mention_ids, author_ids, bots)
+        self.routes[name] = route
+        self._rebuild_index()
+        logger.debug(f"Маршрут сообщений {name} зарегистрирован (приоритет {priority})")
+        return route
+
+    def unroute(self, name: str) -> bool:
+        """Удаляет маршрут по имени"""
+        if self.routes.pop(name, None) is None:
+            return False
+        self._rebuild_index()
+        return True
+
+    def _rebuild_index(self):
+        """Раскладывает маршруты по индексам по самому избирательному условию"""
+        by_channel: Dict[int, List[MessageRoute]] = {}
+        by_mention: Dict[int, List[MessageRoute]] = {}
+        by_prefix: Dict[str, List[MessageRoute]] = {}
+        general: List[MessageRoute] = []
+
+        for route in self.routes.values():
+            if route.channel_ids is not None:
+                for channel_id in route.channel_ids:
+                    by_channel.setdefault(channel_id, []).append(route)
+            elif route.mention_ids is not None:
+                for user_id in route.mention_ids:
+                    by_mention.setdefault(user_id, []).append(route)
+            elif route.prefix is not None:
+                by_prefix.setdefault(route.prefix, []).append(route)
+            else:
+                general.append(route)
+
+        self._by_channel = by_channel
+        self._by_mention = by_mention
+        self._prefixes = tuple(by_prefix.items())
+        self._general = tuple(general)
+        self._accepts_bots = any(route.bots for route in self.routes.values())
+        self._needs_mentions = any(route.mention_ids is not None for route in self.routes.values())
+
+    def classify(self, message) -> List[MessageRoute]:
+        """Возвращает маршруты, подходящие сообщению, в порядке приоритета"""
+        author = message.author
+        if author.bot and not self._accepts_bots:
+            return []
+
+        is_dm = message.guild is None
+        content = message.content
+        mentioned_ids = [user.id for user in message.mentions] if self._needs_mentions else ()
+        candidates = list(self._general)
+
+        routes = self._by_channel.get(message.channel.id)
+        if routes:
+            candidates.extend(routes)
+
+        if self._by_mention and mentioned_ids:
+            for user_id in set(mentioned_ids):
+                routes = self._by_mention.get(user_id)
+                if routes:
+                    for route in routes:
+                        # Маршрут с несколькими отслеживаемыми пользователями вызывается один раз
+                        if route not in candidates:
+                            candidates.append(route)
+
+        for prefix, routes in self._prefixes:
+            if content.startswith(prefix):
+                candidates.extend(routes)
+
+        matched = [route for route in candidates if route.matches(is_dm, content, author, mentioned_ids)]
+        if len(matched) > 1:
+            matched.sort(key=lambda route: -route.priority)
+        return matched
+
+    async def dispatch(self, message):
+        """Классифицирует сообщение и последовательно вызывает подходящие маршруты"""
+        start = time.perf_counter()
+        matched = self.classify(message)
+        self.classify_time += time.perf_counter() - start
+        self.messages_total += 1
+
+        if not matched:
+            self.messages_unmatched += 1
+            return
+
+        for route in matched:
+            route_start = time.perf_counter()
+            stop = False
+            try:
+                stop = await route.handler(message)
+            except Exception as e:
+                route.errors += 1
+                logger.error(f"Ошибка в маршруте {route.name} для сообщения от {message.author}: {e}")
+                logger.error(traceback.format_exc())
+            finally:
+                elapsed = time.perf_counter() - route_start
+                route.calls += 1
+                route.total_time += elapsed
+                if elapsed > route.max_time:
+                    route.max_time = elapsed
+            if stop is True:
+                break
+
+    def get_stats(self) -> Dict:
+        """Возвращает статистику маршрутизатора и маршрутов"""
+        routes = [{
+            'name': route.name,
+            'priority': route.priority,
+            'calls': route.calls,
+            'errors': route.errors,
+            'total_time': route.total_time,
+            'average_time': route.total_time / route.calls if route.calls else 0.0,
+            'max_time': route.max_time
+        } for route in self.routes.values()]
+        routes.sort(key=lambda item: item['calls'], reverse=True)
+        return {
+            'messages_total': self.messages_total,
+            'messages_unmatched': self.messages_unmatched,
+            'average_classify_time': self.classify_time / self.messages_total if self.messages_total else 0.0,
+            'routes': routes
+        }
+
+
+def setup_message_router(bot) -> MessageRouter:
+    """Возвращает маршрутизатор сообщений бота, создавая и подписывая его при первом обращении"""
+    if not hasattr(bot, 'message_router'):
+        router = MessageRouter(bot)
+        bot.message_router = router
+        setup_event_bus(bot).subscribe('on_message', router.dispatch, priority=PRIORITY_CORE, name='message_router')
+        logger.info("Маршрутизатор сообщений создан")
+    return bot.message_router
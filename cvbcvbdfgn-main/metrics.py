@@ -0,0 +1,294 @@
+"""
+Метрики производительности Discord бота
+Гистограммы задержек с логарифмическими корзинами для обработчиков событий, команд,
+кнопок и REST-запросов, счетчики, задержка цикла событий и эндпоинт /metrics в формате Prometheus
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import discord
+from aiohttp import web
+
+from event_bus import setup_event_bus, PRIORITY_CORE
+from config import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger('metrics')
+
+# Границы корзин: от 0.5 мс, каждая следующая вдвое больше (до ~16 с)
+BUCKET_BOUNDS = tuple(0.0005 * 2 ** i for i in range(16))
+MAX_SERIES_PER_METRIC = 300  # Ограничение числа меток, чтобы динамические имена не раздували память
+OVERFLOW_LABEL = 'other'
+LOOP_LAG_INTERVAL = 0.5  # Период проверки задержки цикла событий (секунды)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными логарифмическими корзинами"""
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    """Хранилище метрик бота"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.histograms: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.loop_lag = LatencyHistogram()
+        self.loop_lag_last = 0.0
+        self.start_time = time.time()
+        self.pending_commands: Dict[int, float] = {}
+        self.runner: Optional[web.AppRunner] = None
+        self.lag_task: Optional[asyncio.Task] = None
+
+    def _series(self, store: Dict, metric: str, label: str, factory):
+        series = store.get(metric)
+        if series is None:
+            series = store[metric] = {}
+        value = series.get(label)
+        if value is None:
+            if len(series) >= MAX_SERIES_PER_METRIC:
+                label = OVERFLOW_LABEL
+                value = series.get(label)
+            if value is None:
+                value = series[label] = factory()
+        return value
+
+    def observe(self, metric: str, label: str, seconds: float):
+        """Добавляет замер задержки"""
+        self._series(self.histograms, metric, label, LatencyHistogram).observe(seconds)
+
+    def increment(self, metric: str, label: str = '', value: int = 1):
+        """Увеличивает счетчик"""
+        series = self.counters.get(metric)
+        if series is None:
+            series = self.counters[metric] = {}
+        if label not in series and len(series) >= MAX_SERIES_PER_METRIC:
+            label = OVERFLOW_LABEL
+        series[label] = series.get(label, 0) + value
+
+    # --- Подключение к источникам ---
+
+    def install_hooks(self):
+        """Подключает замеры к шине событий, командам, кнопкам и REST-клиенту"""
+        bus = setup_event_bus(self.bot)
+        bus.add_timing_hook(self._on_event_timing)
+
+        @bus.listen(priority=PRIORITY_CORE, name='metrics.on_command')
+        async def on_command(ctx):
+            self.pending_commands[ctx.message.id] = time.perf_counter()
+
+        @bus.listen(priority=PRIORITY_CORE, name='metrics.on_command_completion')
+        async def on_command_completion(ctx):
+            self._finish_command(ctx, 'ok')
+
+        @bus.listen(priority=PRIORITY_CORE, name='metrics.on_command_error')
+        async def on_command_error(ctx, error):
+            self._finish_command(ctx, type(error).__name__)
+
+        self._wrap_views()
+        self._wrap_http()
+
+    def _on_event_timing(self, event_name: str, subscriber_name: str, elapsed: float, failed: bool):
+        label = f"{event_name}:{subscriber_name}"
+        self.observe('event_handler', label, elapsed)
+        if failed:
+            self.increment('event_handler_errors', label)
+
+    def _finish_command(self, ctx, outcome: str):
+        start = self.pending_commands.pop(ctx.message.id, None)
+        name = ctx.command.qualified_name if ctx.command else 'unknown'
+        if start is not None:
+            self.observe('command', name, time.perf_counter() - start)
+        self.increment('command_total', f"{name}:{outcome}")
+
+    def _wrap_views(self):
+        """Оборачивает обработку нажатий в discord.ui.View (один раз на процесс)"""
+        view_cls = discord.ui.View
+        if getattr(view_cls._scheduled_task, '_metrics_wrapped', False):
+            return
+        original = view_cls._scheduled_task
+        registry = self
+
+        async def _scheduled_task(view, item, interaction):
+            start = time.perf_counter()
+            try:
+                return await original(view, item, interaction)
+            finally:
+                callback = getattr(item.callback, 'callback', item.callback)
+                label = f"{type(view).__name__}.{getattr(callback, '__name__', type(item).__name__)}"
+                registry.observe('view_callback', label, time.perf_counter() - start)
+
+        _scheduled_task._metrics_wrapped = True
+        view_cls._scheduled_task = _scheduled_task
+
+    def _wrap_http(self):
+        """Оборачивает REST-запросы клиента discord.py"""
+        http = self.bot.http
+        if getattr(http.request, '_metrics_wrapped', False):
+            return
+        original = http.request
+        registry = self
+
+        async def request(route, **kwargs):
+            start = time.perf_counter()
+            status = 'ok'
+            try:
+                return await original(route, **kwargs)
+            except discord.HTTPException as e:
+                status = str(e.status)
+                raise
+            except Exception as e:
+                status = type(e).__name__
+                raise
+            finally:
+                label = f"{route.method} {route.path}"
+                registry.observe('rest_request', label, time.perf_counter() - start)
+                registry.increment('rest_requests_total', f"{label}:{status}")
+
+        request._metrics_wrapped = True
+        http.request = request
+
+    async def _measure_loop_lag(self):
+        """Задержка цикла событий: насколько позже запланированного просыпается sleep"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - start - LOOP_LAG_INTERVAL)
+            self.loop_lag.observe(lag)
+            self.loop_lag_last = lag
+
+    # --- Вывод ---
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines: List[str] = []
+
+        def escape(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        def histogram_lines(name: str, label_text: str, histogram: LatencyHistogram):
+            separator = ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKET_BOUNDS, histogram.buckets):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{label_text}{separator}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text}{separator}le="+Inf"}} {histogram.count}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{name}_sum{suffix} {histogram.total:.6f}')
+            lines.append(f'{name}_count{suffix} {histogram.count}')
+
+        for metric, series in self.histograms.items():
+            name = f'bot_{metric}_seconds'
+            lines.append(f'# TYPE {name} histogram')
+            for label, histogram in series.items():
+                histogram_lines(name, f'name="{escape(label)}"', histogram)
+
+        for metric, series in self.counters.items():
+            name = f'bot_{metric}'
+            lines.append(f'# TYPE {name} counter')
+            for label, value in series.items():
+                lines.append(f'{name}{{name="{escape(label)}"}} {value}')
+
+        lines.append('# TYPE bot_event_loop_lag_seconds histogram')
+        histogram_lines('bot_event_loop_lag_seconds', '', self.loop_lag)
+
+        lines.append('# TYPE bot_gateway_latency_seconds gauge')
+        latency = self.bot.latency
+        lines.append(f'bot_gateway_latency_seconds {latency if latency == latency else 0:.6f}')
+        lines.append('# TYPE bot_uptime_seconds gauge')
+        lines.append(f'bot_uptime_seconds {time.time() - self.start_time:.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def get_hot_paths(self, limit: int = 5) -> List[Tuple[str, str, LatencyHistogram]]:
+        """Самые затратные обработчики по суммарному времени"""
+        items = [(metric, label, histogram)
+                 for metric, series in self.histograms.items()
+                 for label, histogram in series.items()]
+        items.sort(key=lambda item: item[2].total, reverse=True)
+        return items[:limit]
+
+    def get_summary(self) -> Dict:
+        """Краткая сводка для !loadstats"""
+        rest = self.histograms.get('rest_request', {})
+        return {
+            'loop_lag_p99': self.loop_lag.quantile(0.99),
+            'loop_lag_max': self.loop_lag.max,
+            'rest_requests': sum(histogram.count for histogram in rest.values()),
+            'hot_paths': [{
+                'metric': metric,
+                'name': label,
+                'count': histogram.count,
+                'total': histogram.total,
+                'p95': histogram.quantile(0.95)
+            } for metric, label, histogram in self.get_hot_paths()]
+        }
+
+    # --- HTTP-эндпоинт ---
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        """Запускает замер задержки цикла и HTTP-эндпоинт"""
+        if self.lag_task is None or self.lag_task.done():
+            self.lag_task = asyncio.create_task(self._measure_loop_lag())
+
+        if not METRICS_ENABLED or self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, METRICS_HOST, METRICS_PORT).start()
+            logger.info(f"Метрики доступны на http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            logger.error(f"Не удалось запустить эндпоинт метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def setup_metrics(bot):
+    """Настройка метрик производительности"""
+    try:
+        if not hasattr(bot, 'metrics'):
+            metrics = MetricsRegistry(bot)
+            bot.metrics = metrics
+            metrics.install_hooks()
+        await bot.metrics.start()
+
+        logger.info("Метрики производительности настроены")
+
+    except Exception as e:
+        logger.error(f"Ошибка настройки метрик: {e}")
@@ -0,0 +1,280 @@
+"""
+Массовое применение мер к участникам при подтвержденном рейде
+Баны отправляются пачками через bulk_ban, остальные действия (кик, тайм-аут, карантинная роль)
+выполняет ограниченный пул задач с общей паузой при ответе 429 и повторами
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import discord
+
+logger = logging.getLogger('mitigation_executor')
+
+ACTION_BAN = 'ban'
+ACTION_KICK = 'kick'
+ACTION_TIMEOUT = 'timeout'
+ACTION_QUARANTINE = 'quarantine'
+ACTIONS = (ACTION_BAN, ACTION_KICK, ACTION_TIMEOUT, ACTION_QUARANTINE)
+
+WORKERS = 5  # Одновременных запросов; discord.py дополнительно ждет окно своего бакета
+BULK_BAN_SIZE = 200  # Максимум пользователей в одном bulk_ban
+MAX_ATTEMPTS = 4
+SERVER_ERROR_BACKOFF = 1.0  # Пауза перед повтором после 5xx (секунды), удваивается
+PROGRESS_INTERVAL = 2.0  # Как часто сообщать о ходе выполнения (секунды)
+DEFAULT_TIMEOUT = timedelta(hours=1)
+JOB_HISTORY = 20
+
+
+class MitigationJob:
+    """Одна массовая операция и её прогресс"""
+
+    def __init__(self, guild: discord.Guild, action: str, member_ids: List[int], reason: str,
+                 duration: Optional[timedelta], role: Optional[discord.Role]):
+        self.guild = guild
+        self.action = action
+        self.member_ids = member_ids
+        self.reason = reason
+        self.duration = duration
+        self.role = role
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors: List[str] = []
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.member_ids)
+
+    @property
+    def processed(self) -> int:
+        return self.done + self.failed + self.skipped
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def add_error(self, user_id: int, error):
+        if len(self.errors) < 10:
+            self.errors.append(f"{user_id}: {error}")
+
+
+class MitigationExecutor:
+    """Пул исполнителей мер с общей паузой по лимиту запросов"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.pause_until = 0.0
+        self.jobs = deque(maxlen=JOB_HISTORY)
+
+    async def run(self, guild: discord.Guild, action: str, member_ids: Iterable[int], *, reason: str,
+                  duration: Optional[timedelta] = None, role: Optional[discord.Role] = None,
+                  progress: Optional[Callable[[MitigationJob], Awaitable]] = None) -> MitigationJob:
+        """Применяет действие ко всем участникам и возвращает итог.
+
+        progress вызывается не чаще PROGRESS_INTERVAL и один раз в конце.
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Неизвестное действие: {action}")
+        if action == ACTION_QUARANTINE and role is None:
+            raise ValueError("Для карантина нужна роль")
+
+        job = MitigationJob(guild, action, list(dict.fromkeys(member_ids)), reason, duration or DEFAULT_TIMEOUT, role)
+        self.jobs.append(job)
+        logger.info(f"Массовое действие {action}: {job.total} участников на сервере {guild.name}")
+
+        reporter = asyncio.create_task(self._report_progress(job, progress)) if progress else None
+        try:
+            pending = job.member_ids
+            if action == ACTION_BAN:
+                pending = await self._bulk_ban(job)
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for user_id in pending:
+                queue.put_nowait(user_id)
+            workers = [asyncio.create_task(self._worker(job, queue)) for _ in range(min(WORKERS, len(pending)))]
+            if workers:
+                await asyncio.gather(*workers)
+        finally:
+            job.finished = time.monotonic()
+            if reporter:
+                reporter.cancel()
+                try:
+                    await progress(job)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки итога массового действия: {e}")
+
+        logger.info(f"Массовое действие {action} завершено за {job.elapsed:.1f}с: "
+                    f"выполнено {job.done}, пропущено {job.skipped}, ошибок {job.failed}, повторов {job.retries}")
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.observe('mitigation_job', action, job.elapsed)
+        return job
+
+    # --- Баны пачками ---
+
+    async def _bulk_ban(self, job: MitigationJob) -> List[int]:
+        """Банит пачками; возвращает тех, кого нужно обработать поодиночке"""
+        leftover: List[int] = []
+        for start in range(0, job.total, BULK_BAN_SIZE):
+            chunk = job.member_ids[start:start + BULK_BAN_SIZE]
+            for attempt in range(MAX_ATTEMPTS):
+                await self._wait_pause()
+                try:
+                    result = await job.guild.bulk_ban([discord.Object(id=user_id) for user_id in chunk],
+                                                      reason=job.reason)
+                    job.done += len(result.banned)
+                    # Неудачные пачкой (например, уже забаненные) повторяются по одному ради точной причины
+                    leftover.extend(user.id for user in result.failed)
+                    break
+                except discord.HTTPException as e:
+                    if not await self._handle_retryable(job, e, attempt):
+                        # Нет прав на bulk_ban или запрос отклонен - обычные баны по одному
+                        logger.warning(f"bulk_ban недоступен ({e.status}), баним по одному")
+                        leftover.extend(chunk)
+                        break
+            else:
+                leftover.extend(chunk)
+        return leftover
+
+    # --- Поодиночные действия ---
+
+    async def _worker(self, job: MitigationJob, queue: asyncio.Queue):
+        while True:
+            try:
+                user_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self._apply_with_retry(job, user_id)
+
+    async def _apply_with_retry(self, job: MitigationJob, user_id: int):
+        for attempt in range(MAX_ATTEMPTS):
+            await self._wait_pause()
+            try:
+                applied = await self._apply(job, user_id)
+                if applied:
+                    job.done += 1
+                    self._count(job.action, 'done')
+                else:
+                    job.skipped += 1
+                    self._count(job.action, 'skipped')
+                return
+            except discord.NotFound:
+                job.skipped += 1
+                self._count(job.action, 'skipped')
+                return
+            except discord.Forbidden as e:
+                job.failed += 1
+                job.add_error(user_id, "нет прав")
+                self._count(job.action, 'forbidden')
+                logger.warning(f"Нет прав на {job.action} для {user_id}: {e}")
+                return
+            except discord.HTTPException as e:
+                if await self._handle_retryable(job, e, attempt):
+                    continue
+                job.failed += 1
+                job.add_error(user_id, e.status)
+                self._count(job.action, 'failed')
+                return
+            except Exception as e:
+                job.failed += 1
+                job.add_error(user_id, e)
+                self._count(job.action, 'failed')
+                logger.error(f"Ошибка {job.action} для {user_id}: {e}")
+                return
+
+        job.failed += 1
+        job.add_error(user_id, "исчерпаны попытки")
+        self._count(job.action, 'failed')
+
+    async def _apply(self, job: MitigationJob, user_id: int) -> bool:
+        """Выполняет действие; False - участника нет на сервере"""
+        guild = job.guild
+        if job.action == ACTION_BAN:
+            await guild.ban(discord.Object(id=user_id), reason=job.reason, delete_message_seconds=86400)
+            return True
+        if job.action == ACTION_KICK:
+            await guild.kick(discord.Object(id=user_id), reason=job.reason)
+            return True
+
+        member = guild.get_member(user_id)
+        if member is None:
+            return False
+        if job.action == ACTION_TIMEOUT:
+            await member.timeout(job.duration, reason=job.reason)
+        else:
+            if job.role in member.roles:
+                return True
+            await member.add_roles(job.role, reason=job.reason)
+        return True
+
+    # --- Лимиты запросов ---
+
+    async def _handle_retryable(self, job: MitigationJob, error: discord.HTTPException, attempt: int) -> bool:
+        """429 ставит на паузу всех исполнителей, 5xx повторяется с удвоением паузы"""
+        if attempt + 1 >= MAX_ATTEMPTS:
+            return False
+        if error.status == 429:
+            retry_after = 1.0
+            try:
+                retry_after = float(error.response.headers.get('Retry-After', retry_after))
+            except (AttributeError, TypeError, ValueError):
+                pass
+            self.pause_until = max(self.pause_until, time.monotonic() + retry_after)
+            job.rate_limited += 1
+            job.retries += 1
+            logger.warning(f"Лимит запросов при {job.action}, пауза {retry_after:.1f}с")
+            return True
+        if error.status >= 500:
+            job.retries += 1
+            await asyncio.sleep(SERVER_ERROR_BACKOFF * 2 ** attempt)
+            return True
+        return False
+
+    async def _wait_pause(self):
+        delay = self.pause_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _count(self, action: str, outcome: str):
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.increment('mitigation_actions', f"{action}:{outcome}")
+
+    async def _report_progress(self, job: MitigationJob, progress):
+        last_processed = -1
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            if job.processed != last_processed:
+                last_processed = job.processed
+                try:
+                    await progress(job)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки прогресса массового действия: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            'paused_for': max(0.0, self.pause_until - time.monotonic()),
+            'jobs': [{
+                'action': job.action,
+                'total': job.total,
+                'done': job.done,
+                'failed': job.failed,
+                'skipped': job.skipped,
+                'elapsed': job.elapsed,
+                'running': job.finished is None
+            } for job in self.jobs]
+        }
+
+
+def get_mitigation_executor(bot) -> MitigationExecutor:
+    """Возвращает исполнитель массовых мер бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'mitigation_executor'):
+        bot.mitigation_executor = MitigationExecutor(bot)
+    return bot.mitigation_executor
@@ -11,12 +11,28 @@ import json
 import os
 from typing import Optional, List, Dict
 import asyncio
+import io
+from event_bus import setup_event_bus, PRIORITY_LOGGING, PRIORITY_PROTECTION
+from log_sink import get_log_sink, LANE_MODERATION, LANE_ACTIVITY, MAX_EMBEDS_PER_MESSAGE, MAX_EMBED_CHARS_PER_MESSAGE
+from audit_log_resolver import setup_audit_log_resolver
+from guild_directory import get_guild_directory
+from privilege_cache import get_privilege_cache, PRIV_EXEMPT
+from message_backup_store import get_message_backup_store, content_versions
+from attachment_mirror import get_attachment_mirror, describe_attachment
+from timer_scheduler import get_timer_scheduler
+from message_router import setup_message_router, SCOPE_DM
 
 logger = logging.getLogger(__name__)
 
 # Константы для исключительных ролей
 EXEMPT_LOAD_ROLES = [1385306542781497425]  # Роли без ограничений нагрузки
 EXEMPT_RESTORE_ROLES = [1385306542781497425]  # Роли без восстановления сообщений
+REASONS_FILE = "pending_reasons.json"
+REASON_TIMEOUT = 180  # Сколько ждать причину от модератора (секунды)
+# Восстанавливать ли сообщения после массового удаления (очистка канала модератором обычно намеренная)
+BULK_RESTORE = False
+# Действия с сообщениями идут в полосу активности, чтобы не задерживать логи модерации
+ACTIVITY_ACTIONS = {"Редактирование сообщения", "Удаление сообщения", "Восстановление сообщения", "Удаление реакции"}
 
 class ModerationLogs:
     def __init__(self, bot):
@@ -24,10 +40,23 @@ class ModerationLogs:
         self.log_channel_id = 1376194575281950741
         self.log_channel = None
         self.enabled = True
-        self.message_backup = {}  # Хранилище удаленных сообщений
+        self.message_backup = get_message_backup_store(bot)  # Копии сообщений: память + SQLite
+        self.attachment_mirror = get_attachment_mirror(bot)  # Локальные копии вложений
         self.backup_enabled = True  # Включение/выключение восстановления
-        self.pending_reasons = {}  # {moderator_id: asyncio.Task}
-        self.pending_log_messages = {}  # {moderator_id: log_message_id}
+        self.bulk_restore_enabled = BULK_RESTORE  # Восстановление после массового удаления
+        # Ожидаемые причины: {moderator_id: состояние}; сохраняются на диск вместе с эмбедами их логов
+        self.pending_reasons: Dict[int, Dict] = {}
+        self.log_embeds: Dict[int, List[Dict]] = {}  # {log_message_id: эмбеды сообщения лога}
+        self.reasons_file = REASONS_FILE
+        self._load_pending_reasons()
+        # Время ожидания причины отсчитывает общий планировщик, в том числе после перезапуска
+        scheduler = get_timer_scheduler(bot)
+        scheduler.register('moderation_reason_timeout', self._reason_timeout)
+        for moderator_id in self.pending_reasons:
+            if scheduler.get(f"moderation_reason:{moderator_id}") is None:
+                # Таймер потерян вместе с файлом планировщика - срок ожидания уже не восстановить
+                scheduler.schedule('moderation_reason_timeout', delay=0, key=f"moderation_reason:{moderator_id}",
+                                   payload={'moderator_id': moderator_id}, persist=True)
         
     async def setup_logging(self):
         """Настройка системы логирования"""
@@ -171,16 +200,17 @@ class ModerationLogs:
                 footer_text += f" | Цель: {target.id}"
             embed.set_footer(text=footer_text, icon_url="https://cdn.discordapp.com/emojis/1234567890.png")
             
-            log_message = await self.log_channel.send(embed=embed)
+            lane = LANE_ACTIVITY if action_type in ACTIVITY_ACTIONS else LANE_MODERATION
+            sent = get_log_sink(self.bot).submit(self.log_channel, embed, lane)
             
             # Проверяем, что модератор — человек, а не бот, и не сам бот
             is_human = hasattr(moderator, 'bot') and not moderator.bot and moderator.id != self.bot.user.id
             # Если причина не указана или явно 'Причина не указана', и модератор — человек, запрашиваем причину
             if (not reason or reason.strip().lower() == "причина не указана") and is_human:
-                # Сохраняем ID лог-сообщения для последующего редактирования
-                self.pending_log_messages[moderator.id] = log_message.id
+                # Лог уходит пачкой: ждем отправки, чтобы знать сообщение и позицию эмбеда в нем
+                result = await sent
                 # Отправляем запрос причины ТОЛЬКО модератору, который выполнил действие
-                await self._ask_reason(action_type, moderator, target)
+                await self._ask_reason(action_type, moderator, target, result)
             
         except Exception as e:
             logger.error(f"Ошибка логирования действия {action_type}: {e}")
@@ -239,29 +269,30 @@ class ModerationLogs:
                 'channel_id': message.channel.id,
                 'channel_name': channel_name,
                 'timestamp': message.created_at.isoformat(),
-                'attachments': [att.url for att in message.attachments],
+                'attachments': [describe_attachment(att) for att in message.attachments],
                 'embeds': [embed.to_dict() for embed in message.embeds],
                 'mentions': [user.id for user in message.mentions],
                 'role_mentions': [role.id for role in message.role_mentions]
             }
             
-            self.message_backup[message.id] = backup_data
-            
-            # Ограничиваем размер хранилища (максимум 1000 сообщений)
-            if len(self.message_backup) > 1000:
-                oldest_key = min(self.message_backup.keys())
-                del self.message_backup[oldest_key]
+            # Старые копии вытесняет само хранилище: по бюджету канала и по возрасту
+            self.message_backup.put(message.id, message.channel.id, backup_data)
+            # Ссылки CDN умирают вместе с сообщением, поэтому файлы скачиваются сразу, в фоне
+            for attachment in backup_data['attachments']:
+                self.attachment_mirror.submit(attachment)
                 
         except Exception as e:
             logger.error(f"Ошибка резервного копирования сообщения: {e}")
     
     async def restore_message(self, message_id: int, channel: discord.TextChannel):
         """Восстанавливает удаленное сообщение с улучшенным дизайном"""
-        if not self.backup_enabled or message_id not in self.message_backup:
+        if not self.backup_enabled:
+            return False
+        backup_data = self.message_backup.get(message_id)
+        if backup_data is None:
             return False
             
         try:
-            backup_data = self.message_backup[message_id]
             
             # Создаем красивый embed для восстановленного сообщения
             embed = discord.Embed(
@@ -283,20 +314,22 @@ class ModerationLogs:
                 inline=True
             )
             
+            files = []
             if backup_data['attachments']:
+                files = await self.attachment_mirror.files_for(backup_data['attachments'], channel.guild.filesize_limit)
                 embed.add_field(
                     name="📎 Вложения",
-                    value=f"Количество: {len(backup_data['attachments'])}",
+                    value=f"Количество: {len(backup_data['attachments'])}, восстановлено файлов: {len(files)}",
                     inline=True
                 )
             
             embed.set_footer(text=f"🆔 ID сообщения: {message_id} • Восстановлено автоматически", 
                            icon_url="https://cdn.discordapp.com/emojis/1234567890.png")
             
-            await channel.send(embed=embed)
+            await channel.send(embed=embed, files=files)
             
             # Удаляем из резервной копии
-            del self.message_backup[message_id]
+            self.message_backup.discard(message_id, backup_data['channel_id'])
             
             return True
             
@@ -304,7 +337,113 @@ class ModerationLogs:
             logger.error(f"Ошибка восстановления сообщения: {e}")
             return False
 
-    async def _ask_reason(self, action_type, moderator, target):
+    async def log_bulk_delete(self, channel, message_ids: List[int], moderator=None, reason: str = "",
+                              restore: bool = False) -> int:
+        """Одна запись лога на массовое удаление: расшифровка файлом и счетчики по авторам.
+
+        Копии читаются из хранилища одной пачкой. При restore сообщения возвращаются пачками
+        по 10 эмбедов. Возвращает число восстановленных сообщений.
+        """
+        message_ids = sorted(message_ids)  # id сообщений растут со временем: расшифровка по порядку
+        backups = self.message_backup.get_many(message_ids)
+
+        authors: Dict[int, List] = {}  # id автора -> [имя, сообщений]
+        lines = []
+        for message_id in message_ids:
+            data = backups.get(message_id)
+            if data is None:
+                lines.append(f"[{discord.utils.snowflake_time(message_id):%Y-%m-%d %H:%M:%S}] "
+                             f"<нет резервной копии> (сообщение {message_id})")
+                continue
+            author = authors.setdefault(data['author_id'], [data['author_name'], 0])
+            author[1] += 1
+            line = f"[{data['timestamp'][:19].replace('T', ' ')}] {data['author_name']} ({data['author_id']}): {data['content']}"
+            names = [attachment['filename'] if isinstance(attachment, dict) else attachment
+                     for attachment in data['attachments']]
+            if names:
+                line += f" [вложения: {', '.join(names)}]"
+            lines.append(line)
+
+        restored = 0
+        if restore and self.backup_enabled and backups:
+            restored = await self._restore_bulk(channel, backups)
+
+        if not self.enabled or not self.log_channel:
+            return restored
+        try:
+            embed = discord.Embed(
+                title="🛡️ Массовое удаление сообщений",
+                description=(f"**Модератор:** {moderator.mention} ({moderator.name})" if moderator
+                             else "**Модератор:** не определен"),
+                color=self._get_action_color("Удаление сообщения"),
+                timestamp=datetime.utcnow()
+            )
+            embed.add_field(name="📺 Канал", value=getattr(channel, 'mention', str(channel.id)), inline=True)
+            embed.add_field(name="🗑️ Удалено", value=f"`{len(message_ids)}` (с копией: `{len(backups)}`)", inline=True)
+            if restored:
+                embed.add_field(name="🔄 Восстановлено", value=f"`{restored}`", inline=True)
+            if reason:
+                embed.add_field(name="📝 Причина", value=f"```{reason}```", inline=False)
+            if authors:
+                ranked = sorted(authors.items(), key=lambda item: item[1][1], reverse=True)
+                text = "\n".join(f"<@{author_id}> ({name}): {count}" for author_id, (name, count) in ranked[:15])
+                if len(ranked) > 15:
+                    text += f"\n... и еще {len(ranked) - 15}"
+                embed.add_field(name="👥 Авторы", value=text, inline=False)
+            embed.set_footer(text=f"🆔 Канал: {channel.id}" + (f" | Модератор: {moderator.id}" if moderator else ""))
+
+            transcript = discord.File(io.BytesIO("\n".join(lines).encode('utf-8')),
+                                      filename=f"purge-{channel.id}-{message_ids[-1]}.txt")
+            # Файл нельзя передать через очередь логов, поэтому запись отправляется напрямую - она одна на всё удаление
+            await self.log_channel.send(embed=embed, file=transcript)
+        except Exception as e:
+            logger.error(f"Ошибка логирования массового удаления: {e}")
+        return restored
+
+    async def _restore_bulk(self, channel, backups: Dict[int, Dict]) -> int:
+        """Возвращает сообщения пачками эмбедов (вложения - только счетчиком)"""
+        privileges = get_privilege_cache(self.bot)
+        restorable = {}
+        for message_id, data in sorted(backups.items()):
+            member = channel.guild.get_member(data['author_id'])
+            if member is not None and privileges.has(member, PRIV_EXEMPT):
+                continue
+            restorable[message_id] = data
+
+        batch: List[discord.Embed] = []
+        batch_chars = 0
+        restored = 0
+        for message_id, data in restorable.items():
+            embed = discord.Embed(
+                description=data['content'][:1000] or None,
+                color=0x00ff00,
+                timestamp=datetime.fromisoformat(data['timestamp'])
+            )
+            embed.set_author(name=f"{data['author_name']} ({data['author_id']})")
+            if data['attachments']:
+                embed.add_field(name="📎 Вложения", value=f"Количество: {len(data['attachments'])}", inline=True)
+            embed.set_footer(text=f"🆔 ID сообщения: {message_id} • Восстановлено после массового удаления")
+            if batch and (len(batch) >= MAX_EMBEDS_PER_MESSAGE or batch_chars + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE):
+                restored += await self._send_restored(channel, batch)
+                batch, batch_chars = [], 0
+            batch.append(embed)
+            batch_chars += len(embed)
+        if batch:
+            restored += await self._send_restored(channel, batch)
+
+        self.message_backup.discard_many(restorable)
+        return restored
+
+    @staticmethod
+    async def _send_restored(channel, embeds: List[discord.Embed]) -> int:
+        try:
+            await channel.send(embeds=embeds)
+            return len(embeds)
+        except Exception as e:
+            logger.error(f"Ошибка восстановления пачки сообщений: {e}")
+            return 0
+
+    async def _ask_reason(self, action_type, moderator, target, log_handle=None):
         # Не отправлять повторно, если уже ждем причину
         if moderator.id in self.pending_reasons:
             return
@@ -334,44 +473,146 @@ class ModerationLogs:
             await moderator.send(embed=embed)
         except Exception:
             return  # Не удалось отправить ЛС (например, закрыты ЛС)
-        # Запускаем задачу ожидания причины
-        task = asyncio.create_task(self._wait_for_reason(moderator, target, action_type))
-        self.pending_reasons[moderator.id] = task
+        
+        # Ответ примет маршрут ЛС по id модератора, а время ожидания отсчитает планировщик
+        state = {'action_type': action_type, **self._serialize_revert_kwargs(target)}
+        if log_handle:
+            # Эмбеды сообщения лога запоминаются, чтобы поменять причину без повторного запроса сообщения
+            log_message, embed_index = log_handle
+            state['log_message_id'] = log_message.id
+            state['embed_index'] = embed_index
+            self.log_embeds.setdefault(log_message.id, [embed.to_dict() for embed in log_message.embeds])
+        self.pending_reasons[moderator.id] = state
+        self._save_pending_reasons()
+        get_timer_scheduler(self.bot).schedule(
+            'moderation_reason_timeout',
+            delay=REASON_TIMEOUT,
+            key=f"moderation_reason:{moderator.id}",
+            payload={'moderator_id': moderator.id},
+            persist=True
+        )
 
-    async def _wait_for_reason(self, moderator, target, action_type):
-        def check(msg):
-            return (
-                msg.author.id == moderator.id and isinstance(msg.channel, discord.DMChannel)
-            )
+    async def handle_reason_reply(self, message) -> bool:
+        """Маршрут ЛС: ответ модератора, от которого ждем причину"""
+        state = self._take_pending_reason(message.author.id)
+        if state is None:
+            return False
+        get_timer_scheduler(self.bot).cancel(f"moderation_reason:{message.author.id}")
+        reason = message.content.strip()
+        await message.channel.send(f"Спасибо! Причина зафиксирована: {reason}")
+        if state.get('log_message_id') and self.log_channel:
+            try:
+                await self._update_log_reason(state['log_message_id'], state['embed_index'], reason)
+            except Exception as e:
+                await message.channel.send(f"Не удалось обновить причину в логах: {e}")
+        self._forget_log_embeds(state)
+        return True
+
+    async def _update_log_reason(self, log_message_id: int, embed_index: int, reason: str):
+        """Меняет причину в эмбеде лога по сохраненным эмбедам, без fetch_message"""
+        embed_dicts = self.log_embeds.get(log_message_id)
+        if embed_dicts is None:
+            # Эмбеды неизвестны (например, потерян файл состояния) - один запрос сообщения
+            log_message = await self.log_channel.fetch_message(log_message_id)
+            embed_dicts = self.log_embeds[log_message_id] = [embed.to_dict() for embed in log_message.embeds]
+        embeds = [discord.Embed.from_dict(data) for data in embed_dicts]
+        new_embed = embeds[embed_index]
+        found = False
+        for i, field in enumerate(new_embed.fields):
+            if field.name == "📝 Причина":
+                new_embed.set_field_at(i, name="📝 Причина", value=f"```{reason}```", inline=field.inline)
+                found = True
+                break
+        if not found:
+            new_embed.add_field(name="📝 Причина", value=f"```{reason}```", inline=False)
+        # В сообщении может быть пачка логов: заменяем только свой эмбед, остальные - как есть
+        await self.log_channel.get_partial_message(log_message_id).edit(embeds=embeds)
+        embed_dicts[embed_index] = new_embed.to_dict()
+
+    async def _reason_timeout(self, payload):
+        """Причина не пришла вовремя: действие откатывается"""
+        moderator_id = payload['moderator_id']
+        state = self._take_pending_reason(moderator_id)
+        if state is None:
+            return
+        self._forget_log_embeds(state)
         try:
-            msg = await self.bot.wait_for('message', check=check, timeout=180)
-            reason = msg.content.strip()
-            await moderator.send(f"Спасибо! Причина зафиксирована: {reason}")
-            log_message_id = self.pending_log_messages.get(moderator.id)
-            if log_message_id and self.log_channel:
-                try:
-                    log_message = await self.log_channel.fetch_message(log_message_id)
-                    embed = log_message.embeds[0]
-                    new_embed = discord.Embed.from_dict(embed.to_dict())
-                    found = False
-                    for i, field in enumerate(new_embed.fields):
-                        if field.name == "📝 Причина":
-                            new_embed.set_field_at(i, name="📝 Причина", value=f"```{reason}```", inline=field.inline)
-                            found = True
-                            break
-                    if not found:
-                        new_embed.add_field(name="📝 Причина", value=f"```{reason}```", inline=False)
-                    await log_message.edit(embed=new_embed)
-                except Exception as e:
-                    await moderator.send(f"Не удалось обновить причину в логах: {e}")
-            self.pending_log_messages.pop(moderator.id, None)
-        except asyncio.TimeoutError:
+            moderator = self.bot.get_user(moderator_id) or await self.bot.fetch_user(moderator_id)
             await moderator.send("⏰ Время вышло! Действие будет отменено.")
-            # Передаю все возможные параметры для отката
-            await self._revert_action(action_type, moderator, target, **self._collect_revert_kwargs(action_type, moderator, target))
-            self.pending_log_messages.pop(moderator.id, None)
-        finally:
-            self.pending_reasons.pop(moderator.id, None)
+            target, kwargs = self._deserialize_revert_kwargs(state)
+            await self._revert_action(state['action_type'], moderator, target, **kwargs)
+        except Exception as e:
+            logger.error(f"Ошибка отмены действия без причины: {e}")
+
+    def _take_pending_reason(self, moderator_id: int) -> Optional[Dict]:
+        state = self.pending_reasons.pop(moderator_id, None)
+        if state is not None:
+            self._save_pending_reasons()
+        return state
+
+    def _forget_log_embeds(self, state: Dict):
+        """Эмбеды лога хранятся, пока на сообщение ссылается хотя бы одна ожидаемая причина"""
+        log_message_id = state.get('log_message_id')
+        if log_message_id and not any(other.get('log_message_id') == log_message_id
+                                      for other in self.pending_reasons.values()):
+            self.log_embeds.pop(log_message_id, None)
+            self._save_pending_reasons()
+
+    def _serialize_revert_kwargs(self, target) -> Dict:
+        """Данные для отката в виде id, чтобы пережить перезапуск"""
+        kwargs = self._collect_revert_kwargs(None, None, target)
+        data = {'target_id': kwargs.get('target_id')}
+        if kwargs.get('guild') is not None:
+            data['guild_id'] = kwargs['guild'].id
+        if 'roles' in kwargs:
+            data['role_ids'] = [role.id for role in kwargs['roles']]
+        if kwargs.get('channel') is not None:
+            data['channel_id'] = kwargs['channel'].id
+        if kwargs.get('old_value') is not None:
+            data['old_value'] = kwargs['old_value']
+        return data
+
+    def _deserialize_revert_kwargs(self, state: Dict):
+        """Цель и параметры отката из сохраненных id"""
+        guild = self.bot.get_guild(state['guild_id']) if state.get('guild_id') else None
+        target_id = state.get('target_id')
+        target = None
+        if target_id is not None:
+            target = (guild.get_member(target_id) if guild else None) or discord.Object(id=target_id)
+        kwargs = {'target_id': target_id}
+        if guild is not None:
+            kwargs['guild'] = guild
+            if 'role_ids' in state:
+                kwargs['roles'] = [role for role in map(guild.get_role, state['role_ids']) if role is not None]
+            if state.get('channel_id'):
+                kwargs['channel'] = guild.get_channel(state['channel_id'])
+        if 'old_value' in state:
+            kwargs['old_value'] = state['old_value']
+        return target, kwargs
+
+    def _load_pending_reasons(self):
+        if not os.path.exists(self.reasons_file):
+            return
+        try:
+            with open(self.reasons_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.pending_reasons = {int(moderator_id): state for moderator_id, state in data.get('pending', {}).items()}
+            self.log_embeds = {int(message_id): embeds for message_id, embeds in data.get('log_embeds', {}).items()}
+        except Exception as e:
+            logger.error(f"Ошибка загрузки ожидаемых причин: {e}")
+
+    def _save_pending_reasons(self):
+        try:
+            data = {
+                'pending': {str(moderator_id): state for moderator_id, state in self.pending_reasons.items()},
+                'log_embeds': {str(message_id): embeds for message_id, embeds in self.log_embeds.items()}
+            }
+            temp_file = f"{self.reasons_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.reasons_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения ожидаемых причин: {e}")
 
     def _collect_revert_kwargs(self, action_type, moderator, target):
         # Собирает дополнительные параметры для отката (roles, channel, old_value и т.д.)
@@ -420,7 +661,7 @@ class ModerationLogs:
                         member = guild.get_member(target_id)
                         if not member:
                             member = await guild.fetch_member(target_id)
-                        muted_role = discord.utils.get(guild.roles, name="Muted")
+                        muted_role = get_guild_directory(self.bot).role(guild, "Muted")
                         if muted_role and member and muted_role in member.roles:
                             await member.remove_roles(muted_role, reason="Действие отменено: причина не указана")
                             await moderator.send(f"✅ Мут снят с пользователя {member.mention} (откат мута).")
@@ -504,6 +745,15 @@ async def setup_moderation_logs(bot):
         # Устанавливаем обработчики событий
         await setup_log_handlers(bot, logs_system)
         
+        # Ответы с причинами разбирает один маршрут ЛС по id ожидающих модераторов
+        setup_message_router(bot).route(
+            'moderation_reason',
+            logs_system.handle_reason_reply,
+            priority=PRIORITY_PROTECTION,
+            dm=SCOPE_DM,
+            author_ids=logs_system.pending_reasons
+        )
+        
         logger.info("Система логирования модерации настроена")
         
     except Exception as e:
@@ -511,56 +761,57 @@ async def setup_moderation_logs(bot):
 
 async def setup_log_handlers(bot, logs_system):
     """Устанавливает обработчики событий для логирования"""
+    bus = setup_event_bus(bot)
+    audit_logs = setup_audit_log_resolver(bot)
+    privileges = get_privilege_cache(bot)
+    privileges.assign_roles(PRIV_EXEMPT, EXEMPT_RESTORE_ROLES)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_member_ban(guild, user):
         """Логирует бан участника"""
         try:
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.ban, limit=1):
-                if entry.target.id == user.id:
-                    await logs_system.log_action(
-                        action_type="Бан",
-                        moderator=entry.user,
-                        target=user,
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(guild, discord.AuditLogAction.ban, user.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Бан",
+                    moderator=entry.user,
+                    target=user,
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования бана: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_member_unban(guild, user):
         """Логирует разбан участника"""
         try:
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.unban, limit=1):
-                if entry.target.id == user.id:
-                    await logs_system.log_action(
-                        action_type="Разбан",
-                        moderator=entry.user,
-                        target=user,
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(guild, discord.AuditLogAction.unban, user.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Разбан",
+                    moderator=entry.user,
+                    target=user,
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования разбана: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_member_remove(member):
         """Логирует кик участника"""
         try:
-            async for entry in member.guild.audit_logs(action=discord.AuditLogAction.kick, limit=1):
-                if entry.target.id == member.id:
-                    await logs_system.log_action(
-                        action_type="Кик",
-                        moderator=entry.user,
-                        target=member,
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(member.guild, discord.AuditLogAction.kick, member.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Кик",
+                    moderator=entry.user,
+                    target=member,
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования кика: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_member_update(before, after):
         """Логирует изменения участника"""
         try:
@@ -569,110 +820,106 @@ async def setup_log_handlers(bot, logs_system):
                 added_roles = set(after.roles) - set(before.roles)
                 removed_roles = set(before.roles) - set(after.roles)
                 
-                async for entry in before.guild.audit_logs(action=discord.AuditLogAction.member_role_update, limit=1):
-                    if entry.target.id == after.id:
-                        if added_roles:
-                            await logs_system.log_action(
-                                action_type="Добавление ролей",
-                                moderator=entry.user,
-                                target=after,
-                                roles=list(added_roles),
-                                reason=entry.reason or "Причина не указана"
-                            )
-                        if removed_roles:
-                            await logs_system.log_action(
-                                action_type="Снятие ролей",
-                                moderator=entry.user,
-                                target=after,
-                                roles=list(removed_roles),
-                                reason=entry.reason or "Причина не указана"
-                            )
-                        break
-            
-            # Изменение никнейма
-            if before.nick != after.nick:
-                async for entry in before.guild.audit_logs(action=discord.AuditLogAction.member_update, limit=1):
-                    if entry.target.id == after.id:
+                entry = await audit_logs.resolve(before.guild, discord.AuditLogAction.member_role_update, after.id)
+                if entry:
+                    if added_roles:
                         await logs_system.log_action(
-                            action_type="Изменение никнейма",
+                            action_type="Добавление ролей",
                             moderator=entry.user,
                             target=after,
-                            old_value=before.nick or "Нет",
-                            new_value=after.nick or "Нет",
+                            roles=list(added_roles),
                             reason=entry.reason or "Причина не указана"
                         )
-                        break
+                    if removed_roles:
+                        await logs_system.log_action(
+                            action_type="Снятие ролей",
+                            moderator=entry.user,
+                            target=after,
+                            roles=list(removed_roles),
+                            reason=entry.reason or "Причина не указана"
+                        )
+            
+            # Изменение никнейма
+            if before.nick != after.nick:
+                entry = await audit_logs.resolve(before.guild, discord.AuditLogAction.member_update, after.id)
+                if entry:
+                    await logs_system.log_action(
+                        action_type="Изменение никнейма",
+                        moderator=entry.user,
+                        target=after,
+                        old_value=before.nick or "Нет",
+                        new_value=after.nick or "Нет",
+                        reason=entry.reason or "Причина не указана"
+                    )
                         
         except Exception as e:
             logger.error(f"Ошибка логирования изменения участника: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_channel_delete(channel):
         """Логирует удаление канала"""
         try:
-            async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.channel_delete, limit=1):
-                if entry.target.id == channel.id:
-                    await logs_system.log_action(
-                        action_type="Удаление канала",
-                        moderator=entry.user,
-                        channel=channel,
-                        details=f"Канал: {channel.name}",
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Удаление канала",
+                    moderator=entry.user,
+                    channel=channel,
+                    details=f"Канал: {channel.name}",
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования удаления канала: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_channel_create(channel):
         """Логирует создание канала"""
         try:
-            async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.channel_create, limit=1):
-                if entry.target.id == channel.id:
-                    await logs_system.log_action(
-                        action_type="Создание канала",
-                        moderator=entry.user,
-                        channel=channel,
-                        details=f"Канал: {channel.name}",
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(channel.guild, discord.AuditLogAction.channel_create, channel.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Создание канала",
+                    moderator=entry.user,
+                    channel=channel,
+                    details=f"Канал: {channel.name}",
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования создания канала: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_channel_update(before, after):
         """Логирует изменения канала"""
         try:
-            async for entry in before.guild.audit_logs(action=discord.AuditLogAction.channel_update, limit=1):
-                if entry.target.id == after.id:
-                    changes = []
-                    
-                    # Изменение имени
-                    if before.name != after.name:
-                        changes.append(f"Имя: {before.name} → {after.name}")
-                    
-                    # Изменение темы
-                    if hasattr(before, 'topic') and hasattr(after, 'topic') and before.topic != after.topic:
-                        changes.append("Тема изменена")
-                    
-                    # Изменение прав
-                    if hasattr(before, 'overwrites') and hasattr(after, 'overwrites') and before.overwrites != after.overwrites:
-                        changes.append("Права канала изменены")
-                    
-                    if changes:
-                        await logs_system.log_action(
-                            action_type="Изменение канала",
-                            moderator=entry.user,
-                            channel=after,
-                            details=f"Канал: {after.name}\nИзменения: {'; '.join(changes)}",
-                            reason=entry.reason or "Причина не указана"
-                        )
-                    break
+            changes = []
+            
+            # Изменение имени
+            if before.name != after.name:
+                changes.append(f"Имя: {before.name} → {after.name}")
+            
+            # Изменение темы
+            if hasattr(before, 'topic') and hasattr(after, 'topic') and before.topic != after.topic:
+                changes.append("Тема изменена")
+            
+            # Изменение прав
+            if hasattr(before, 'overwrites') and hasattr(after, 'overwrites') and before.overwrites != after.overwrites:
+                changes.append("Права канала изменены")
+            
+            # Перемещения каналов в лог не попадают, поэтому запись журнала ищем только при изменениях
+            if changes:
+                entry = await audit_logs.resolve(before.guild, discord.AuditLogAction.channel_update, after.id)
+                if entry:
+                    await logs_system.log_action(
+                        action_type="Изменение канала",
+                        moderator=entry.user,
+                        channel=after,
+                        details=f"Канал: {after.name}\nИзменения: {'; '.join(changes)}",
+                        reason=entry.reason or "Причина не указана"
+                    )
         except Exception as e:
             logger.error(f"Ошибка логирования изменения канала: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_message(message):
         """Резервное копирование сообщений"""
         # Пропускаем сообщения ботов и сообщения в ЛС
@@ -682,75 +929,130 @@ async def setup_log_handlers(bot, logs_system):
         # Делаем бэкап только сообщений в серверных каналах
         await logs_system.backup_message(message)
     
-    @bot.event
-    async def on_message_edit(before, after):
-        """Логирует редактирование сообщений"""
+    def resolve_author(guild: discord.Guild, author_id: int):
+        """Автор из кэша участников и пользователей, без запросов к API"""
+        return guild.get_member(author_id) or bot.get_user(author_id)
+    
+    @bus.listen(priority=PRIORITY_LOGGING)
+    async def on_raw_message_edit(payload):
+        """Логирует редактирование; прежний текст берется из хранилища копий, а не из кэша сообщений"""
         try:
-            # Пропускаем сообщения ботов, ЛС и если содержимое не изменилось
-            if (before.author.bot or 
-                isinstance(before.channel, discord.DMChannel) or 
-                before.content == after.content):
+            # Пропускаем ЛС и обновления без текста (например, подгрузку эмбедов ссылок)
+            if payload.guild_id is None or 'content' not in payload.data:
+                return
+            if (payload.data.get('author') or {}).get('bot'):
+                return
+            guild = bot.get_guild(payload.guild_id)
+            if guild is None:
                 return
             
-            async for entry in before.guild.audit_logs(action=discord.AuditLogAction.message_delete, limit=1):
-                if entry.target.id == before.author.id:
-                    await logs_system.log_action(
-                        action_type="Редактирование сообщения",
-                        moderator=entry.user,
-                        target=before.author,
-                        channel=before.channel,
-                        old_value=before.content,
-                        new_value=after.content,
-                        message_content=f"Было: {before.content}\nСтало: {after.content}",
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            edited_at = payload.data.get('edited_timestamp') or discord.utils.utcnow().isoformat()
+            edit = logs_system.message_backup.record_edit(payload.message_id, payload.data['content'], edited_at)
+            if edit is None:
+                # Копии нет (сообщение старше хранилища) - сохраняем текущую версию для следующих событий
+                if logs_system.message_backup.get(payload.message_id) is None and logs_system.backup_enabled:
+                    await logs_system.backup_message(payload.message)
+                return
+            previous, backup_data = edit
+            
+            # Редактирование не создает записей журнала, поэтому смотрим только уже известные записи
+            entry = await audit_logs.resolve(guild, discord.AuditLogAction.message_delete, backup_data['author_id'], timeout=0)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Редактирование сообщения",
+                    moderator=entry.user,
+                    target=resolve_author(guild, backup_data['author_id']),
+                    channel=guild.get_channel_or_thread(payload.channel_id),
+                    old_value=previous,
+                    new_value=backup_data['content'],
+                    message_content=f"Было: {previous}\nСтало: {backup_data['content']}",
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования редактирования сообщения: {e}")
     
-    @bot.event
-    async def on_message_delete(message):
-        """Логирует удаление сообщения и восстанавливает его"""
+    @bus.listen(priority=PRIORITY_LOGGING)
+    async def on_raw_message_delete(payload):
+        """Логирует удаление сообщения и восстанавливает его по копии - в том числе вне кэша сообщений"""
         try:
-            # Пропускаем сообщения ботов и ЛС
-            if message.author.bot or isinstance(message.channel, discord.DMChannel):
+            if payload.guild_id is None:
                 return
+            guild = bot.get_guild(payload.guild_id)
+            channel = guild.get_channel_or_thread(payload.channel_id) if guild else None
+            backup_data = logs_system.message_backup.get(payload.message_id)
+            # Без копии восстанавливать нечего; сообщения ботов не копируются
+            if channel is None or backup_data is None:
+                return
+            author = resolve_author(guild, backup_data['author_id'])
             
             # Проверяем исключения для специальных ролей
-            if any(role.id in EXEMPT_RESTORE_ROLES for role in message.author.roles):
-                logger.info(f"Пропускаем восстановление сообщения для пользователя {message.author.name} с исключительной ролью")
+            if isinstance(author, discord.Member) and privileges.has(author, PRIV_EXEMPT):
+                logger.info(f"Пропускаем восстановление сообщения для пользователя {author.name} с исключительной ролью")
                 return
             
-            # Логируем удаление
-            async for entry in message.guild.audit_logs(action=discord.AuditLogAction.message_delete, limit=1):
-                if entry.target.id == message.author.id:
-                    await logs_system.log_action(
-                        action_type="Удаление сообщения",
-                        moderator=entry.user,
-                        target=message.author,
-                        channel=message.channel,
-                        message_content=message.content,
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            # Логируем удаление; Discord объединяет удаления одного модератора в одну запись на несколько минут,
+            # а ждать дольше паузы перед восстановлением не нужно - удаления автором записей не создают
+            entry = await audit_logs.resolve(guild, discord.AuditLogAction.message_delete, backup_data['author_id'],
+                                             max_age=300, timeout=1)
+            if entry:
+                edits = backup_data.get('edits')
+                details = ""
+                if edits:
+                    details = f"Правок: {len(edits)}\nИсходный текст: {content_versions(backup_data)[0][:500]}"
+                await logs_system.log_action(
+                    action_type="Удаление сообщения",
+                    moderator=entry.user,
+                    target=author,
+                    channel=channel,
+                    message_content=backup_data['content'],
+                    details=details,
+                    reason=entry.reason or "Причина не указана"
+                )
             
             # Восстанавливаем сообщение
-            await asyncio.sleep(1)  # Небольшая задержка
-            restored = await logs_system.restore_message(message.id, message.channel)
+            if entry is None:
+                await asyncio.sleep(0.5)  # Небольшая задержка (часть её уже ушла на ожидание записи журнала)
+            restored = await logs_system.restore_message(payload.message_id, channel)
             
             if restored:
                 await logs_system.log_action(
                     action_type="Восстановление сообщения",
                     moderator=bot.user,
-                    target=message.author,
-                    channel=message.channel,
+                    target=author,
+                    channel=channel,
                     details="Сообщение автоматически восстановлено"
                 )
                 
         except Exception as e:
             logger.error(f"Ошибка обработки удаления сообщения: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
+    async def on_raw_bulk_message_delete(payload):
+        """Массовое удаление - одна операция: один поиск в журнале аудита и одна запись лога"""
+        try:
+            guild = bot.get_guild(payload.guild_id) if payload.guild_id else None
+            if guild is None:
+                return
+            channel = guild.get_channel_or_thread(payload.channel_id)
+            if channel is None:
+                return
+            # Цель записи массового удаления - канал
+            entry = await audit_logs.resolve(guild, discord.AuditLogAction.message_bulk_delete, channel.id,
+                                             max_age=60, timeout=2)
+            moderator = entry.user if entry else None
+            # Свою очистку (команды бота) не восстанавливаем
+            restore = logs_system.bulk_restore_enabled and not (moderator and moderator.id == bot.user.id)
+            await logs_system.log_bulk_delete(
+                channel,
+                list(payload.message_ids),
+                moderator=moderator,
+                reason=(entry.reason or "Причина не указана") if entry else "",
+                restore=restore
+            )
+        except Exception as e:
+            logger.error(f"Ошибка обработки массового удаления сообщений: {e}")
+    
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_raw_reaction_remove(payload):
         """Логирует удаление реакций (эмодзи под сообщениями)"""
         try:
@@ -762,241 +1064,245 @@ async def setup_log_handlers(bot, logs_system):
             if not channel:
                 return
             
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.message_delete, limit=1):
-                # Проверяем, что это удаление реакции
-                if hasattr(entry, 'extra') and hasattr(entry.extra, 'emoji'):
-                    await logs_system.log_action(
-                        action_type="Удаление реакции",
-                        moderator=entry.user,
-                        channel=channel,
-                        emoji_name=payload.emoji.name,
-                        details=f"Эмодзи: {payload.emoji.name} удален из сообщения",
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            # Проверяем, что это удаление реакции (только по уже известным записям: реакции снимают часто)
+            entry = await audit_logs.resolve(
+                guild, discord.AuditLogAction.message_delete,
+                check=lambda entry: hasattr(entry, 'extra') and hasattr(entry.extra, 'emoji'),
+                timeout=0
+            )
+            if entry:
+                await logs_system.log_action(
+                    action_type="Удаление реакции",
+                    moderator=entry.user,
+                    channel=channel,
+                    emoji_name=payload.emoji.name,
+                    details=f"Эмодзи: {payload.emoji.name} удален из сообщения",
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования удаления реакции: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_emojis_update(guild, before, after):
         """Логирует изменения эмодзи"""
         try:
             added_emojis = set(after) - set(before)
             removed_emojis = set(before) - set(after)
             
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.emoji_create, limit=1):
-                if added_emojis:
+            if added_emojis:
+                entry = await audit_logs.resolve(guild, discord.AuditLogAction.emoji_create, next(iter(added_emojis)).id)
+                if entry:
                     await logs_system.log_action(
                         action_type="Добавление эмодзи",
                         moderator=entry.user,
                         details=f"Эмодзи: {', '.join([emoji.name for emoji in added_emojis])}",
                         reason=entry.reason or "Причина не указана"
                     )
-                    break
             
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.emoji_delete, limit=1):
-                if removed_emojis:
+            if removed_emojis:
+                entry = await audit_logs.resolve(guild, discord.AuditLogAction.emoji_delete, next(iter(removed_emojis)).id)
+                if entry:
                     await logs_system.log_action(
                         action_type="Удаление эмодзи",
                         moderator=entry.user,
                         details=f"Эмодзи: {', '.join([emoji.name for emoji in removed_emojis])}",
                         reason=entry.reason or "Причина не указана"
                     )
-                    break
                     
         except Exception as e:
             logger.error(f"Ошибка логирования изменений эмодзи: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_stickers_update(guild, before, after):
         """Логирует изменения стикеров"""
         try:
             added_stickers = set(after) - set(before)
             removed_stickers = set(before) - set(after)
             
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.sticker_create, limit=1):
-                if added_stickers:
+            if added_stickers:
+                entry = await audit_logs.resolve(guild, discord.AuditLogAction.sticker_create, next(iter(added_stickers)).id)
+                if entry:
                     await logs_system.log_action(
                         action_type="Добавление стикера",
                         moderator=entry.user,
                         details=f"Стикер: {', '.join([sticker.name for sticker in added_stickers])}",
                         reason=entry.reason or "Причина не указана"
                     )
-                    break
             
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.sticker_delete, limit=1):
-                if removed_stickers:
+            if removed_stickers:
+                entry = await audit_logs.resolve(guild, discord.AuditLogAction.sticker_delete, next(iter(removed_stickers)).id)
+                if entry:
                     await logs_system.log_action(
                         action_type="Удаление стикера",
                         moderator=entry.user,
                         details=f"Стикер: {', '.join([sticker.name for sticker in removed_stickers])}",
                         reason=entry.reason or "Причина не указана"
                     )
-                    break
                     
         except Exception as e:
             logger.error(f"Ошибка логирования изменений стикеров: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_voice_state_update(member, before, after):
         """Логирует изменения голосового состояния"""
         try:
             # Отключение от голосового канала
             if before.channel and not after.channel:
-                async for entry in member.guild.audit_logs(action=discord.AuditLogAction.member_disconnect, limit=1):
-                    if entry.target.id == member.id:
-                        await logs_system.log_action(
-                            action_type="Отключение от голосового",
-                            moderator=entry.user,
-                            target=member,
-                            channel=before.channel,
-                            reason=entry.reason or "Причина не указана"
-                        )
-                        break
+                # Выход из голосового - частое событие, поэтому без ожидания и запросов к API
+                entry = await audit_logs.resolve(member.guild, discord.AuditLogAction.member_disconnect, member.id, timeout=0)
+                if entry:
+                    await logs_system.log_action(
+                        action_type="Отключение от голосового",
+                        moderator=entry.user,
+                        target=member,
+                        channel=before.channel,
+                        reason=entry.reason or "Причина не указана"
+                    )
             
             # Отключение звука
             if before.mute != after.mute:
-                async for entry in member.guild.audit_logs(action=discord.AuditLogAction.member_update, limit=1):
-                    if entry.target.id == member.id:
-                        action = "Отключение звука" if after.mute else "Включение звука"
-                        await logs_system.log_action(
-                            action_type=action,
-                            moderator=entry.user,
-                            target=member,
-                            channel=after.channel or before.channel,
-                            reason=entry.reason or "Причина не указана"
-                        )
-                        break
+                entry = await audit_logs.resolve(member.guild, discord.AuditLogAction.member_update, member.id)
+                if entry:
+                    action = "Отключение звука" if after.mute else "Включение звука"
+                    await logs_system.log_action(
+                        action_type=action,
+                        moderator=entry.user,
+                        target=member,
+                        channel=after.channel or before.channel,
+                        reason=entry.reason or "Причина не указана"
+                    )
             
             # Заглушение
             if before.deaf != after.deaf:
-                async for entry in member.guild.audit_logs(action=discord.AuditLogAction.member_update, limit=1):
-                    if entry.target.id == member.id:
-                        action = "Заглушение" if after.deaf else "Снятие заглушения"
-                        await logs_system.log_action(
-                            action_type=action,
-                            moderator=entry.user,
-                            target=member,
-                            channel=after.channel or before.channel,
-                            reason=entry.reason or "Причина не указана"
-                        )
-                        break
+                entry = await audit_logs.resolve(member.guild, discord.AuditLogAction.member_update, member.id)
+                if entry:
+                    action = "Заглушение" if after.deaf else "Снятие заглушения"
+                    await logs_system.log_action(
+                        action_type=action,
+                        moderator=entry.user,
+                        target=member,
+                        channel=after.channel or before.channel,
+                        reason=entry.reason or "Причина не указана"
+                    )
                         
         except Exception as e:
             logger.error(f"Ошибка логирования изменений голосового состояния: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_role_create(role):
         """Логирует создание роли"""
         try:
-            async for entry in role.guild.audit_logs(action=discord.AuditLogAction.role_create, limit=1):
-                if entry.target.id == role.id:
-                    await logs_system.log_action(
-                        action_type="Создание роли",
-                        moderator=entry.user,
-                        details=f"Роль: {role.name}",
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(role.guild, discord.AuditLogAction.role_create, role.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Создание роли",
+                    moderator=entry.user,
+                    details=f"Роль: {role.name}",
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования создания роли: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_role_delete(role):
         """Логирует удаление роли"""
         try:
-            async for entry in role.guild.audit_logs(action=discord.AuditLogAction.role_delete, limit=1):
-                if entry.target.id == role.id:
-                    await logs_system.log_action(
-                        action_type="Удаление роли",
-                        moderator=entry.user,
-                        details=f"Роль: {role.name}",
-                        reason=entry.reason or "Причина не указана"
-                    )
-                    break
+            entry = await audit_logs.resolve(role.guild, discord.AuditLogAction.role_delete, role.id)
+            if entry:
+                await logs_system.log_action(
+                    action_type="Удаление роли",
+                    moderator=entry.user,
+                    details=f"Роль: {role.name}",
+                    reason=entry.reason or "Причина не указана"
+                )
         except Exception as e:
             logger.error(f"Ошибка логирования удаления роли: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_role_update(before, after):
         """Логирует изменения роли"""
         try:
-            async for entry in before.guild.audit_logs(action=discord.AuditLogAction.role_update, limit=1):
-                if entry.target.id == after.id:
-                    changes = []
-                    
-                    # Изменение имени
-                    if before.name != after.name:
-                        changes.append(f"Имя: {before.name} → {after.name}")
-                    
-                    # Изменение цвета
-                    if before.color != after.color:
-                        changes.append(f"Цвет: {before.color} → {after.color}")
-                    
-                    # Изменение прав
-                    if before.permissions != after.permissions:
-                        changes.append("Права изменены")
-                        
-                        # Детали изменений прав
-                        old_perms = dict(before.permissions)
-                        new_perms = dict(after.permissions)
-                        perm_changes = {}
-                        
-                        for perm in old_perms:
-                            if old_perms[perm] != new_perms.get(perm, False):
-                                perm_changes[perm] = new_perms.get(perm, False)
-                        
-                        if perm_changes:
-                            await logs_system.log_action(
-                                action_type="Изменение прав роли",
-                                moderator=entry.user,
-                                details=f"Роль: {after.name}",
-                                permissions=perm_changes,
-                                reason=entry.reason or "Причина не указана"
-                            )
-                    
-                    if changes:
+            # Перемещение ролей в лог не попадает - запись журнала для него не ищем
+            if (before.name == after.name and before.color == after.color
+                    and before.permissions == after.permissions):
+                return
+
+            entry = await audit_logs.resolve(before.guild, discord.AuditLogAction.role_update, after.id)
+            if entry:
+                changes = []
+
+                # Изменение имени
+                if before.name != after.name:
+                    changes.append(f"Имя: {before.name} → {after.name}")
+
+                # Изменение цвета
+                if before.color != after.color:
+                    changes.append(f"Цвет: {before.color} → {after.color}")
+
+                # Изменение прав
+                if before.permissions != after.permissions:
+                    changes.append("Права изменены")
+
+                    # Детали изменений прав
+                    old_perms = dict(before.permissions)
+                    new_perms = dict(after.permissions)
+                    perm_changes = {}
+
+                    for perm in old_perms:
+                        if old_perms[perm] != new_perms.get(perm, False):
+                            perm_changes[perm] = new_perms.get(perm, False)
+
+                    if perm_changes:
                         await logs_system.log_action(
-                            action_type="Изменение роли",
+                            action_type="Изменение прав роли",
                             moderator=entry.user,
-                            details=f"Роль: {after.name}\nИзменения: {'; '.join(changes)}",
+                            details=f"Роль: {after.name}",
+                            permissions=perm_changes,
                             reason=entry.reason or "Причина не указана"
                         )
-                    break
+
+                if changes:
+                    await logs_system.log_action(
+                        action_type="Изменение роли",
+                        moderator=entry.user,
+                        details=f"Роль: {after.name}\nИзменения: {'; '.join(changes)}",
+                        reason=entry.reason or "Причина не указана"
+                    )
         except Exception as e:
             logger.error(f"Ошибка логирования изменения роли: {e}")
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_LOGGING)
     async def on_guild_update(before, after):
         """Логирует изменения сервера"""
         try:
-            async for entry in before.audit_logs(action=discord.AuditLogAction.guild_update, limit=1):
-                changes = []
-                
-                # Изменение имени
-                if before.name != after.name:
-                    changes.append(f"Имя: {before.name} → {after.name}")
-                
-                # Изменение аватара
-                if before.icon != after.icon:
-                    changes.append("Аватар изменен")
-                
-                # Изменение баннера
-                if before.banner != after.banner:
-                    changes.append("Баннер изменен")
-                
-                # Изменение уровня верификации
-                if before.verification_level != after.verification_level:
-                    changes.append(f"Уровень верификации: {before.verification_level} → {after.verification_level}")
-                
-                if changes:
+            changes = []
+            
+            # Изменение имени
+            if before.name != after.name:
+                changes.append(f"Имя: {before.name} → {after.name}")
+            
+            # Изменение аватара
+            if before.icon != after.icon:
+                changes.append("Аватар изменен")
+            
+            # Изменение баннера
+            if before.banner != after.banner:
+                changes.append("Баннер изменен")
+            
+            # Изменение уровня верификации
+            if before.verification_level != after.verification_level:
+                changes.append(f"Уровень верификации: {before.verification_level} → {after.verification_level}")
+            
+            # Запись журнала ищем только для изменений, которые попадут в лог
+            if changes:
+                entry = await audit_logs.resolve(after, discord.AuditLogAction.guild_update, after.id)
+                if entry:
                     await logs_system.log_action(
                         action_type="Изменение настроек сервера",
                         moderator=entry.user,
                         details=f"Изменения: {'; '.join(changes)}",
                         reason=entry.reason or "Причина не указана"
                     )
-                break
         except Exception as e:
             logger.error(f"Ошибка логирования изменений сервера: {e}")
 
@@ -0,0 +1,110 @@
+"""
+Журнал действий модераторов для Discord бота
+Каждое действие (бан, кик, мут, удаление канала) - строка в SQLite с индексами по
+модератору, типу действия и времени. Лимиты и статистика считаются запросом по
+диапазону индекса, а не перебором, и не теряются при перезапуске
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlite_store import get_sqlite_store
+
+logger = logging.getLogger('moderator_action_store')
+
+DATABASE_FILE = "moderator_actions.db"
+RETENTION = 30 * 86400  # Сколько секунд хранить действия
+
+# Окна статистики: название -> секунд
+WINDOWS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 7 * 86400
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS moderator_actions (
+    guild_id INTEGER NOT NULL,
+    moderator_id INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_moderator_actions_moderator ON moderator_actions (moderator_id, action, ts);
+CREATE INDEX IF NOT EXISTS idx_moderator_actions_ts ON moderator_actions (ts);
+"""
+
+INSERT_SQL = "INSERT INTO moderator_actions (guild_id, moderator_id, action, ts) VALUES (?, ?, ?, ?)"
+
+
+class ModeratorActionStore:
+    """Действия модераторов во времени"""
+
+    def __init__(self, bot, path: str = DATABASE_FILE):
+        self.bot = bot
+        self.store = get_sqlite_store(bot, path, SCHEMA)
+
+    def record(self, guild_id: int, moderator_id: int, action: str, now: Optional[float] = None):
+        """Записывает действие (пачкой вместе с соседними)"""
+        if now is None:
+            now = time.time()
+        self.store.insert(INSERT_SQL, (guild_id, moderator_id, action, now))
+
+    def count(self, guild_id: int, moderator_id: int, action: str, window: float = 3600,
+              now: Optional[float] = None) -> int:
+        """Число действий модератора за последние window секунд, включая еще не записанные"""
+        if now is None:
+            now = time.time()
+        since = now - window
+        try:
+            row = self.store.query_one(
+                "SELECT COUNT(*) FROM moderator_actions "
+                "WHERE moderator_id = ? AND action = ? AND ts >= ? AND guild_id = ?",
+                (moderator_id, action, since, guild_id)
+            )
+            stored = row[0] if row else 0
+        except Exception as e:
+            logger.error(f"Ошибка подсчета действий модератора {moderator_id}: {e}")
+            stored = 0
+        pending = sum(1 for item in self.store.pending_for(INSERT_SQL)
+                      if item[0] == guild_id and item[1] == moderator_id and item[2] == action and item[3] >= since)
+        return stored + pending
+
+    def counts(self, guild_id: int, window: float = 3600, now: Optional[float] = None) -> Dict[int, Dict[str, int]]:
+        """Действия всех модераторов за окно: {id модератора: {тип действия: количество}}"""
+        if now is None:
+            now = time.time()
+        since = now - window
+        result: Dict[int, Dict[str, int]] = {}
+        try:
+            rows = self.store.query(
+                "SELECT moderator_id, action, COUNT(*) FROM moderator_actions "
+                "WHERE ts >= ? AND guild_id = ? GROUP BY moderator_id, action",
+                (since, guild_id)
+            )
+        except Exception as e:
+            logger.error(f"Ошибка получения статистики модераторов: {e}")
+            rows = []
+        for moderator_id, action, count in rows:
+            result.setdefault(moderator_id, {})[action] = count
+        for item_guild, moderator_id, action, ts in self.store.pending_for(INSERT_SQL):
+            if item_guild == guild_id and ts >= since:
+                actions = result.setdefault(moderator_id, {})
+                actions[action] = actions.get(action, 0) + 1
+        return result
+
+    def prune(self, now: Optional[float] = None):
+        """Удаляет действия старше RETENTION"""
+        if now is None:
+            now = time.time()
+        self.store.execute_later("DELETE FROM moderator_actions WHERE ts < ?", (now - RETENTION,))
+
+    def get_stats(self) -> Dict:
+        return self.store.get_stats()
+
+
+def get_moderator_action_store(bot) -> ModeratorActionStore:
+    """Возвращает журнал действий модераторов бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'moderator_action_store'):
+        bot.moderator_action_store = ModeratorActionStore(bot)
+    return bot.moderator_action_store
@@ -12,6 +12,7 @@ import os
 from typing import Optional, Dict, List
 import json
 from datetime import datetime
+from event_bus import setup_event_bus, PRIORITY_CORE
 
 logger = logging.getLogger(__name__)
 
@@ -171,6 +172,10 @@ class MusicSystem:
             if self.is_playing:
                 logger.info("Музыка уже воспроизводится")
                 return
+
+            if hasattr(self.bot, 'load_protection') and self.bot.load_protection.is_feature_disabled('music'):
+                logger.info("Музыка отключена из-за высокой нагрузки")
+                return
             
             self.is_playing = True
             logger.info("Начинаем воспроизведение музыки")
@@ -339,8 +344,9 @@ async def setup_music_system(bot):
 
 async def setup_music_handlers(bot, music_system):
     """Устанавливает обработчики событий для системы музыки"""
+    bus = setup_event_bus(bot)
     
-    @bot.event
+    @bus.listen(priority=PRIORITY_CORE)
     async def on_voice_state_update(member, before, after):
         """Обрабатывает изменения голосового состояния"""
         try:
@@ -11,6 +11,8 @@ import logging
 from datetime import datetime, timedelta
 import re
 from config import LIMONERICX_SERVER_ID
+from timer_scheduler import get_timer_scheduler
+from guild_directory import get_guild_directory
 
 logger = logging.getLogger('mute_system')
 
@@ -101,8 +103,8 @@ class MuteModal(discord.ui.Modal, title='Замутить пользовател
             except discord.Forbidden:
                 pass  # Не можем отправить ЛС
 
-            # Создаем задачу для автоматического снятия мута
-            asyncio.create_task(mute_system._auto_unmute(self.target_user, mute_seconds, interaction.guild.name))
+            # Планируем автоматическое снятие мута (таймер переживает перезапуск бота)
+            mute_system.schedule_unmute(self.target_user, mute_seconds, interaction.guild.name)
 
             logger.info(f"Пользователь {self.target_user.name} замучен модератором {interaction.user.name} на {mute_system.format_time(mute_seconds)}")
 
@@ -135,6 +137,7 @@ class UnmuteModal(discord.ui.Modal, title='Размутить пользоват
 
             # Размучиваем пользователя
             await self.target_user.remove_roles(mute_system.muted_role, reason=f"Размут от {interaction.user}: {self.reason.value or 'Причина не указана'}")
+            mute_system.cancel_unmute(self.target_user)
 
             # Создаем embed с информацией о размуте
             embed = discord.Embed(
@@ -259,7 +262,8 @@ class MuteSystem:
 
         # Создаем канал "🔇・муты"
         channel_name = "🔇・муты"
-        existing_channel = discord.utils.get(guild.channels, name=channel_name)
+        directory = get_guild_directory(self.bot)
+        existing_channel = directory.channel(guild, channel_name)
 
         if not existing_channel:
             try:
@@ -296,7 +300,7 @@ class MuteSystem:
             logger.info(f"Найден существующий канал мутов: {self.mute_channel.name}")
 
         # Создаем или находим роль "Muted"
-        muted_role = discord.utils.get(guild.roles, name="Muted")
+        muted_role = directory.role(guild, "Muted")
         if not muted_role:
             try:
                 muted_role = await guild.create_role(
@@ -304,6 +308,7 @@ class MuteSystem:
                     color=discord.Color.dark_gray(),
                     reason="Роль для замученных пользователей"
                 )
+                directory.track(muted_role)
 
                 # Настраиваем права роли во всех каналах
                 for channel in guild.channels:
@@ -423,13 +428,29 @@ class MuteSystem:
                 return f"{days} д. {hours} ч."
             return f"{days} д."
 
-    async def _auto_unmute(self, user, mute_seconds, guild_name):
-        """Автоматическое снятие мута через указанное время"""
+    def schedule_unmute(self, user, mute_seconds, guild_name):
+        """Планирует автоматическое снятие мута"""
+        get_timer_scheduler(self.bot).schedule(
+            'mute_expire',
+            delay=mute_seconds,
+            key=f"mute:{user.guild.id}:{user.id}",
+            payload={'guild_id': user.guild.id, 'user_id': user.id, 'guild_name': guild_name},
+            persist=True
+        )
+
+    def cancel_unmute(self, user):
+        """Отменяет автоматическое снятие мута (например, при ручном размуте)"""
+        get_timer_scheduler(self.bot).cancel(f"mute:{user.guild.id}:{user.id}")
+
+    async def _auto_unmute(self, payload):
+        """Автоматическое снятие мута по таймеру"""
         try:
-            await asyncio.sleep(mute_seconds)
-            
+            guild = self.bot.get_guild(payload['guild_id'])
+            user = guild.get_member(payload['user_id']) if guild else None
+            guild_name = payload['guild_name']
+
             # Проверяем, все еще ли пользователь на сервере и замучен
-            if self.muted_role in user.roles:
+            if user and self.muted_role in user.roles:
                 await user.remove_roles(self.muted_role, reason="Автоматическое снятие мута")
 
                 # Уведомление о снятии мута
@@ -462,6 +483,7 @@ async def setup_mute_system(bot):
     try:
         mute_system = MuteSystem(bot)
         await mute_system.setup()
+        get_timer_scheduler(bot).register('mute_expire', mute_system._auto_unmute)
 
         bot.mute_system = mute_system
         logger.info("Система мутов настроена")
@@ -0,0 +1,274 @@
+"""
+Снимки прав сервера для изоляции и режима рейда
+Снимок прав ролей и переопределений каналов превращается в минимальный набор правок:
+у ролей и переопределений снимаются только те разрешения из маски, которые они выдают.
+Правки выполняются параллельно (не больше PARALLELISM запросов сразу), а снятые биты
+сохраняются на диск и возвращаются ровно туда, откуда были сняты
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import discord
+
+logger = logging.getLogger('permission_snapshot')
+
+SNAPSHOTS_FILE = "permission_snapshots.json"
+PARALLELISM = 5
+
+
+def is_exempt_role(role: discord.Role) -> bool:
+    """Роли модераторов и ботов изоляция не трогает"""
+    permissions = role.permissions
+    return role.managed or permissions.administrator or permissions.manage_messages
+
+
+def is_exempt_member(member) -> bool:
+    if not isinstance(member, discord.Member):
+        return False
+    permissions = member.guild_permissions
+    return member.bot or permissions.administrator or permissions.manage_messages
+
+
+class PermissionLock:
+    """Снятые биты прав: {id роли: биты} и {id канала: {id цели: биты разрешений}}"""
+
+    def __init__(self, name: str, mask: int, roles: Dict[int, int], channels: Dict[int, Dict[int, int]]):
+        self.name = name
+        self.mask = mask
+        self.roles = roles
+        self.channels = channels
+        self.created = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'mask': self.mask,
+            'created': self.created,
+            'roles': {str(role_id): bits for role_id, bits in self.roles.items()},
+            'channels': {str(channel_id): {str(target_id): bits for target_id, bits in targets.items()}
+                         for channel_id, targets in self.channels.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PermissionLock':
+        lock = cls(
+            data['name'],
+            data['mask'],
+            {int(role_id): bits for role_id, bits in data.get('roles', {}).items()},
+            {int(channel_id): {int(target_id): bits for target_id, bits in targets.items()}
+             for channel_id, targets in data.get('channels', {}).items()}
+        )
+        lock.created = data.get('created', lock.created)
+        return lock
+
+
+class PermissionSnapshotEngine:
+    """Снимок, минимальная разница и восстановление прав сервера"""
+
+    def __init__(self, bot, storage_file: str = SNAPSHOTS_FILE):
+        self.bot = bot
+        self.storage_file = storage_file
+        self.locks: Dict[int, Dict[str, PermissionLock]] = {}  # id сервера -> имя -> снятые права
+        self.reports: List[Dict] = []
+        self._load()
+
+    # --- Снимок и разница ---
+
+    def snapshot(self, guild: discord.Guild) -> Dict:
+        """Права всех ролей и переопределения всех каналов (кроме категорий)"""
+        return {
+            'roles': {role.id: role.permissions.value for role in guild.roles},
+            'channels': {
+                channel.id: {target.id: overwrite.pair()[0].value for target, overwrite in channel.overwrites.items()}
+                for channel in guild.channels if not isinstance(channel, discord.CategoryChannel)
+            }
+        }
+
+    def plan(self, guild: discord.Guild, name: str, mask: discord.Permissions,
+             snapshot: Optional[Dict] = None) -> PermissionLock:
+        """Какие биты маски снять: только у тех ролей и переопределений, которые их выдают"""
+        if snapshot is None:
+            snapshot = self.snapshot(guild)
+        mask_value = mask.value
+        top_position = guild.me.top_role.position if guild.me else 0
+
+        roles = {}
+        for role_id, value in snapshot['roles'].items():
+            role = guild.get_role(role_id)
+            # Роли выше роли бота изменить нельзя - не тратим на них запросы
+            if not role or is_exempt_role(role) or role.position >= top_position:
+                continue
+            if value & mask_value:
+                roles[role_id] = value & mask_value
+
+        channels = {}
+        for channel_id, targets in snapshot['channels'].items():
+            changed = {}
+            for target_id, allow in targets.items():
+                if not allow & mask_value:
+                    continue
+                role = guild.get_role(target_id)
+                if role is not None:
+                    if is_exempt_role(role):
+                        continue
+                elif is_exempt_member(guild.get_member(target_id)):
+                    continue
+                changed[target_id] = allow & mask_value
+            if changed:
+                channels[channel_id] = changed
+        return PermissionLock(name, mask_value, roles, channels)
+
+    # --- Применение ---
+
+    async def lock(self, guild: discord.Guild, name: str, mask: discord.Permissions,
+                   reason: Optional[str] = None) -> Optional[Dict]:
+        """Снимает разрешения маски; повторный вызов с тем же именем ничего не делает"""
+        guild_locks = self.locks.setdefault(guild.id, {})
+        if name in guild_locks:
+            return None
+        started = time.monotonic()
+        lock = self.plan(guild, name, mask)
+        guild_locks[name] = lock
+        self._save()
+
+        results = await self._run([
+            *(self._edit_role(guild, role_id, bits, clear=True, reason=reason) for role_id, bits in lock.roles.items()),
+            *(self._edit_channel(guild, channel_id, targets, clear=True, reason=reason)
+              for channel_id, targets in lock.channels.items())
+        ])
+        return self._report(f"lock:{name}", lock, results, started)
+
+    async def restore(self, guild: discord.Guild, name: str, reason: Optional[str] = None) -> Optional[Dict]:
+        """Возвращает ровно те биты, которые снял lock(name)"""
+        lock = self.locks.get(guild.id, {}).get(name)
+        if lock is None:
+            return None
+        started = time.monotonic()
+        results = await self._run([
+            *(self._edit_role(guild, role_id, bits, clear=False, reason=reason) for role_id, bits in lock.roles.items()),
+            *(self._edit_channel(guild, channel_id, targets, clear=False, reason=reason)
+              for channel_id, targets in lock.channels.items())
+        ])
+        del self.locks[guild.id][name]
+        self._save()
+        return self._report(f"restore:{name}", lock, results, started)
+
+    def is_locked(self, guild_id: int, name: str) -> bool:
+        return name in self.locks.get(guild_id, {})
+
+    async def _run(self, operations) -> List[Optional[bool]]:
+        semaphore = asyncio.Semaphore(PARALLELISM)
+
+        async def bounded(operation):
+            async with semaphore:
+                return await operation
+
+        return await asyncio.gather(*(bounded(operation) for operation in operations))
+
+    async def _edit_role(self, guild: discord.Guild, role_id: int, bits: int, clear: bool,
+                         reason: Optional[str]) -> Optional[bool]:
+        """Одна правка роли; None - роли больше нет или правка не нужна"""
+        role = guild.get_role(role_id)
+        if role is None:
+            return None
+        current = role.permissions.value
+        value = current & ~bits if clear else current | bits
+        if value == current:
+            return None
+        try:
+            await role.edit(permissions=discord.Permissions(value), reason=reason)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка изменения прав роли {role.name}: {e}")
+            return False
+
+    async def _edit_channel(self, guild: discord.Guild, channel_id: int, targets: Dict[int, int], clear: bool,
+                            reason: Optional[str]) -> Optional[bool]:
+        """Все переопределения канала одним запросом"""
+        channel = guild.get_channel(channel_id)
+        if channel is None:
+            return None
+        overwrites = channel.overwrites
+        changed = False
+        for target, overwrite in list(overwrites.items()):
+            bits = targets.get(target.id)
+            if not bits:
+                continue
+            allow, deny = overwrite.pair()
+            allow_value = allow.value & ~bits if clear else allow.value | bits
+            deny_value = deny.value if clear else deny.value & ~bits
+            if allow_value == allow.value and deny_value == deny.value:
+                continue
+            overwrites[target] = discord.PermissionOverwrite.from_pair(
+                discord.Permissions(allow_value), discord.Permissions(deny_value)
+            )
+            changed = True
+        if not changed:
+            return None
+        try:
+            await channel.edit(overwrites=overwrites, reason=reason)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка изменения переопределений канала {channel.name}: {e}")
+            return False
+
+    # --- Отчеты ---
+
+    def _report(self, step: str, lock: PermissionLock, results: List[Optional[bool]], started: float) -> Dict:
+        report = {
+            'step': step,
+            'roles': len(lock.roles),
+            'channels': len(lock.channels),
+            'calls': sum(1 for result in results if result is not None),
+            'failed': sum(1 for result in results if result is False),
+            'skipped': sum(1 for result in results if result is None),
+            'elapsed': time.monotonic() - started
+        }
+        self.reports = (self.reports + [report])[-10:]
+        logger.info(f"{step}: ролей {report['roles']}, каналов {report['channels']}, "
+                    f"запросов {report['calls']} (ошибок {report['failed']}) за {report['elapsed']:.1f}с")
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.increment('permission_snapshot_calls', step, report['calls'])
+        return report
+
+    # --- Сохранение ---
+
+    def _load(self):
+        if not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for guild_id, locks in data.items():
+                self.locks[int(guild_id)] = {name: PermissionLock.from_dict(item) for name, item in locks.items()}
+        except Exception as e:
+            logger.error(f"Ошибка загрузки снимков прав: {e}")
+
+    def _save(self):
+        try:
+            data = {str(guild_id): {name: lock.to_dict() for name, lock in locks.items()}
+                    for guild_id, locks in self.locks.items() if locks}
+            temp_file = f"{self.storage_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.storage_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения снимков прав: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            'active': {guild_id: list(locks) for guild_id, locks in self.locks.items() if locks},
+            'reports': list(self.reports)
+        }
+
+
+def get_permission_engine(bot) -> PermissionSnapshotEngine:
+    """Возвращает движок снимков прав бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'permission_engine'):
+        bot.permission_engine = PermissionSnapshotEngine(bot)
+    return bot.permission_engine
@@ -11,6 +11,10 @@ import json
 import os
 from datetime import datetime, timedelta
 from config import LIMONERICX_SERVER_ID
+from event_bus import PRIORITY_PROTECTION
+from message_router import setup_message_router
+from timer_scheduler import get_timer_scheduler
+from privilege_cache import get_privilege_cache, PRIV_BOT
 
 logger = logging.getLogger('ping_protection')
 
@@ -23,6 +27,7 @@ class PingProtectionSystem:
         self.violations = self.load_violations()
         self.warning_interval = 42 * 3600  # 42 часа в секундах
         self.mute_duration = 24 * 3600  # 24 часа в секундах
+        self.privileges = get_privilege_cache(bot)
 
     def load_violations(self):
         """Загрузка данных о нарушениях пинга"""
@@ -64,7 +69,7 @@ class PingProtectionSystem:
         """Проверка на пинг защищенного пользователя"""
         try:
             # Игнорируем ботов
-            if message.author.bot:
+            if self.privileges.has(message.author, PRIV_BOT):
                 return
 
             # Проверяем, не пингует ли кто-то защищенного пользователя
@@ -163,8 +168,7 @@ class PingProtectionSystem:
                 logger.info(f"Предупреждение отправлено в канал {message.channel.name} пользователю {message.author.name}")
                 
                 # Удаляем предупреждение через 30 секунд
-                import asyncio
-                asyncio.create_task(self._delete_message_later(warning_msg, 30))
+                get_timer_scheduler(self.bot).delete_message_later(warning_msg, 30)
                 
             except discord.Forbidden:
                 logger.error(f"Нет прав для отправки сообщения в канал {message.channel.name}")
@@ -301,9 +305,14 @@ class PingProtectionSystem:
             except discord.Forbidden:
                 pass  # Не можем отправить ЛС
             
-            # Создаем задачу для автоматического снятия мута
-            import asyncio
-            asyncio.create_task(self._auto_unmute_ping_violation(message.author, message.guild.name))
+            # Планируем автоматическое снятие мута (таймер переживает перезапуск бота)
+            get_timer_scheduler(self.bot).schedule(
+                'ping_mute_expire',
+                delay=self.mute_duration,
+                key=f"ping_mute:{message.guild.id}:{message.author.id}",
+                payload={'guild_id': message.guild.id, 'user_id': message.author.id, 'guild_name': message.guild.name},
+                persist=True
+            )
             
             # Обновляем счетчик нарушений
             user_id = str(message.author.id)
@@ -317,14 +326,15 @@ class PingProtectionSystem:
         except Exception as e:
             logger.error(f"Ошибка при муте за нарушение пинга: {e}")
 
-    async def _auto_unmute_ping_violation(self, user, guild_name):
-        """Автоматическое снятие мута за нарушение пинга"""
+    async def _auto_unmute_ping_violation(self, payload):
+        """Автоматическое снятие мута за нарушение пинга по таймеру"""
         try:
-            import asyncio
-            await asyncio.sleep(self.mute_duration)
-            
+            guild = self.bot.get_guild(payload['guild_id'])
+            user = guild.get_member(payload['user_id']) if guild else None
+            guild_name = payload['guild_name']
+
             # Получаем систему мутов
-            if hasattr(self.bot, 'mute_system'):
+            if user and hasattr(self.bot, 'mute_system'):
                 mute_system = self.bot.mute_system
                 
                 # Проверяем, все еще ли пользователь замучен
@@ -363,20 +373,20 @@ class PingProtectionSystem:
         except Exception as e:
             logger.error(f"Ошибка при автоматическом снятии мута за пинг: {e}")
 
-    async def _delete_message_later(self, message, delay_seconds):
-        """Удалить сообщение через указанное время"""
-        try:
-            import asyncio
-            await asyncio.sleep(delay_seconds)
-            await message.delete()
-        except:
-            pass
-
 async def setup_ping_protection(bot):
     """Настройка системы защиты от пинга"""
     try:
         ping_protection = PingProtectionSystem(bot)
         bot.ping_protection = ping_protection
+        get_timer_scheduler(bot).register('ping_mute_expire', ping_protection._auto_unmute_ping_violation)
+
+        # Маршрут срабатывает только на сообщения с упоминанием защищенного пользователя
+        setup_message_router(bot).route(
+            'ping_protection',
+            ping_protection.check_protected_ping,
+            priority=PRIORITY_PROTECTION,
+            mention_ids={ping_protection.protected_user_id}
+        )
         
         logger.info("Система защиты от пинга настроена для пользователя kobra228")
         
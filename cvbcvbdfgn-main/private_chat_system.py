@@ -9,9 +9,12 @@ from discord.ext import commands
 import logging
 from datetime import datetime
 from config import LIMONERICX_SERVER_ID
+from guild_directory import get_guild_directory
 
 logger = logging.getLogger('private_chat')
 
+PRIVATE_CHATS_CATEGORY_NAME = "🔒 Приватные чаты"
+
 class PrivateChatControlPanel(discord.ui.View):
     """Панель управления приватным чатом"""
     
@@ -353,14 +356,16 @@ class CreatePrivateChatModal(discord.ui.Modal):
             user = interaction.user
             
             # Ищем или создаем категорию для приватных чатов
-            category = discord.utils.get(guild.categories, name="🔒 Приватные чаты")
+            directory = get_guild_directory(interaction.client)
+            category = directory.category(guild, PRIVATE_CHATS_CATEGORY_NAME)
             if not category:
                 category = await guild.create_category(
-                    "🔒 Приватные чаты",
+                    PRIVATE_CHATS_CATEGORY_NAME,
                     overwrites={
                         guild.default_role: discord.PermissionOverwrite(view_channel=False)
                     }
                 )
+                directory.track(category)
             
             # Создаем канал
             channel_name = f"приватный-{self.chat_name.value.lower().replace(' ', '-')}"
@@ -438,12 +443,13 @@ class PrivateChatView(discord.ui.View):
         user = interaction.user
         
         user_channels = []
-        for channel in guild.channels:
-            if isinstance(channel, discord.TextChannel) and channel.category:
-                if channel.category.name == "🔒 Приватные чаты":
-                    permissions = channel.permissions_for(user)
-                    if permissions.manage_messages:  # Владелец имеет права на управление сообщениями
-                        user_channels.append(channel)
+        directory = get_guild_directory(interaction.client)
+        category = directory.category(guild, PRIVATE_CHATS_CATEGORY_NAME)
+        if category:
+            for channel in directory.channels_in(category, discord.TextChannel):
+                permissions = channel.permissions_for(user)
+                if permissions.manage_messages:  # Владелец имеет права на управление сообщениями
+                    user_channels.append(channel)
         
         if len(user_channels) >= 3:
             embed = discord.Embed(
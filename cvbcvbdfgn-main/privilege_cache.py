@@ -0,0 +1,158 @@
+"""
+Кэш привилегий участников для Discord бота
+Права и особые роли участника сворачиваются в одну битовую маску: администратор,
+модератор, защищенный, исключенный из восстановления сообщений, без ограничений нагрузки.
+Маски ролей считаются один раз, маска участника - при первой проверке, а сбрасываются
+они событиями изменения участника и ролей, поэтому проверка на горячем пути - O(1)
+"""
+
+import logging
+from typing import Dict, Iterable
+
+import discord
+
+from event_bus import setup_event_bus, PRIORITY_INDEX
+
+logger = logging.getLogger('privilege_cache')
+
+PRIV_ADMIN = 1 << 0  # Право администратора или владелец сервера
+PRIV_MODERATOR = 1 << 1  # Права модерации (удаление сообщений, кики, баны, тайм-ауты)
+PRIV_PROTECTED = 1 << 2  # Защищенные роли: автоматика защиты их не наказывает
+PRIV_EXEMPT = 1 << 3  # Роли без восстановления удаленных сообщений
+PRIV_BYPASS = 1 << 4  # Роли без ограничений нагрузки
+PRIV_BOT = 1 << 5
+
+PRIV_STAFF = PRIV_ADMIN | PRIV_MODERATOR
+
+MAX_CACHED_MEMBERS = 200_000
+
+
+def permission_flags(permissions: discord.Permissions) -> int:
+    """Биты, которые дают права роли"""
+    if permissions.administrator:
+        return PRIV_ADMIN | PRIV_MODERATOR
+    if (permissions.manage_messages or permissions.kick_members or permissions.ban_members
+            or permissions.moderate_members):
+        return PRIV_MODERATOR
+    return 0
+
+
+class PrivilegeCache:
+    """Маски привилегий участников всех серверов бота"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.role_flags: Dict[int, int] = {}  # Бит -> роли, которым он назначен системами бота
+        self.flag_roles: Dict[int, frozenset] = {}
+        self.roles: Dict[int, int] = {}  # id роли -> маска
+        self.members: Dict[tuple, int] = {}  # (id сервера, id участника) -> маска
+        self.stats = {'lookups': 0, 'hits': 0, 'invalidations': 0}
+
+    # --- Настройка ---
+
+    def assign_roles(self, flag: int, role_ids: Iterable[int]):
+        """Назначает бит ролям (защищенные, исключения, обход нагрузки); заменяет прежний список"""
+        self.flag_roles[flag] = frozenset(role_ids)
+        self.role_flags = {}
+        for assigned_flag, ids in self.flag_roles.items():
+            for role_id in ids:
+                self.role_flags[role_id] = self.role_flags.get(role_id, 0) | assigned_flag
+        self.clear()
+
+    # --- Проверка ---
+
+    def flags(self, member) -> int:
+        """Маска привилегий участника; у пользователя вне сервера - только бит бота"""
+        self.stats['lookups'] += 1
+        guild = getattr(member, 'guild', None)
+        if guild is None or not hasattr(member, 'roles'):
+            return PRIV_BOT if getattr(member, 'bot', False) else 0
+        key = (guild.id, member.id)
+        flags = self.members.get(key)
+        if flags is not None:
+            self.stats['hits'] += 1
+            return flags
+
+        flags = PRIV_BOT if member.bot else 0
+        if guild.owner_id == member.id:
+            flags |= PRIV_ADMIN | PRIV_MODERATOR
+        for role in member.roles:
+            role_flags = self.roles.get(role.id)
+            if role_flags is None:
+                role_flags = self.roles[role.id] = permission_flags(role.permissions) | self.role_flags.get(role.id, 0)
+            flags |= role_flags
+
+        if len(self.members) >= MAX_CACHED_MEMBERS:
+            # Самая давняя запись: словарь хранит порядок добавления
+            del self.members[next(iter(self.members))]
+        self.members[key] = flags
+        return flags
+
+    def has(self, member, flag: int) -> bool:
+        """Есть ли у участника хотя бы один из битов flag"""
+        return bool(self.flags(member) & flag)
+
+    # --- Сброс ---
+
+    def forget_member(self, guild_id: int, member_id: int):
+        if self.members.pop((guild_id, member_id), None) is not None:
+            self.stats['invalidations'] += 1
+
+    def forget_role(self, guild_id: int, role_id: int):
+        """Права роли изменились: пересчитываются роль и все участники сервера"""
+        self.roles.pop(role_id, None)
+        self.forget_guild(guild_id)
+
+    def forget_guild(self, guild_id: int):
+        stale = [key for key in self.members if key[0] == guild_id]
+        for key in stale:
+            del self.members[key]
+        self.stats['invalidations'] += len(stale)
+
+    def clear(self):
+        self.roles.clear()
+        self.members.clear()
+
+    def install_listeners(self):
+        """Сбрасывает маски раньше, чем их прочитают системы защиты"""
+        bus = setup_event_bus(self.bot)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='privilege_cache.on_member_update')
+        async def on_member_update(before, after):
+            if before.roles != after.roles:
+                self.forget_member(after.guild.id, after.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='privilege_cache.on_member_remove')
+        async def on_member_remove(member):
+            self.forget_member(member.guild.id, member.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='privilege_cache.on_guild_role_update')
+        async def on_guild_role_update(before, after):
+            if before.permissions != after.permissions:
+                self.forget_role(after.guild.id, after.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='privilege_cache.on_guild_role_delete')
+        async def on_guild_role_delete(role):
+            self.forget_role(role.guild.id, role.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='privilege_cache.on_guild_update')
+        async def on_guild_update(before, after):
+            if before.owner_id != after.owner_id:
+                self.forget_guild(after.id)
+
+        @bus.listen(priority=PRIORITY_INDEX, name='privilege_cache.on_guild_available')
+        async def on_guild_available(guild):
+            # Пока бот был отключен, события изменения ролей могли быть пропущены
+            self.clear()
+
+    def get_stats(self) -> Dict:
+        return {'members': len(self.members), 'roles': len(self.roles), **self.stats}
+
+
+def get_privilege_cache(bot) -> PrivilegeCache:
+    """Возвращает кэш привилегий бота, создавая и подписывая его при первом обращении"""
+    if not hasattr(bot, 'privilege_cache'):
+        cache = PrivilegeCache(bot)
+        bot.privilege_cache = cache
+        cache.install_listeners()
+    return bot.privilege_cache
@@ -8,6 +8,7 @@ from discord.ext import commands
 import logging
 from datetime import datetime
 from typing import Optional
+from join_burst_detector import MIN_CLUSTER_SIZE
 
 logger = logging.getLogger('protection_panel')
 
@@ -46,15 +47,9 @@ class ProtectionPanelView(discord.ui.View):
                     return
                 
                 # Активируем режим изоляции
-                protection.lockdown_mode = True
-                guild = interaction.guild
-                
-                # Отключаем сообщения для @everyone
-                everyone_role = guild.default_role
-                permissions = everyone_role.permissions
-                permissions.send_messages = False
-                permissions.add_reactions = False
-                await everyone_role.edit(permissions=permissions)
+                # Смена прав может занять больше 3 секунд на ответ: подтверждаем взаимодействие заранее
+                await interaction.response.defer()
+                reports = await protection.start_lockdown(interaction.user)
                 
                 embed = discord.Embed(
                     title="🔒 РЕЖИМ ИЗОЛЯЦИИ АКТИВИРОВАН",
@@ -81,7 +76,13 @@ class ProtectionPanelView(discord.ui.View):
                     inline=False
                 )
                 
-                await interaction.response.send_message(embed=embed)
+                embed.add_field(
+                    name="🔧 Изменения прав",
+                    value=protection.describe_permission_reports(reports),
+                    inline=False
+                )
+                
+                await interaction.followup.send(embed=embed)
                 
                 # Логируем событие
                 if hasattr(protection, 'log_security_event'):
@@ -108,7 +109,10 @@ class ProtectionPanelView(discord.ui.View):
                 color=0xff0000,
                 timestamp=datetime.utcnow()
             )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=True)
     
     @discord.ui.button(label="🔓 Разблокировка", style=discord.ButtonStyle.success, custom_id="protection_unlock")
     async def unlock_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -138,15 +142,9 @@ class ProtectionPanelView(discord.ui.View):
                     return
                 
                 # Отключаем режим изоляции
-                protection.lockdown_mode = False
-                guild = interaction.guild
-                
-                # Возвращаем права на сообщения
-                everyone_role = guild.default_role
-                permissions = everyone_role.permissions
-                permissions.send_messages = True
-                permissions.add_reactions = True
-                await everyone_role.edit(permissions=permissions)
+                # Смена прав может занять больше 3 секунд на ответ: подтверждаем взаимодействие заранее
+                await interaction.response.defer()
+                reports = await protection.end_lockdown(interaction.user)
                 
                 embed = discord.Embed(
                     title="🔓 РЕЖИМ ИЗОЛЯЦИИ ОТКЛЮЧЕН",
@@ -173,7 +171,13 @@ class ProtectionPanelView(discord.ui.View):
                     inline=False
                 )
                 
-                await interaction.response.send_message(embed=embed)
+                embed.add_field(
+                    name="🔧 Изменения прав",
+                    value=protection.describe_permission_reports(reports),
+                    inline=False
+                )
+                
+                await interaction.followup.send(embed=embed)
                 
                 # Логируем событие
                 if hasattr(protection, 'log_security_event'):
@@ -200,7 +204,10 @@ class ProtectionPanelView(discord.ui.View):
                 color=0xff0000,
                 timestamp=datetime.utcnow()
             )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=True)
     
     @discord.ui.button(label="📊 Статус", style=discord.ButtonStyle.primary, custom_id="protection_status")
     async def status_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -248,7 +255,8 @@ class ProtectionPanelView(discord.ui.View):
                 # Настройки защиты
                 embed.add_field(
                     name="⚙️ Настройки защиты",
-                    value=f"""• Максимум входов в минуту: `{protection.MAX_JOINS_PER_MINUTE}`
+                    value=f"""• Максимум входов в минуту: `{protection.FLOOD_JOINS_PER_MINUTE}`
+• Группа похожих аккаунтов: от `{MIN_CLUSTER_SIZE}` входов за час
 • Максимум сообщений в минуту: `{protection.MAX_MESSAGES_PER_MINUTE}`
 • Максимум банов в час: `{protection.MAX_BANS_PER_HOUR}` (автоотключение на 2ч)
 • Максимум киков в час: `{protection.MAX_KICKS_PER_HOUR}` (автоотключение на 1ч)
@@ -0,0 +1,282 @@
+"""
+Состояние инцидента рейда для Discord бота
+Один автомат уровней (норма → наблюдение → рейд → изоляция) управляется затухающим
+счетом угрозы от сигналов защиты. Пороги входа выше порогов выхода, а уровень держится
+минимальное время, поэтому режим не мигает. Состояние сохраняется между перезапусками,
+а права сервера меняются один раз на переход
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import discord
+
+from permission_snapshot import get_permission_engine
+from timer_scheduler import get_timer_scheduler
+
+logger = logging.getLogger('raid_incident')
+
+INCIDENT_FILE = "raid_incident_state.json"
+
+LEVEL_NORMAL = 0
+LEVEL_WATCH = 1
+LEVEL_RAID = 2
+LEVEL_LOCKDOWN = 3
+LEVEL_NAMES = {
+    LEVEL_NORMAL: "Норма",
+    LEVEL_WATCH: "Наблюдение",
+    LEVEL_RAID: "Рейд",
+    LEVEL_LOCKDOWN: "Изоляция"
+}
+
+# Разрешения, которые снимаются с обычных участников на уровнях рейда и изоляции
+RAID_PERMISSIONS = discord.Permissions(create_instant_invite=True)
+LOCKDOWN_PERMISSIONS = discord.Permissions(
+    send_messages=True,
+    add_reactions=True,
+    send_messages_in_threads=True,
+    create_public_threads=True,
+    create_private_threads=True
+)
+
+HALF_LIFE = 600  # Счет угрозы уменьшается вдвое за 10 минут без новых сигналов
+# Вход на уровень и выход с него; разрыв между порогами не дает режиму мигать
+ENTER_SCORE = {LEVEL_WATCH: 10, LEVEL_RAID: 30, LEVEL_LOCKDOWN: 90}
+EXIT_SCORE = {LEVEL_WATCH: 4, LEVEL_RAID: 12, LEVEL_LOCKDOWN: 45}
+MIN_DURATION = {LEVEL_WATCH: 120, LEVEL_RAID: 1800, LEVEL_LOCKDOWN: 900}  # Секунд на уровне до понижения
+REVIEW_INTERVAL = 60  # Как часто пересматривать уровень, пока он выше нормы
+
+# Вклад сигналов в счет угрозы
+SIGNAL_WEIGHTS = {
+    'join': 0.5,
+    'join_flood': 30,
+    'join_cluster': 35,
+    'content_cluster': 35,
+    'spam': 3,
+    'moderator_limit': 25,
+    'invite_burst': 20,
+    'nuke': 40
+}
+
+
+class RaidIncident:
+    """Автомат уровней угрозы одного сервера"""
+
+    def __init__(self, bot, guild_id: int, on_transition: Optional[Callable[..., Awaitable]] = None,
+                 storage_file: str = INCIDENT_FILE):
+        self.bot = bot
+        self.guild_id = guild_id
+        self.on_transition = on_transition
+        self.storage_file = storage_file
+        self.level = LEVEL_NORMAL
+        self.level_since = time.time()
+        self.score = 0.0
+        self.score_time = time.time()
+        self.manual_level: Optional[int] = None  # Уровень, закрепленный администратором (минимум)
+        self.saved_verification: Optional[int] = None  # Уровень верификации до рейда
+        self.last_reason = ""
+        self.last_reports = []  # Отчеты движка прав о последнем переходе
+        self._lock = asyncio.Lock()
+        self._load()
+
+        scheduler = get_timer_scheduler(bot)
+        scheduler.register('raid_incident_review', self._review)
+
+    # --- Счет угрозы ---
+
+    def current_score(self, now: Optional[float] = None) -> float:
+        """Счет угрозы с учетом затухания"""
+        if now is None:
+            now = time.time()
+        elapsed = max(0.0, now - self.score_time)
+        return self.score * 0.5 ** (elapsed / HALF_LIFE)
+
+    def _target_level(self, score: float, now: float) -> int:
+        level = self.level
+        while level < LEVEL_LOCKDOWN and score >= ENTER_SCORE[level + 1]:
+            level += 1
+        if level == self.level and now - self.level_since >= MIN_DURATION.get(level, 0):
+            while level > LEVEL_NORMAL and score < EXIT_SCORE[level]:
+                level -= 1
+        if self.manual_level is not None:
+            level = max(level, self.manual_level)
+        return level
+
+    async def signal(self, kind: str, weight: Optional[float] = None, reason: str = "") -> int:
+        """Добавляет сигнал угрозы и возвращает уровень после него"""
+        now = time.time()
+        self.score = self.current_score(now) + (SIGNAL_WEIGHTS.get(kind, 0) if weight is None else weight)
+        self.score_time = now
+        if hasattr(self.bot, 'metrics'):
+            self.bot.metrics.increment('raid_signals', kind)
+        if self._target_level(self.score, now) != self.level:
+            await self._evaluate(reason or kind)
+        return self.level
+
+    # --- Ручное управление ---
+
+    async def set_manual(self, level: int, actor=None):
+        """Закрепляет уровень не ниже level до снятия администратором"""
+        self.manual_level = level
+        async with self._lock:
+            now = time.time()
+            await self._transition(self._target_level(self.current_score(now), now),
+                                   f"вручную: {actor}" if actor else "вручную", notify=False)
+
+    async def release_manual(self, actor=None, below: int = LEVEL_LOCKDOWN):
+        """Снимает закрепление и опускает уровень ниже below без ожидания"""
+        self.manual_level = None
+        now = time.time()
+        # Счет ограничивается порогом выхода: для повторного подъема нужны новые сигналы
+        self.score = min(self.current_score(now), EXIT_SCORE[below])
+        self.score_time = now
+        level = min(self.level, below - 1)
+        while level > LEVEL_NORMAL and self.score < EXIT_SCORE[level]:
+            level -= 1
+        async with self._lock:
+            await self._transition(level, f"вручную: {actor}" if actor else "вручную", notify=False)
+
+    # --- Переходы ---
+
+    async def _evaluate(self, reason: str):
+        async with self._lock:
+            now = time.time()
+            await self._transition(self._target_level(self.current_score(now), now), reason)
+
+    async def _transition(self, new_level: int, reason: str, notify: bool = True):
+        """Переводит сервер на новый уровень; вызывается под блокировкой.
+
+        Ручные переходы не уведомляют: команда сама пишет в лог, кто и что сделал.
+        """
+        old_level = self.level
+        self.last_reports = []
+        if new_level != old_level:
+            self.level = new_level
+            self.level_since = time.time()
+            self.last_reason = reason
+            logger.info(f"Уровень угрозы: {LEVEL_NAMES[old_level]} → {LEVEL_NAMES[new_level]} ({reason})")
+            await self._apply_guild_state(old_level, new_level)
+            if hasattr(self.bot, 'metrics'):
+                self.bot.metrics.increment('raid_incident_transitions', f"{old_level}->{new_level}")
+        self._schedule_review()
+        self._save()
+        if new_level != old_level and notify and self.on_transition:
+            try:
+                await self.on_transition(old_level, new_level, reason)
+            except Exception as e:
+                logger.error(f"Ошибка уведомления о смене уровня угрозы: {e}")
+
+    async def _apply_guild_state(self, old_level: int, new_level: int):
+        """Меняет только то, что отличается между уровнями: верификацию и снимки прав рейда и изоляции"""
+        guild = self.bot.get_guild(self.guild_id)
+        if not guild:
+            return
+
+        raid_changed = (old_level >= LEVEL_RAID) != (new_level >= LEVEL_RAID)
+        lockdown_changed = (old_level >= LEVEL_LOCKDOWN) != (new_level >= LEVEL_LOCKDOWN)
+        reason = f"Уровень угрозы: {LEVEL_NAMES[new_level]}"
+
+        try:
+            if raid_changed:
+                if new_level >= LEVEL_RAID:
+                    self.saved_verification = guild.verification_level.value
+                    verification = max(guild.verification_level, discord.VerificationLevel.high,
+                                       key=lambda item: item.value)
+                else:
+                    previous = self.saved_verification
+                    verification = (discord.VerificationLevel(previous) if previous is not None
+                                    else discord.VerificationLevel.medium)
+                    self.saved_verification = None
+                if guild.verification_level != verification:
+                    await guild.edit(verification_level=verification, reason=reason)
+        except Exception as e:
+            logger.error(f"Ошибка изменения уровня верификации: {e}")
+
+        # Снятые права возвращаются в обратном порядке: сначала изоляция, потом рейд
+        engine = get_permission_engine(self.bot)
+        reports = []
+        try:
+            if lockdown_changed and new_level < LEVEL_LOCKDOWN:
+                reports.append(await engine.restore(guild, 'lockdown', reason=reason))
+            if raid_changed and new_level < LEVEL_RAID:
+                reports.append(await engine.restore(guild, 'raid', reason=reason))
+            if raid_changed and new_level >= LEVEL_RAID:
+                # Запрещаем создавать приглашения всем, кроме модераторов
+                reports.append(await engine.lock(guild, 'raid', RAID_PERMISSIONS, reason=reason))
+            if lockdown_changed and new_level >= LEVEL_LOCKDOWN:
+                # Только модераторы могут писать сообщения
+                reports.append(await engine.lock(guild, 'lockdown', LOCKDOWN_PERMISSIONS, reason=reason))
+        except Exception as e:
+            logger.error(f"Ошибка изменения прав сервера: {e}")
+        self.last_reports = [report for report in reports if report]
+
+    def _schedule_review(self):
+        scheduler = get_timer_scheduler(self.bot)
+        key = f"raid_incident:{self.guild_id}"
+        if self.level > LEVEL_NORMAL:
+            scheduler.schedule('raid_incident_review', delay=REVIEW_INTERVAL, key=key,
+                               payload={'guild_id': self.guild_id}, persist=True)
+        else:
+            scheduler.cancel(key)
+
+    async def _review(self, payload):
+        """Пересмотр уровня по таймеру: затухший счет понижает уровень"""
+        await self._evaluate("затухание угрозы")
+
+    # --- Сохранение ---
+
+    def _load(self):
+        if not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f).get(str(self.guild_id))
+            if not data:
+                return
+            self.level = data.get('level', LEVEL_NORMAL)
+            self.level_since = data.get('level_since', self.level_since)
+            self.score = data.get('score', 0.0)
+            self.score_time = data.get('score_time', self.score_time)
+            self.manual_level = data.get('manual_level')
+            self.saved_verification = data.get('saved_verification')
+            self.last_reason = data.get('last_reason', "")
+            if self.level > LEVEL_NORMAL:
+                logger.info(f"Восстановлен уровень угрозы: {LEVEL_NAMES[self.level]}")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки состояния инцидента: {e}")
+
+    def _save(self):
+        try:
+            data = {}
+            if os.path.exists(self.storage_file):
+                with open(self.storage_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            data[str(self.guild_id)] = {
+                'level': self.level,
+                'level_since': self.level_since,
+                'score': self.score,
+                'score_time': self.score_time,
+                'manual_level': self.manual_level,
+                'saved_verification': self.saved_verification,
+                'last_reason': self.last_reason
+            }
+            temp_file = f"{self.storage_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_file, self.storage_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния инцидента: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            'level': self.level,
+            'level_name': LEVEL_NAMES[self.level],
+            'score': round(self.current_score(), 1),
+            'since': self.level_since,
+            'manual': self.manual_level is not None,
+            'reason': self.last_reason
+        }
@@ -7,12 +7,42 @@ import discord
 from discord.ext import commands, tasks
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from collections import defaultdict, deque
+import re
+from datetime import datetime
+from typing import Dict
 from config import LIMONERICX_SERVER_ID
+from event_bus import setup_event_bus, PRIORITY_PROTECTION
+from timer_scheduler import get_timer_scheduler
+from log_sink import get_log_sink, LANE_SECURITY
+from audit_log_resolver import setup_audit_log_resolver
+from guild_directory import get_guild_directory
+from sliding_counter import SlidingWindowCounter, SlidingCounterMap
+from join_burst_detector import JoinBurstDetector
+from content_fingerprint import ContentFingerprintIndex
+from raid_incident import RaidIncident, LEVEL_NAMES, LEVEL_RAID, LEVEL_LOCKDOWN
+from mitigation_executor import (get_mitigation_executor, ACTIONS, ACTION_BAN, ACTION_KICK, ACTION_TIMEOUT,
+                                 ACTION_QUARANTINE)
+from moderator_action_store import get_moderator_action_store
+from privilege_cache import get_privilege_cache, PRIV_ADMIN, PRIV_BOT, PRIV_PROTECTED, PRIV_STAFF
+from invite_tracker import get_invite_tracker, BURST_WINDOW
+from anti_nuke import get_anti_nuke, WINDOW as ANTI_NUKE_WINDOW
 
 logger = logging.getLogger('raid_protection')
 
+# Части имени канала для логов безопасности
+SECURITY_LOG_KEYWORDS = ('security', 'безопасность', 'logs', 'логи')
+
+# Ограничение памяти счетчиков активности
+MAX_TRACKED_USERS = 100_000
+
+# Массовое действие по списку ID учитывается за вызвавшим: (тип лимита модератора, вид действия anti-nuke)
+MITIGATION_CHARGES = {
+    ACTION_BAN: ('bans', 'ban'),
+    ACTION_KICK: ('kicks', 'kick'),
+    ACTION_TIMEOUT: ('mutes', 'timeout'),
+    ACTION_QUARANTINE: ('mutes', 'timeout')
+}
+
 class RaidProtection:
     def __init__(self, bot):
         self.bot = bot
@@ -20,60 +50,68 @@ class RaidProtection:
         
         # Настройки защиты
         self.MAX_JOINS_PER_MINUTE = 10  # Максимум входов в минуту
+        self.FLOOD_JOINS_PER_MINUTE = self.MAX_JOINS_PER_MINUTE * 3  # Поток, при котором рейд включается без анализа аккаунтов
         self.MAX_MESSAGES_PER_MINUTE = 20  # Максимум сообщений в минуту от одного пользователя
         self.MAX_BANS_PER_HOUR = 5  # Максимум банов в час от модератора
         self.MAX_KICKS_PER_HOUR = 10  # Максимум киков в час
         self.MAX_MUTES_PER_HOUR = 15  # Максимум мутов в час
         self.MAX_CHANNEL_DELETIONS_PER_HOUR = 3  # Максимум удалений каналов в час
         
-        # Хранение активности
-        self.join_times = deque()
-        self.user_messages = defaultdict(lambda: deque())
-        self.moderator_actions = defaultdict(lambda: {
-            'bans': deque(),
-            'kicks': deque(), 
-            'mutes': deque(),
-            'channel_deletions': deque()
-        })
-        
-        # Статусы рейда
-        self.raid_mode = False
-        self.lockdown_mode = False
+        # Хранение активности: счетчики в скользящем окне с ограниченной памятью
+        self.join_counter = SlidingWindowCounter(60, resolution=1)
+        self.hourly_joins = SlidingWindowCounter(3600, resolution=60)
+        self.join_detector = JoinBurstDetector()
+        self.last_join_cluster = None  # Последний обнаруженный кластер - цель для !raid_mitigate
+        self.content_index = ContentFingerprintIndex()
+        self.last_content_cluster = None
+        # Через какое приглашение пришел рейд; поток через одно приглашение приостанавливает только его
+        self.invite_tracker = get_invite_tracker(bot)
+        self.invite_tracker.on_burst = self.handle_invite_burst
+        # Разрушительные действия одного исполнителя сдерживаются сразу, не дожидаясь часовых лимитов
+        self.anti_nuke = get_anti_nuke(bot)
+        self.anti_nuke.on_contained = self.handle_nuke_contained
+        self.user_messages = SlidingCounterMap(60, resolution=1, max_keys=MAX_TRACKED_USERS, typecode='H')
+        # Действия модераторов хранятся в SQLite и переживают перезапуск
+        self.moderator_actions = get_moderator_action_store(bot)
+        
+        # Уровень угрозы (норма, наблюдение, рейд, изоляция) с сохранением между перезапусками
+        self.incident = RaidIncident(bot, self.guild_id, on_transition=self._on_incident_transition)
         
         # Защищенные роли (не могут быть забанены автоматически)
         self.protected_roles = [
             1375794448650342521,  # Роль из конфига
             # Добавьте другие важные роли
         ]
+        self.privileges = get_privilege_cache(bot)
+        self.privileges.assign_roles(PRIV_PROTECTED, self.protected_roles)
         
         # Канал для логов безопасности
-        self.security_log_channel_id = None  # Будет найден автоматически
+        self.security_log_channel_id = None  # Если не задан, канал ищется по SECURITY_LOG_KEYWORDS
         
         self.cleanup_task.start()
+        
+        # Отложенные действия выполняет общий планировщик
+        scheduler = get_timer_scheduler(bot)
+        scheduler.register('raid_spam_unmute', self._expire_spam_mute)
+        scheduler.register('moderator_role_restore', self._restore_moderator_role)
+    
+    @property
+    def raid_mode(self) -> bool:
+        return self.incident.level >= LEVEL_RAID
+    
+    @property
+    def lockdown_mode(self) -> bool:
+        return self.incident.level >= LEVEL_LOCKDOWN
     
     def cleanup_old_data(self):
         """Очистка старых данных для экономии памяти"""
-        now = datetime.now()
-        cutoff_time = now - timedelta(hours=1)
-        
-        # Очистка времен входа
-        while self.join_times and self.join_times[0] < cutoff_time:
-            self.join_times.popleft()
-        
-        # Очистка сообщений пользователей
-        for user_id in list(self.user_messages.keys()):
-            messages = self.user_messages[user_id]
-            while messages and messages[0] < cutoff_time:
-                messages.popleft()
-            if not messages:
-                del self.user_messages[user_id]
-        
-        # Очистка действий модераторов
-        for mod_id in list(self.moderator_actions.keys()):
-            actions = self.moderator_actions[mod_id]
-            for action_type in actions:
-                while actions[action_type] and actions[action_type][0] < cutoff_time:
-                    actions[action_type].popleft()
+        # Счетчики сами удаляют неактивные ключи при добавлении; здесь добираем оставшиеся
+        self.user_messages.prune()
+        self.moderator_actions.prune()
+    
+    def get_moderator_action_counts(self, window: int = 3600) -> Dict[int, Dict[str, int]]:
+        """Действия модераторов за window секунд: {id модератора: {тип действия: количество}}"""
+        return self.moderator_actions.counts(self.guild_id, window)
     
     @tasks.loop(minutes=10)
     async def cleanup_task(self):
@@ -82,16 +120,14 @@ class RaidProtection:
     
     async def get_security_log_channel(self):
         """Получить канал для логов безопасности"""
-        if not self.security_log_channel_id:
-            guild = self.bot.get_guild(self.guild_id)
-            if guild:
-                # Ищем канал с именем "security" или "безопасность"
-                for channel in guild.channels:
-                    if any(word in channel.name.lower() for word in ['security', 'безопасность', 'logs', 'логи']):
-                        self.security_log_channel_id = channel.id
-                        break
-        
-        return self.bot.get_channel(self.security_log_channel_id) if self.security_log_channel_id else None
+        if self.security_log_channel_id:
+            return self.bot.get_channel(self.security_log_channel_id)
+
+        guild = self.bot.get_guild(self.guild_id)
+        if not guild:
+            return None
+        # Ищем канал с именем "security" или "безопасность"; справочник запоминает и отсутствие канала
+        return get_guild_directory(self.bot).find_channel(guild, SECURITY_LOG_KEYWORDS, discord.TextChannel)
     
     async def log_security_event(self, title, description, color=0xff0000, fields=None):
         """Логирование событий безопасности"""
@@ -116,118 +152,235 @@ class RaidProtection:
                         inline=field.get('inline', False)
                     )
             
-            await channel.send(embed=embed)
+            # Полоса безопасности обгоняет накопившиеся логи активности
+            get_log_sink(self.bot).submit(channel, embed, LANE_SECURITY)
             
         except Exception as e:
             logger.error(f"Ошибка при логировании события безопасности: {e}")
     
     async def check_raid_joins(self, member):
         """Проверка на рейд по входам"""
-        now = datetime.now()
-        self.join_times.append(now)
-        
+        self.hourly_joins.add()
         # Подсчет входов за последнюю минуту
-        cutoff = now - timedelta(minutes=1)
-        recent_joins = sum(1 for join_time in self.join_times if join_time > cutoff)
+        recent_joins = self.join_counter.add()
+        await self.incident.signal('join')
+        
+        # Кластер похожих аккаунтов ловит и медленный поток альтов, и быстрый рейд
+        cluster = self.join_detector.observe(
+            member.id,
+            member.name,
+            member.created_at.timestamp(),
+            member.avatar is None
+        )
+        if cluster:
+            await self.handle_join_cluster(cluster)
+            return
         
-        if recent_joins > self.MAX_JOINS_PER_MINUTE and not self.raid_mode:
-            await self.enable_raid_mode()
+        # Одного числа входов мало: компания друзей дает всплеск, но не похожие аккаунты
+        if recent_joins > self.FLOOD_JOINS_PER_MINUTE and not self.raid_mode:
+            await self.incident.signal('join_flood', reason=f"{recent_joins} входов за минуту")
             await self.log_security_event(
                 "ОБНАРУЖЕН РЕЙД",
                 f"Обнаружено {recent_joins} входов за последнюю минуту. Активирован режим защиты от рейда.",
                 color=0xff0000,
                 fields=[
                     {"name": "Входов за минуту", "value": str(recent_joins), "inline": True},
-                    {"name": "Лимит", "value": str(self.MAX_JOINS_PER_MINUTE), "inline": True}
+                    {"name": "Лимит", "value": str(self.FLOOD_JOINS_PER_MINUTE), "inline": True}
                 ]
             )
     
-    async def enable_raid_mode(self):
-        """Включить режим защиты от рейда"""
-        if self.raid_mode:
-            return
-        
-        self.raid_mode = True
-        guild = self.bot.get_guild(self.guild_id)
+    async def handle_join_cluster(self, cluster):
+        """Реакция на кластер похожих входов: режим рейда и список участников кластера"""
+        was_active = self.raid_mode
+        self.last_join_cluster = cluster
+        await self.incident.signal('join_cluster', reason=f"кластер из {cluster.size} похожих входов")
+        
+        mentions = [f"<@{record.member_id}>" for record in cluster.members]
+        members_text = ", ".join(mentions[:40])
+        if len(mentions) > 40:
+            members_text += f" и еще {cluster.size - 40}"
+        duration = (cluster.last_join - cluster.first_join) / 60
         
-        if guild:
-            try:
-                # Повышаем уровень верификации
-                await guild.edit(verification_level=discord.VerificationLevel.high)
-                
-                # Отключаем возможность добавления участников для @everyone
-                everyone_role = guild.default_role
-                permissions = everyone_role.permissions
-                permissions.create_instant_invite = False
-                await everyone_role.edit(permissions=permissions)
-                
-                logger.info("Режим защиты от рейда активирован")
-                
-                # Автоматическое отключение через 30 минут
-                await asyncio.sleep(1800)  # 30 минут
-                await self.disable_raid_mode()
-                
-            except Exception as e:
-                logger.error(f"Ошибка при активации режима рейда: {e}")
+        await self.log_security_event(
+            "ОБНАРУЖЕНА ГРУППА ПОХОЖИХ АККАУНТОВ",
+            f"За {duration:.0f} мин. зашли {cluster.size} похожих аккаунтов."
+            + ("" if was_active or not self.raid_mode else " Активирован режим защиты от рейда."),
+            color=0xff0000,
+            fields=[
+                {"name": "Размер кластера", "value": str(cluster.size), "inline": True},
+                {"name": "Подозрительность", "value": f"{cluster.suspicion:.2f}", "inline": True},
+                {"name": "Сходство", "value": f"{cluster.cohesion:.2f}", "inline": True},
+                {"name": "Общие признаки", "value": cluster.describe(), "inline": False},
+                {"name": "Приглашения", "value": self.invite_tracker.summarize(
+                    self.guild_id, [record.member_id for record in cluster.records])[:1024] or "Нет данных",
+                 "inline": False},
+                {"name": "Участники", "value": members_text[:1024], "inline": False},
+                {"name": "Действия", "value": "`!raid_mitigate <ban|kick|timeout|quarantine> cluster`", "inline": False}
+            ]
+        )
     
-    async def disable_raid_mode(self):
-        """Отключить режим защиты от рейда"""
-        if not self.raid_mode:
-            return
-        
-        self.raid_mode = False
-        guild = self.bot.get_guild(self.guild_id)
+    def filter_mitigation_targets(self, guild, member_ids):
+        """Убирает из списка на массовое действие ботов, персонал и участников с защищенными ролями"""
+        targets = []
+        for member_id in member_ids:
+            member = guild.get_member(member_id)
+            if member and self.privileges.has(member, PRIV_BOT | PRIV_STAFF | PRIV_PROTECTED):
+                continue
+            targets.append(member_id)
+        return targets
+    
+    async def charge_mitigation(self, moderator, action, count, explicit):
+        """Записывает массовое действие бота за вызвавшим модератором; False - выполнять нельзя.
+        
+        Цели из кластера выбрал детектор, поэтому они только попадают в журнал. Список ID
+        выбрал сам модератор: он проходит те же лимиты и anti-nuke, что и ручные действия.
+        """
+        if not explicit:
+            for _ in range(count):
+                self.moderator_actions.record(self.guild_id, moderator.id, 'raid_mitigation')
+            return True
+        action_type, kind = MITIGATION_CHARGES[action]
+        if await self.check_moderator_actions(moderator, action_type, count):
+            return False
+        await self.anti_nuke.observe_action(moderator.guild, moderator.id, kind, count)
+        return not self.anti_nuke.is_contained(moderator.guild.id, moderator.id)
+    
+    async def start_lockdown(self, actor):
+        """Изоляция по команде администратора: уровень закрепляется до снятия"""
+        await self.incident.set_manual(LEVEL_LOCKDOWN, actor)
+        return self.incident.last_reports
+    
+    async def end_lockdown(self, actor):
+        """Снятие изоляции; режим рейда остается, пока счет угрозы не затухнет"""
+        await self.incident.release_manual(actor)
+        return self.incident.last_reports
+    
+    @staticmethod
+    def describe_permission_reports(reports) -> str:
+        """Сколько ролей, каналов и запросов потребовал каждый шаг изменения прав"""
+        lines = [
+            f"`{report['step']}`: ролей {report['roles']}, каналов {report['channels']}, "
+            f"запросов {report['calls']}" + (f", ошибок {report['failed']}" if report['failed'] else "")
+            for report in reports
+        ]
+        return "\n".join(lines) or "Права не изменялись"
+    
+    async def _on_incident_transition(self, old_level, new_level, reason):
+        """Сообщение о смене уровня угрозы в лог безопасности"""
+        if new_level > old_level:
+            if new_level < LEVEL_RAID:
+                return
+            title, color = f"УРОВЕНЬ УГРОЗЫ ПОВЫШЕН: {LEVEL_NAMES[new_level].upper()}", 0xff0000
+        else:
+            if old_level < LEVEL_RAID:
+                return
+            title, color = f"УРОВЕНЬ УГРОЗЫ СНИЖЕН: {LEVEL_NAMES[new_level].upper()}", 0x00ff00
         
-        if guild:
-            try:
-                # Возвращаем обычный уровень верификации
-                await guild.edit(verification_level=discord.VerificationLevel.medium)
-                
-                # Возвращаем права на приглашения
-                everyone_role = guild.default_role
-                permissions = everyone_role.permissions
-                permissions.create_instant_invite = True
-                await everyone_role.edit(permissions=permissions)
-                
-                await self.log_security_event(
-                    "РЕЖИМ РЕЙДА ОТКЛЮЧЕН",
-                    "Режим защиты от рейда автоматически отключен.",
-                    color=0x00ff00
-                )
-                
-                logger.info("Режим защиты от рейда отключен")
-                
-            except Exception as e:
-                logger.error(f"Ошибка при отключении режима рейда: {e}")
+        await self.log_security_event(
+            title,
+            f"{LEVEL_NAMES[old_level]} → {LEVEL_NAMES[new_level]}. Причина: {reason}.",
+            color=color,
+            fields=[
+                {"name": "Счет угрозы", "value": f"{self.incident.current_score():.1f}", "inline": True}
+            ]
+        )
     
     async def check_message_spam(self, message):
         """Проверка на спам сообщениями"""
         if message.author.bot:
             return
         
-        now = datetime.now()
-        user_id = message.author.id
-        
-        self.user_messages[user_id].append(now)
-        
         # Подсчет сообщений за последнюю минуту
-        cutoff = now - timedelta(minutes=1)
-        recent_messages = sum(1 for msg_time in self.user_messages[user_id] if msg_time > cutoff)
+        recent_messages = self.user_messages.add(message.author.id)
         
         if recent_messages > self.MAX_MESSAGES_PER_MINUTE:
             await self.handle_spam_user(message.author, recent_messages)
+        
+        # Один и тот же текст или приглашение от многих аккаунтов - по паре сообщений с каждого
+        if message.content and not self.privileges.has(message.author, PRIV_PROTECTED):
+            cluster = self.content_index.observe(message.author.id, message.content)
+            if cluster:
+                await self.handle_content_cluster(cluster)
+    
+    async def handle_invite_burst(self, guild, code, uses, paused):
+        """Поток входов через одно приглашение: оно приостанавливается, сервер остается открытым"""
+        await self.incident.signal('invite_burst', reason=f"{uses} входов по приглашению {code}")
+        await self.log_security_event(
+            "ПОТОК ВХОДОВ ПО ПРИГЛАШЕНИЮ",
+            f"За {BURST_WINDOW} с по приглашению `{code}` зашли {uses} участников. "
+            + ("Приглашение приостановлено." if paused else "Приостановить приглашение не удалось."),
+            color=0xff6600,
+            fields=[
+                {"name": "Приглашение", "value": code, "inline": True},
+                {"name": "Входов", "value": str(uses), "inline": True},
+                {"name": "Действия", "value": f"`!invite_resume {code}` - вернуть приглашение", "inline": False}
+            ]
+        )
+    
+    async def handle_nuke_contained(self, guild, actor_id, report):
+        """Отчет о сдерживании исполнителя разрушительных действий"""
+        if guild.id != self.guild_id:
+            return
+        await self.incident.signal('nuke', reason=f"разрушительные действия <@{actor_id}>")
+        
+        actions_text = ", ".join(f"{kind}: {count}" for kind, count in report['actions'].items())
+        stripped_text = ", ".join(f"<@&{role_id}>" for role_id in report['stripped']) or "Нет"
+        total = report['time_to_contain']
+        await self.log_security_event(
+            "ЗАХВАТ АККАУНТА СДЕРЖАН",
+            f"<@{actor_id}> выполнил разрушительные действия за {ANTI_NUKE_WINDOW} с: {report['outcome']}.",
+            color=0xff0000,
+            fields=[
+                {"name": "Исполнитель", "value": f"<@{actor_id}> ({actor_id})", "inline": True},
+                {"name": "Очки окна", "value": str(report['score']), "inline": True},
+                {"name": "Действия", "value": actions_text[:1024] or "Нет", "inline": False},
+                {"name": "Снятые роли", "value": stripped_text[:1024], "inline": False},
+                {"name": "Реакция бота", "value": f"{report['reaction'] * 1000:.0f} мс", "inline": True},
+                {"name": "От первого действия", "value": f"{total:.1f} с" if total is not None else "Нет данных",
+                 "inline": True},
+                {"name": "Возврат", "value": f"`!antinuke_restore {actor_id}` - вернуть роли", "inline": False}
+            ]
+        )
+    
+    async def handle_content_cluster(self, cluster):
+        """Реакция на одинаковый контент от разных авторов: режим рейда и список авторов"""
+        was_active = self.raid_mode
+        self.last_content_cluster = cluster
+        await self.incident.signal('content_cluster', reason=f"одинаковый контент от {cluster.author_count} авторов")
+        
+        mentions = [f"<@{author_id}>" for author_id in cluster.authors]
+        authors_text = ", ".join(mentions[:40])
+        if len(mentions) > 40:
+            authors_text += f" и еще {cluster.author_count - 40}"
+        kind = "приглашение" if cluster.kind == 'invite' else "текст"
+        
+        await self.log_security_event(
+            "ОБНАРУЖЕН МАССОВЫЙ ОДИНАКОВЫЙ КОНТЕНТ",
+            f"{cluster.author_count} разных аккаунтов отправили одинаковый {kind} "
+            f"за {cluster.last_seen - cluster.first_seen:.0f} с."
+            + ("" if was_active or not self.raid_mode else " Активирован режим защиты от рейда."),
+            color=0xff0000,
+            fields=[
+                {"name": "Авторов", "value": str(cluster.author_count), "inline": True},
+                {"name": "Сообщений", "value": str(cluster.messages), "inline": True},
+                {"name": "Пример", "value": cluster.sample[:1024] or "Нет текста", "inline": False},
+                {"name": "Авторы", "value": authors_text[:1024], "inline": False},
+                {"name": "Действия", "value": "`!raid_mitigate <ban|kick|timeout|quarantine> content`", "inline": False}
+            ]
+        )
     
     async def handle_spam_user(self, user, message_count):
         """Обработка пользователя-спамера"""
         try:
             # Проверяем, не является ли пользователь защищенным
-            if any(role.id in self.protected_roles for role in user.roles):
+            if self.privileges.has(user, PRIV_PROTECTED):
                 return
             
             # Мут на 10 минут
-            mute_role = discord.utils.get(user.guild.roles, name="Muted")
+            mute_role = get_guild_directory(self.bot).role(user.guild, "Muted")
             if mute_role:
                 await user.add_roles(mute_role, reason="Автоматический мут за спам")
+                await self.incident.signal('spam', reason=f"спам от {user}")
                 
                 await self.log_security_event(
                     "ПОЛЬЗОВАТЕЛЬ ЗАМУЧЕН ЗА СПАМ",
@@ -241,33 +394,52 @@ class RaidProtection:
                 )
                 
                 # Автоматическое снятие мута через 10 минут
-                await asyncio.sleep(600)
-                try:
-                    await user.remove_roles(mute_role, reason="Автоматическое снятие мута")
-                except:
-                    pass
+                get_timer_scheduler(self.bot).schedule(
+                    'raid_spam_unmute',
+                    delay=600,
+                    key=f"raid_spam_mute:{user.guild.id}:{user.id}",
+                    payload={'guild_id': user.guild.id, 'user_id': user.id, 'role_id': mute_role.id},
+                    persist=True
+                )
                     
         except Exception as e:
             logger.error(f"Ошибка при муте спамера: {e}")
     
-    async def check_moderator_actions(self, moderator, action_type):
-        """Проверка на превышение лимитов модераторских действий"""
-        now = datetime.now()
+    async def _expire_spam_mute(self, payload):
+        """Снятие мута за спам по таймеру"""
+        guild = self.bot.get_guild(payload['guild_id'])
+        if not guild:
+            return
+        member = guild.get_member(payload['user_id'])
+        mute_role = guild.get_role(payload['role_id'])
+        if member and mute_role and mute_role in member.roles:
+            try:
+                await member.remove_roles(mute_role, reason="Автоматическое снятие мута")
+            except:
+                pass
+    
+    async def check_moderator_actions(self, moderator, action_type, count=1):
+        """Проверка на превышение лимитов модераторских действий; True - лимит превышен"""
         mod_id = moderator.id
         
+        # Массовые меры бота уже учтены за вызвавшим модератором (charge_mitigation)
+        if self.bot.user and mod_id == self.bot.user.id:
+            return False
+        
+        # В журнал попадают и действия администраторов - для статистики
+        for _ in range(count):
+            self.moderator_actions.record(self.guild_id, mod_id, action_type)
+        
         # Проверяем, является ли модератор администратором
         guild = self.bot.get_guild(self.guild_id)
         if guild:
             member = guild.get_member(mod_id)
-            if member and member.guild_permissions.administrator:
+            if member and self.privileges.has(member, PRIV_ADMIN):
                 # Администраторы не ограничены
-                return
+                return False
         
-        self.moderator_actions[mod_id][action_type].append(now)
-        
-        # Подсчет действий за последний час
-        cutoff = now - timedelta(hours=1)
-        recent_actions = sum(1 for action_time in self.moderator_actions[mod_id][action_type] if action_time > cutoff)
+        # Подсчет действий за последний час (включая сделанные до перезапуска)
+        recent_actions = self.moderator_actions.count(self.guild_id, mod_id, action_type, 3600)
         
         limits = {
             'bans': self.MAX_BANS_PER_HOUR,
@@ -291,8 +463,13 @@ class RaidProtection:
                 ]
             )
             
+            # Массовые действия модератора - признак захвата аккаунта
+            await self.incident.signal('moderator_limit', reason=f"лимит '{action_type}' у {moderator}")
+            
             # Автоматические действия при превышении лимитов
             await self.handle_moderator_limit_exceeded(moderator, action_type, recent_actions, current_limit)
+            return True
+        return False
     
     async def handle_moderator_limit_exceeded(self, moderator, action_type, actions_count, limit):
         """Обработка превышения лимитов модератора"""
@@ -344,20 +521,42 @@ class RaidProtection:
                 await member.remove_roles(mod_role, reason=f"Превышение лимита {action_type}")
                 
                 # Запланируем возврат роли через указанное время
-                await asyncio.sleep(hours * 3600)  # Конвертируем часы в секунды
-                
-                # Возвращаем роль
-                await member.add_roles(mod_role, reason=f"Автоматическое восстановление после превышения лимита {action_type}")
-                
-                await self.log_security_event(
-                    "ПРАВА МОДЕРАТОРА ВОССТАНОВЛЕНЫ",
-                    f"Права модератора {member.mention} восстановлены после превышения лимита {action_type}.",
-                    color=0x00ff00
+                get_timer_scheduler(self.bot).schedule(
+                    'moderator_role_restore',
+                    delay=hours * 3600,  # Конвертируем часы в секунды
+                    key=f"moderator_restore:{member.guild.id}:{member.id}:{mod_role.id}",
+                    payload={'guild_id': member.guild.id, 'user_id': member.id,
+                             'role_id': mod_role.id, 'action_type': action_type},
+                    persist=True
                 )
                 
         except Exception as e:
             logger.error(f"Ошибка при временном отключении модератора: {e}")
     
+    async def _restore_moderator_role(self, payload):
+        """Возврат роли модератора по таймеру"""
+        try:
+            guild = self.bot.get_guild(payload['guild_id'])
+            if not guild:
+                return
+            member = guild.get_member(payload['user_id'])
+            mod_role = guild.get_role(payload['role_id'])
+            if not member or not mod_role:
+                return
+            action_type = payload['action_type']
+            
+            # Возвращаем роль
+            await member.add_roles(mod_role, reason=f"Автоматическое восстановление после превышения лимита {action_type}")
+            
+            await self.log_security_event(
+                "ПРАВА МОДЕРАТОРА ВОССТАНОВЛЕНЫ",
+                f"Права модератора {member.mention} восстановлены после превышения лимита {action_type}.",
+                color=0x00ff00
+            )
+            
+        except Exception as e:
+            logger.error(f"Ошибка при восстановлении прав модератора: {e}")
+    
     async def warn_moderator(self, member, action_type):
         """Отправляет предупреждение модератору"""
         try:
@@ -489,21 +688,14 @@ class RaidProtectionCommands(commands.Cog):
             await ctx.send("❌ Режим изоляции уже активен!")
             return
         
-        self.protection.lockdown_mode = True
-        guild = ctx.guild
-        
-        # Отключаем сообщения для @everyone
-        everyone_role = guild.default_role
-        permissions = everyone_role.permissions
-        permissions.send_messages = False
-        permissions.add_reactions = False
-        await everyone_role.edit(permissions=permissions)
+        reports = await self.protection.start_lockdown(ctx.author)
         
         embed = discord.Embed(
             title="🔒 РЕЖИМ ИЗОЛЯЦИИ АКТИВИРОВАН",
             description="Сервер заблокирован. Только администраторы могут писать сообщения.",
             color=0xff0000
         )
+        embed.add_field(name="Изменения прав", value=self.protection.describe_permission_reports(reports), inline=False)
         await ctx.send(embed=embed)
         
         await self.protection.log_security_event(
@@ -520,21 +712,14 @@ class RaidProtectionCommands(commands.Cog):
             await ctx.send("❌ Режим изоляции не активен!")
             return
         
-        self.protection.lockdown_mode = False
-        guild = ctx.guild
-        
-        # Возвращаем права на сообщения
-        everyone_role = guild.default_role
-        permissions = everyone_role.permissions
-        permissions.send_messages = True
-        permissions.add_reactions = True
-        await everyone_role.edit(permissions=permissions)
+        reports = await self.protection.end_lockdown(ctx.author)
         
         embed = discord.Embed(
             title="🔓 РЕЖИМ ИЗОЛЯЦИИ ОТКЛЮЧЕН",
             description="Сервер разблокирован. Участники снова могут писать сообщения.",
             color=0x00ff00
         )
+        embed.add_field(name="Изменения прав", value=self.protection.describe_permission_reports(reports), inline=False)
         await ctx.send(embed=embed)
         
         await self.protection.log_security_event(
@@ -566,12 +751,162 @@ class RaidProtectionCommands(commands.Cog):
         
         embed.add_field(
             name="Входов за час",
-            value=str(len(self.protection.join_times)),
+            value=str(self.protection.hourly_joins.count()),
+            inline=True
+        )
+        
+        incident = self.protection.incident.get_stats()
+        embed.add_field(
+            name="Уровень угрозы",
+            value=f"{incident['level_name']} (счет {incident['score']})"
+                  + (" 📌 вручную" if incident['manual'] else ""),
             inline=True
         )
         
+        paused = self.protection.invite_tracker.paused_invites(ctx.guild.id)
+        if paused:
+            embed.add_field(
+                name="Приостановленные приглашения",
+                value=", ".join(f"`{code}`" for code in paused)[:1024],
+                inline=False
+            )
+        
         await ctx.send(embed=embed)
 
+    @commands.command(name='antinuke_restore')
+    @commands.has_permissions(administrator=True)
+    async def antinuke_restore(self, ctx, member: discord.Member):
+        """Вернуть роли, снятые защитой от уничтожения сервера"""
+        try:
+            roles = await self.protection.anti_nuke.restore(
+                ctx.guild, member, reason=f"Возврат ролей: {ctx.author} ({ctx.author.id})"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка возврата ролей после сдерживания: {e}")
+            await ctx.send(f"❌ Не удалось вернуть роли: {e}")
+            return
+        
+        if not roles:
+            await ctx.send(f"❌ У {member.mention} нет ролей, снятых защитой.")
+            return
+        await ctx.send(f"✅ {member.mention}: возвращены роли {', '.join(role.mention for role in roles)}")
+        await self.protection.log_security_event(
+            "РОЛИ ВОЗВРАЩЕНЫ ПОСЛЕ СДЕРЖИВАНИЯ",
+            f"{ctx.author.mention} вернул {member.mention} роли: {', '.join(role.mention for role in roles)}.",
+            color=0x00ff00
+        )
+
+    @commands.command(name='invite_resume')
+    @commands.has_permissions(manage_guild=True)
+    async def invite_resume(self, ctx, code: str = None):
+        """Вернуть приглашение, приостановленное из-за потока входов (без кода - список)"""
+        tracker = self.protection.invite_tracker
+        paused = tracker.paused_invites(ctx.guild.id)
+        if code is None:
+            if not paused:
+                await ctx.send("✅ Приостановленных приглашений нет.")
+                return
+            lines = [f"• `{code}` → <#{record.channel_id}>" for code, record in paused.items()]
+            await ctx.send("⏸️ Приостановленные приглашения:\n" + "\n".join(lines)[:1900])
+            return
+        
+        if code not in paused:
+            await ctx.send(f"❌ Приглашение `{code}` не приостановлено.")
+            return
+        try:
+            invite = await tracker.resume(ctx.guild, code, reason=f"Возобновлено: {ctx.author} ({ctx.author.id})")
+        except Exception as e:
+            logger.error(f"Ошибка возобновления приглашения {code}: {e}")
+            await ctx.send(f"❌ Не удалось возобновить приглашение: {e}")
+            return
+        
+        await ctx.send(f"✅ Приглашение возобновлено с новым кодом: {invite.url}")
+        await self.protection.log_security_event(
+            "ПРИГЛАШЕНИЕ ВОЗОБНОВЛЕНО",
+            f"{ctx.author.mention} вернул приглашение `{code}` с новым кодом `{invite.code}`.",
+            color=0x00ff00
+        )
+
+    @commands.command(name='raid_mitigate')
+    @commands.has_permissions(ban_members=True)
+    async def raid_mitigate(self, ctx, action: str, *targets: str):
+        """Массовое действие (ban/kick/timeout/quarantine) по кластеру входов, авторам спама или списку ID/упоминаний"""
+        action = action.lower()
+        if action not in ACTIONS:
+            await ctx.send(f"❌ Неизвестное действие. Доступно: {', '.join(ACTIONS)}")
+            return
+        
+        if not targets or targets == ('cluster',):
+            cluster = self.protection.last_join_cluster
+            if not cluster:
+                await ctx.send("❌ Кластер рейда не обнаружен. Укажите ID или упоминания участников.")
+                return
+            member_ids = [record.member_id for record in cluster.records]
+            explicit = False
+        elif targets == ('content',):
+            cluster = self.protection.last_content_cluster
+            if not cluster:
+                await ctx.send("❌ Массовый одинаковый контент не обнаружен.")
+                return
+            member_ids = list(cluster.authors)
+            explicit = False
+        else:
+            if not (self.protection.raid_mode or self.protection.privileges.has(ctx.author, PRIV_ADMIN)):
+                await ctx.send("❌ Вне режима рейда действие по списку ID доступно только администраторам.")
+                return
+            member_ids = [int(match) for target in targets for match in re.findall(r'\d{15,20}', target)]
+            explicit = True
+        
+        requested = len(member_ids)
+        member_ids = self.protection.filter_mitigation_targets(ctx.guild, member_ids)
+        if not member_ids:
+            await ctx.send("❌ Нет участников для действия.")
+            return
+        protected = requested - len(member_ids)
+        
+        role = None
+        if action == ACTION_QUARANTINE:
+            role = get_guild_directory(self.bot).role(ctx.guild, "Muted")
+            if not role:
+                await ctx.send("❌ Роль Muted не найдена.")
+                return
+        
+        if not await self.protection.charge_mitigation(ctx.author, action, len(member_ids), explicit):
+            await ctx.send("❌ Действие отклонено: превышен лимит действий модератора.")
+            return
+        
+        status = await ctx.send(f"⏳ {action}: 0/{len(member_ids)}"
+                                + (f" (исключено ботов, персонала и защищенных: {protected})" if protected else ""))
+        
+        async def report(job):
+            state = "✅ Готово" if job.finished else "⏳"
+            await status.edit(content=(
+                f"{state} {action}: {job.processed}/{job.total} "
+                f"(выполнено {job.done}, пропущено {job.skipped}, ошибок {job.failed}) за {job.elapsed:.1f}с"
+                + (f", исключено ботов, персонала и защищенных: {protected}" if protected else "")
+            ))
+        
+        job = await get_mitigation_executor(self.bot).run(
+            ctx.guild, action, member_ids,
+            reason=f"Массовые меры при рейде: {ctx.author} ({ctx.author.id})",
+            role=role, progress=report
+        )
+        
+        await self.protection.log_security_event(
+            "МАССОВЫЕ МЕРЫ ПРИ РЕЙДЕ",
+            f"{ctx.author.mention} применил `{action}` к {job.total} участникам."
+            + (f" Исключено ботов, персонала и защищенных: {protected}." if protected else ""),
+            color=0xff0000,
+            fields=[
+                {"name": "Выполнено", "value": str(job.done), "inline": True},
+                {"name": "Пропущено", "value": str(job.skipped), "inline": True},
+                {"name": "Ошибок", "value": str(job.failed), "inline": True},
+                {"name": "Время", "value": f"{job.elapsed:.1f}с", "inline": True},
+                {"name": "Повторов после лимитов", "value": str(job.retries), "inline": True},
+                {"name": "Ошибки", "value": "\n".join(job.errors)[:1024] or "Нет", "inline": False}
+            ]
+        )
+
 async def setup_raid_protection(bot):
     """Настройка системы защиты от рейдов"""
     try:
@@ -581,55 +916,62 @@ async def setup_raid_protection(bot):
         # Добавляем команды
         await bot.add_cog(RaidProtectionCommands(bot, protection))
         
-        # Настройка событий
-        @bot.event
+        # Исходный снимок приглашений: без него первые входы не с чем сравнить
+        guild = bot.get_guild(LIMONERICX_SERVER_ID)
+        if guild:
+            await protection.invite_tracker.prime(guild)
+        
+        # Настройка событий через шину (не перезаписывает обработчики других систем)
+        bus = setup_event_bus(bot)
+        audit_logs = setup_audit_log_resolver(bot)
+        
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_member_join(member):
             if member.guild.id == LIMONERICX_SERVER_ID:
                 await protection.check_raid_joins(member)
         
-        @bot.event
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_message(message):
             if message.guild and message.guild.id == LIMONERICX_SERVER_ID:
                 await protection.check_message_spam(message)
         
-        @bot.event
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_member_ban(guild, user):
             if guild.id == LIMONERICX_SERVER_ID:
                 # Получаем информацию о том, кто забанил через audit log
-                async for entry in guild.audit_logs(action=discord.AuditLogAction.ban, limit=1):
-                    if entry.target.id == user.id:
-                        await protection.check_moderator_actions(entry.user, 'bans')
-                        break
+                entry = await audit_logs.resolve(guild, discord.AuditLogAction.ban, user.id)
+                if entry:
+                    await protection.check_moderator_actions(entry.user, 'bans')
         
-        @bot.event
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_member_remove(member):
             if member.guild.id == LIMONERICX_SERVER_ID:
                 # Проверяем, был ли это кик через audit log
-                async for entry in member.guild.audit_logs(action=discord.AuditLogAction.kick, limit=1):
-                    if entry.target.id == member.id:
-                        await protection.check_moderator_actions(entry.user, 'kicks')
-                        break
+                entry = await audit_logs.resolve(member.guild, discord.AuditLogAction.kick, member.id)
+                if entry:
+                    await protection.check_moderator_actions(entry.user, 'kicks')
         
-        @bot.event
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_guild_channel_delete(channel):
             if channel.guild.id == LIMONERICX_SERVER_ID:
                 # Получаем информацию о том, кто удалил канал
-                async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.channel_delete, limit=1):
-                    if entry.target.id == channel.id:
-                        await protection.protect_channel_deletion(channel, entry.user)
-                        break
+                entry = await audit_logs.resolve(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
+                if entry:
+                    await protection.protect_channel_deletion(channel, entry.user)
         
         # Обработка мутов через audit log
-        @bot.event
+        @bus.listen(priority=PRIORITY_PROTECTION)
         async def on_member_update(before, after):
             if before.guild.id == LIMONERICX_SERVER_ID:
                 # Проверяем, был ли добавлен мут
                 if before.timed_out_until != after.timed_out_until and after.timed_out_until:
                     # Получаем информацию о том, кто замутил через audit log
-                    async for entry in after.guild.audit_logs(action=discord.AuditLogAction.member_update, limit=5):
-                        if entry.target.id == after.id and entry.after.timed_out_until:
-                            await protection.check_mute_action(entry.user, after, str(after.timed_out_until - datetime.now()))
-                        break
+                    entry = await audit_logs.resolve(
+                        after.guild, discord.AuditLogAction.member_update, after.id,
+                        check=lambda entry: getattr(entry.after, 'timed_out_until', None)
+                    )
+                    if entry:
+                        await protection.check_mute_action(entry.user, after, str(after.timed_out_until - datetime.now()))
         
         logger.info("Система защиты от рейдов настроена")
         
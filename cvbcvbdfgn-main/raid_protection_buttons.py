@@ -9,6 +9,7 @@ from discord import app_commands
 import logging
 from datetime import datetime
 from typing import Optional
+from join_burst_detector import MIN_CLUSTER_SIZE
 
 logger = logging.getLogger('raid_protection_buttons')
 
@@ -43,15 +44,9 @@ class RaidProtectionView(discord.ui.View):
             return
         
         try:
-            self.protection.lockdown_mode = True
-            guild = interaction.guild
-            
-            # Отключаем сообщения для @everyone
-            everyone_role = guild.default_role
-            permissions = everyone_role.permissions
-            permissions.send_messages = False
-            permissions.add_reactions = False
-            await everyone_role.edit(permissions=permissions)
+            # Смена прав может занять больше 3 секунд на ответ: подтверждаем взаимодействие заранее
+            await interaction.response.defer()
+            reports = await self.protection.start_lockdown(interaction.user)
             
             embed = discord.Embed(
                 title="🔒 РЕЖИМ ИЗОЛЯЦИИ АКТИВИРОВАН",
@@ -78,10 +73,16 @@ class RaidProtectionView(discord.ui.View):
                 inline=False
             )
             
+            embed.add_field(
+                name="🔧 Изменения прав",
+                value=self.protection.describe_permission_reports(reports),
+                inline=False
+            )
+            
             embed.set_footer(text=f"🆔 Администратор: {interaction.user.id}", 
                            icon_url="https://cdn.discordapp.com/emojis/1234567890.png")
             
-            await interaction.response.send_message(embed=embed)
+            await interaction.followup.send(embed=embed)
             
             # Логируем событие
             await self.protection.log_security_event(
@@ -98,7 +99,10 @@ class RaidProtectionView(discord.ui.View):
                 color=0xff0000,
                 timestamp=datetime.utcnow()
             )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=True)
     
     @discord.ui.button(label="🔓 Разблокировка", style=discord.ButtonStyle.success, custom_id="raid_unlock")
     async def unlock_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -124,15 +128,9 @@ class RaidProtectionView(discord.ui.View):
             return
         
         try:
-            self.protection.lockdown_mode = False
-            guild = interaction.guild
-            
-            # Возвращаем права на сообщения
-            everyone_role = guild.default_role
-            permissions = everyone_role.permissions
-            permissions.send_messages = True
-            permissions.add_reactions = True
-            await everyone_role.edit(permissions=permissions)
+            # Смена прав может занять больше 3 секунд на ответ: подтверждаем взаимодействие заранее
+            await interaction.response.defer()
+            reports = await self.protection.end_lockdown(interaction.user)
             
             embed = discord.Embed(
                 title="🔓 РЕЖИМ ИЗОЛЯЦИИ ОТКЛЮЧЕН",
@@ -159,10 +157,16 @@ class RaidProtectionView(discord.ui.View):
                 inline=False
             )
             
+            embed.add_field(
+                name="🔧 Изменения прав",
+                value=self.protection.describe_permission_reports(reports),
+                inline=False
+            )
+            
             embed.set_footer(text=f"🆔 Администратор: {interaction.user.id}", 
                            icon_url="https://cdn.discordapp.com/emojis/1234567890.png")
             
-            await interaction.response.send_message(embed=embed)
+            await interaction.followup.send(embed=embed)
             
             # Логируем событие
             await self.protection.log_security_event(
@@ -179,7 +183,10 @@ class RaidProtectionView(discord.ui.View):
                 color=0xff0000,
                 timestamp=datetime.utcnow()
             )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            if interaction.response.is_done():
+                await interaction.followup.send(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message(embed=embed, ephemeral=True)
     
     @discord.ui.button(label="📊 Статус", style=discord.ButtonStyle.primary, custom_id="raid_status")
     async def status_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -220,15 +227,14 @@ class RaidProtectionView(discord.ui.View):
             
             embed.add_field(
                 name="👥 Входов за час",
-                value=str(len(self.protection.join_times)),
+                value=str(self.protection.hourly_joins.count()),
                 inline=True
             )
             
             # Статистика модераторских действий
             total_actions = 0
-            for mod_actions in self.protection.moderator_actions.values():
-                for action_list in mod_actions.values():
-                    total_actions += len(action_list)
+            for mod_actions in self.protection.get_moderator_action_counts().values():
+                total_actions += sum(mod_actions.values())
             
             embed.add_field(
                 name="⚡ Действий модераторов",
@@ -239,7 +245,8 @@ class RaidProtectionView(discord.ui.View):
             # Настройки защиты
             embed.add_field(
                 name="⚙️ Настройки защиты",
-                value=f"""• Максимум входов в минуту: `{self.protection.MAX_JOINS_PER_MINUTE}`
+                value=f"""• Максимум входов в минуту: `{self.protection.FLOOD_JOINS_PER_MINUTE}`
+• Группа похожих аккаунтов: от `{MIN_CLUSTER_SIZE}` входов за час
 • Максимум сообщений в минуту: `{self.protection.MAX_MESSAGES_PER_MINUTE}`
 • Максимум банов в час: `{self.protection.MAX_BANS_PER_HOUR}` (автоотключение на 2ч)
 • Максимум киков в час: `{self.protection.MAX_KICKS_PER_HOUR}` (автоотключение на 1ч)
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Офлайн-прогон защиты от рейдов без живого сервера
+Синтетический (или записанный в JSONL) поток входов, сообщений и действий модераторов
+подается в check_raid_joins, check_message_spam и check_moderator_actions через
+подставные сервер и участников. Время в детекторах виртуальное, поэтому 10 минут потока
+проигрываются за секунды. Печатает задержку обнаружения, ложные срабатывания,
+процессорное время на событие и пиковую память.
+
+Запуск: python raid_simulator.py [--raid-joins-per-min 500] [--messages-per-min 10000]
+        python raid_simulator.py --record stream.jsonl   (сохранить поток)
+        python raid_simulator.py --replay stream.jsonl   (проиграть записанный поток)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import discord
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Модули, время в которых заменяется виртуальными часами
+CLOCKED_MODULES = ('sliding_counter', 'join_burst_detector', 'content_fingerprint', 'raid_incident',
+                   'moderator_action_store', 'anti_nuke')
+
+SYLLABLES = ['ka', 'ri', 'mo', 'ne', 'to', 'sa', 'lu', 'vi', 'da', 'ze', 'po', 'ry', 'ko', 'mi', 'an', 'el']
+COMMON_PHRASES = ['всем привет', 'ок', 'лол', 'да', 'нет', 'спасибо', 'кто играть?', 'gg', '+', 'ахахах']
+SPAM_TEMPLATES = [
+    'FREE NITRO for everyone who joins discord.gg/{code} hurry up limited offer',
+    'Бесплатный нитро всем кто зайдет на discord.gg/{code} только сегодня, успей забрать'
+]
+
+
+# --- Виртуальные часы ---
+
+class SimClock:
+    """Подменяет модуль time в детекторах: time() и monotonic() идут по потоку событий"""
+
+    def __init__(self, start: float):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+# --- Подставные объекты Discord ---
+
+class SimRole:
+    def __init__(self, role_id: int, name: str, permissions: discord.Permissions, position: int = 0):
+        self.id = role_id
+        self.name = name
+        self.permissions = permissions
+        self.position = position
+        self.managed = False
+        self.mention = f"<@&{role_id}>"
+
+    def is_default(self) -> bool:
+        return self.name == '@everyone'
+
+    def __lt__(self, other):
+        return self.position < other.position
+
+    async def edit(self, **kwargs):
+        for key, value in kwargs.items():
+            if key != 'reason':
+                setattr(self, key, value)
+
+
+class SimChannel:
+    def __init__(self, channel_id: int, name: str, guild):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.category_id = None
+        self.overwrites = {}
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class SimMember:
+    def __init__(self, guild, member_id: int, name: str, created: float, default_avatar: bool, raider: bool = False):
+        self.guild = guild
+        self.id = member_id
+        self.name = name
+        self.created_at = datetime.fromtimestamp(created, tz=timezone.utc)
+        self.avatar = None if default_avatar else 'sim'
+        self.raider = raider
+        self.bot = False
+        self.roles: List[SimRole] = []
+        self.guild_permissions = discord.Permissions.none()
+        self.mention = f"<@{member_id}>"
+
+    async def add_roles(self, *roles, reason=None):
+        self.guild.actions.append(('add_roles', self.id, self.raider))
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        self.guild.actions.append(('remove_roles', self.id, self.raider))
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def timeout(self, *args, **kwargs):
+        self.guild.actions.append(('timeout', self.id, self.raider))
+
+    async def edit(self, roles=None, reason=None):
+        self.guild.actions.append(('edit_roles', self.id, self.raider))
+        if roles is not None:
+            self.roles = list(roles)
+
+    async def kick(self, reason=None):
+        self.guild.actions.append(('kick', self.id, self.raider))
+
+    async def send(self, *args, **kwargs):
+        pass
+
+    def __str__(self):
+        return self.name
+
+
+class SimMessage:
+    def __init__(self, author: SimMember, content: str, channel: SimChannel):
+        self.author = author
+        self.guild = author.guild
+        self.channel = channel
+        self.content = content
+
+
+class SimAuditEntry:
+    """Запись журнала аудита в том виде, в каком её читает защита от уничтожения сервера"""
+
+    def __init__(self, guild, action: discord.AuditLogAction, user_id: int, target_id: int, created: float):
+        self.guild = guild
+        self.action = action
+        self.user_id = user_id
+        self.target = discord.Object(target_id)
+        self.created_at = datetime.fromtimestamp(created, tz=timezone.utc)
+        self.before = None
+        self.after = None
+
+
+class SimGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = 'Симуляция'
+        self.owner_id = 0
+        self.verification_level = discord.VerificationLevel.low
+        self.default_role = SimRole(guild_id, '@everyone', discord.Permissions.general() | discord.Permissions.text())
+        self.muted_role = SimRole(guild_id + 1, 'Muted', discord.Permissions.none(), position=1)
+        self.moderator_role = SimRole(guild_id + 2, 'Модератор', discord.Permissions(ban_members=True, kick_members=True), 2)
+        self.bot_role = SimRole(guild_id + 3, 'Бот', discord.Permissions(administrator=True), 10)
+        self.bot_role.managed = True
+        self.roles = [self.default_role, self.muted_role, self.moderator_role, self.bot_role]
+        self.security_channel = SimChannel(guild_id + 10, 'security-logs', self)
+        self.channels = [self.security_channel]
+        self.general = SimChannel(guild_id + 11, 'общий', self)
+        self._members: Dict[int, SimMember] = {}
+        self.actions: List = []
+        self.me = None
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, member_id: int):
+        return self._members.get(member_id)
+
+    def get_role(self, role_id: int):
+        for role in self.roles:
+            if role.id == role_id:
+                return role
+        return None
+
+    def get_channel(self, channel_id: int):
+        for channel in self.channels:
+            if channel.id == channel_id:
+                return channel
+        return None
+
+    def add_member(self, member: SimMember):
+        self._members[member.id] = member
+
+    async def edit(self, **kwargs):
+        self.guild_edits = getattr(self, 'guild_edits', 0) + 1
+        if 'verification_level' in kwargs:
+            self.verification_level = kwargs['verification_level']
+
+
+class SimBot:
+    def __init__(self, guild: SimGuild):
+        self.guild = guild
+        self.user = SimMember(guild, 1, 'RaidBot', 0, False)
+        self.guild.me = self.user
+        self.user.top_role = guild.bot_role
+
+    def get_guild(self, guild_id: int):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_channel(self, channel_id: int):
+        return self.guild.get_channel(channel_id)
+
+    def event(self, coro):
+        return coro
+
+
+# --- Генерация потока ---
+
+def random_name(rng: random.Random) -> str:
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    if rng.random() < 0.3:
+        name += str(rng.randint(1, 99))
+    return name
+
+
+def random_text(rng: random.Random, vocabulary: List[str]) -> str:
+    if rng.random() < 0.2:
+        return rng.choice(COMMON_PHRASES)
+    return ' '.join(rng.choices(vocabulary, k=rng.randint(2, 16)))
+
+
+def generate_stream(args) -> List[Dict]:
+    """События {t, type, ..., raid}; t - секунды от начала потока"""
+    rng = random.Random(args.seed)
+    letters = 'абвгдежзиклмнопрстуфхцчшщэюя'
+    vocabulary = [''.join(rng.choices(letters, k=rng.randint(2, 9))) for _ in range(5000)]
+    events = []
+    next_id = 10_000
+
+    # Уже активные участники; самые активные пишут около 10 сообщений в минуту, как в живом чате
+    users = []
+    for _ in range(args.active_users):
+        users.append(next_id)
+        events.append({'t': 0.0, 'type': 'member', 'id': next_id, 'name': random_name(rng),
+                       'age_days': rng.uniform(30, 2000), 'default_avatar': rng.random() < 0.2, 'raid': False})
+        next_id += 1
+    weights = [1.0 / (rank + 1) ** 0.2 for rank in range(len(users))]
+
+    message_count = int(args.messages_per_min * args.duration / 60)
+    authors = rng.choices(users, weights=weights, k=message_count)
+    for index, author in enumerate(authors):
+        events.append({'t': rng.uniform(0, args.duration), 'type': 'message', 'author': author,
+                       'content': random_text(rng, vocabulary), 'raid': False})
+
+    # Обычные входы
+    for _ in range(int(args.joins_per_min * args.duration / 60)):
+        events.append({'t': rng.uniform(0, args.duration), 'type': 'join', 'id': next_id, 'name': random_name(rng),
+                       'age_days': rng.expovariate(1 / 400), 'default_avatar': rng.random() < 0.3, 'raid': False})
+        next_id += 1
+
+    # Рейд: похожие свежие аккаунты без аватаров, каждый пишет спам по паре раз
+    if args.raid_size:
+        stem = random_name(rng).rstrip('0123456789')
+        code = ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz0123456789', k=8))
+        created_base = rng.uniform(0.5, 3)
+        interval = 60 / args.raid_joins_per_min
+        for index in range(args.raid_size):
+            joined = args.raid_start + index * interval + rng.uniform(0, interval)
+            events.append({'t': joined, 'type': 'join', 'id': next_id, 'name': f"{stem}{rng.randint(1000, 9999)}",
+                           'age_days': created_base / 24 + rng.uniform(0, 0.05), 'default_avatar': True, 'raid': True})
+            template = rng.choice(SPAM_TEMPLATES)
+            for _ in range(args.raid_messages):
+                events.append({'t': joined + rng.uniform(1, 60), 'type': 'message', 'author': next_id,
+                               'content': template.format(code=code) + ' ' + '!' * rng.randint(0, 3), 'raid': True})
+            next_id += 1
+
+    # Захват аккаунта модератора: серия банов
+    if args.nuke_actions:
+        events.append({'t': 0.0, 'type': 'member', 'id': 2, 'name': 'moderator', 'age_days': 900,
+                       'default_avatar': False, 'moderator': True, 'raid': False})
+        for index in range(args.nuke_actions):
+            events.append({'t': args.nuke_start + index * args.nuke_interval, 'type': 'mod_action', 'moderator': 2,
+                           'action': 'bans', 'raid': True})
+
+    events.sort(key=lambda event: event['t'])
+    return events
+
+
+# --- Прогон ---
+
+async def simulate(events: List[Dict], measure_memory: bool = False) -> Dict:
+    import config
+    from raid_protection import RaidProtection
+    import importlib
+
+    start = time.time()
+    clock = SimClock(start)
+    for name in CLOCKED_MODULES:
+        importlib.import_module(name).time = clock
+
+    guild = SimGuild(config.LIMONERICX_SERVER_ID)
+    bot = SimBot(guild)
+    protection = RaidProtection(bot)
+    protection.security_log_channel_id = guild.security_channel.id
+
+    detections = []
+    original_log = protection.log_security_event
+
+    async def record_detection(title, description, color=0xff0000, fields=None):
+        detections.append((clock.now - start, title))
+        await original_log(title, description, color, fields)
+
+    protection.log_security_event = record_detection
+
+    cpu = {}
+    raid_mode_at = None
+    raid_start = next((event['t'] for event in events if event.get('raid')), None)
+
+    if measure_memory:
+        tracemalloc.start()
+    try:
+        for event in events:
+            clock.now = start + event['t']
+            kind = event['type']
+            began = time.process_time()
+            if kind == 'member' or kind == 'join':
+                member = SimMember(guild, event['id'], event['name'], clock.now - event['age_days'] * 86400,
+                                   event['default_avatar'], raider=event.get('raid', False) or event.get('moderator', False))
+                if event.get('moderator'):
+                    member.roles.append(guild.moderator_role)
+                guild.add_member(member)
+                if kind == 'join':
+                    await protection.check_raid_joins(member)
+            elif kind == 'message':
+                author = guild.get_member(event['author'])
+                if author:
+                    await protection.check_message_spam(SimMessage(author, event['content'], guild.general))
+            elif kind == 'mod_action':
+                # Запись журнала аудита приходит событием раньше, чем бан разрешается через журнал
+                await protection.anti_nuke.observe(
+                    SimAuditEntry(guild, discord.AuditLogAction.ban, event['moderator'], 0, clock.now)
+                )
+                await protection.check_moderator_actions(guild.get_member(event['moderator']), event['action'])
+            if kind != 'member':
+                elapsed = time.process_time() - began
+                total, count = cpu.get(kind, (0.0, 0))
+                cpu[kind] = (total + elapsed, count + 1)
+
+            if raid_mode_at is None and protection.raid_mode:
+                raid_mode_at = event['t']
+    finally:
+        peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+        if measure_memory:
+            tracemalloc.stop()
+        protection.cleanup_task.cancel()
+
+    false_positives = [(moment, title) for moment, title in detections if raid_start is None or moment < raid_start]
+    organic_actions = [action for action in guild.actions if not action[2]]
+    return {
+        'events': len(events),
+        'raid_start': raid_start,
+        'detections': detections,
+        'first_detection': next((moment for moment, _ in detections
+                                 if raid_start is not None and moment >= raid_start), None),
+        'raid_mode_at': raid_mode_at,
+        'false_positives': false_positives,
+        'organic_actions': organic_actions,
+        'raider_actions': len(guild.actions) - len(organic_actions),
+        'cpu': cpu,
+        'peak_memory': peak,
+        'stats': {
+            'join_detector': protection.join_detector.get_stats(),
+            'content_index': protection.content_index.get_stats(),
+            'user_counters': protection.user_messages.get_stats(),
+            'incident': protection.incident.get_stats(),
+            'anti_nuke': protection.anti_nuke.get_stats()
+        },
+        'containments': protection.anti_nuke.reports
+    }
+
+
+def print_report(result: Dict, peak_memory):
+    print(f"Событий: {result['events']}")
+    if result['raid_start'] is not None:
+        print(f"Начало атаки: {result['raid_start']:.1f} с")
+        for label, moment in (("Первое обнаружение", result['first_detection']),
+                              ("Режим рейда", result['raid_mode_at'])):
+            if moment is None:
+                print(f"{label}: не обнаружено")
+            elif moment < result['raid_start']:
+                print(f"{label}: за {result['raid_start'] - moment:.1f} с до начала атаки (ложное)")
+            else:
+                print(f"{label}: через {moment - result['raid_start']:.1f} с")
+    print(f"Ложных срабатываний: {len(result['false_positives'])}")
+    for moment, title in result['false_positives'][:10]:
+        print(f"  {moment:7.1f} с  {title}")
+    print(f"Действий против обычных участников: {len(result['organic_actions'])}, против рейдеров: {result['raider_actions']}")
+    print("Срабатывания:")
+    for moment, title in result['detections'][:20]:
+        print(f"  {moment:7.1f} с  {title}")
+    print("Процессорное время на событие:")
+    for kind, (total, count) in sorted(result['cpu'].items()):
+        print(f"  {kind:<11} {count:>8} событий  {total / count * 1e6:8.1f} мкс")
+    if peak_memory is not None:
+        print(f"Пиковая память защиты: {peak_memory / 2 ** 20:.1f} МБ")
+    for report in result['containments']:
+        print(f"Сдерживание <@{report['actor_id']}>: {report['outcome']}, действия {report['actions']}, "
+              f"от первого действия {report['time_to_contain']:.1f} с")
+    for name, stats in result['stats'].items():
+        print(f"{name}: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=600.0, help='Длительность потока в секундах')
+    parser.add_argument('--active-users', type=int, default=3000)
+    parser.add_argument('--messages-per-min', type=int, default=10_000)
+    parser.add_argument('--joins-per-min', type=float, default=3.0, help='Обычные входы в минуту')
+    parser.add_argument('--raid-start', type=float, default=300.0)
+    parser.add_argument('--raid-size', type=int, default=500, help='Аккаунтов в рейде (0 - без рейда)')
+    parser.add_argument('--raid-joins-per-min', type=float, default=500.0)
+    parser.add_argument('--raid-messages', type=int, default=2, help='Сообщений спама от каждого рейдера')
+    parser.add_argument('--nuke-actions', type=int, default=0, help='Банов от захваченного модератора')
+    parser.add_argument('--nuke-start', type=float, default=400.0)
+    parser.add_argument('--nuke-interval', type=float, default=0.5, help='Секунд между банами захваченного модератора')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--record', help='Сохранить поток в JSONL и выйти')
+    parser.add_argument('--replay', help='Проиграть поток из JSONL')
+    parser.add_argument('--no-memory', action='store_true', help='Не делать отдельный прогон с tracemalloc')
+    args = parser.parse_args()
+
+    if args.replay:
+        with open(args.replay, 'r', encoding='utf-8') as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        events.sort(key=lambda event: event['t'])
+    else:
+        events = generate_stream(args)
+
+    if args.record:
+        with open(args.record, 'w', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        print(f"Записано {len(events)} событий в {args.record}")
+        return
+
+    # Защита пишет свое состояние (таймеры, уровень угрозы) в текущую папку - уводим во временную
+    logging.disable(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix='raid_sim_')
+    previous_dir = os.getcwd()
+    sys.path.insert(0, SIM_DIR)
+    os.chdir(workdir)
+    try:
+        # Время считается в отдельном прогоне: tracemalloc сам по себе замедляет выделения памяти
+        result = asyncio.run(simulate(events))
+        peak = None
+        if not args.no_memory:
+            for path in os.listdir(workdir):
+                os.remove(os.path.join(workdir, path))
+            peak = asyncio.run(simulate(events, measure_memory=True))['peak_memory']
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_report(result, peak)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Счетчики событий в скользящем окне для Discord бота
+Окно делится на кольцо корзин фиксированного размера: добавление и подсчет стоят O(1)
+(амортизированно), а память на один счетчик не зависит от числа событий
+"""
+
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterator, Optional, Tuple
+
+
+class SlidingWindowCounter:
+    """Число событий за последние window секунд с точностью до одной корзины (resolution секунд)"""
+
+    __slots__ = ('resolution', 'size', 'counts', 'last_tick', 'total')
+
+    def __init__(self, window: float, resolution: float = 1.0, typecode: str = 'I', zeros: Optional[array] = None):
+        self.resolution = resolution
+        self.size = max(1, int(round(window / resolution)))
+        # Готовый массив нулей от SlidingCounterMap экономит его построение для каждого ключа
+        self.counts = array(typecode, zeros) if zeros is not None else array(typecode, [0]) * self.size
+        self.last_tick = 0
+        self.total = 0
+
+    def _advance(self, tick: int):
+        """Обнуляет корзины, из которых окно ушло с момента последнего обращения"""
+        elapsed = tick - self.last_tick
+        if elapsed <= 0:
+            return
+        counts = self.counts
+        if elapsed >= self.size:
+            if self.total:
+                for index in range(self.size):
+                    counts[index] = 0
+                self.total = 0
+        else:
+            for passed in range(self.last_tick + 1, tick + 1):
+                index = passed % self.size
+                if counts[index]:
+                    self.total -= counts[index]
+                    counts[index] = 0
+        self.last_tick = tick
+
+    def add(self, amount: int = 1, now: Optional[float] = None) -> int:
+        """Добавляет события и возвращает их число в окне"""
+        tick = int((time.monotonic() if now is None else now) // self.resolution)
+        self._advance(tick)
+        self.counts[tick % self.size] += amount
+        self.total += amount
+        return self.total
+
+    def count(self, now: Optional[float] = None) -> int:
+        """Число событий в окне"""
+        self._advance(int((time.monotonic() if now is None else now) // self.resolution))
+        return self.total
+
+    def is_idle(self, now: Optional[float] = None) -> bool:
+        """Окно опустело: последнее событие старше window"""
+        tick = int((time.monotonic() if now is None else now) // self.resolution)
+        return tick - self.last_tick >= self.size
+
+
+class SlidingCounterMap:
+    """Счетчики по ключам (пользователь, модератор) с ограничением числа ключей.
+
+    Ключи упорядочены по последнему событию: пустые счетчики удаляются с начала
+    понемногу при каждом добавлении, а при переполнении вытесняется самый давний ключ.
+    """
+
+    def __init__(self, window: float, resolution: float = 1.0, max_keys: int = 100_000, typecode: str = 'I'):
+        self.window = window
+        self.resolution = resolution
+        self.max_keys = max_keys
+        self.typecode = typecode
+        self.counters: 'OrderedDict[Hashable, SlidingWindowCounter]' = OrderedDict()
+        self.evicted = 0
+        self._zeros = SlidingWindowCounter(window, resolution, typecode).counts
+
+    def __len__(self):
+        return len(self.counters)
+
+    def __contains__(self, key):
+        return key in self.counters
+
+    def add(self, key: Hashable, amount: int = 1, now: Optional[float] = None) -> int:
+        """Добавляет события ключу и возвращает их число в окне"""
+        if now is None:
+            now = time.monotonic()
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) >= self.max_keys:
+                self.counters.popitem(last=False)
+                self.evicted += 1
+            counter = self.counters[key] = SlidingWindowCounter(self.window, self.resolution, self.typecode, self._zeros)
+        else:
+            self.counters.move_to_end(key)
+        result = counter.add(amount, now)
+        self._prune_front(now, 2)
+        return result
+
+    def count(self, key: Hashable, now: Optional[float] = None) -> int:
+        counter = self.counters.get(key)
+        return counter.count(now) if counter is not None else 0
+
+    def items(self, now: Optional[float] = None) -> Iterator[Tuple[Hashable, int]]:
+        """Ключи с ненулевым числом событий в окне"""
+        if now is None:
+            now = time.monotonic()
+        for key, counter in list(self.counters.items()):
+            value = counter.count(now)
+            if value:
+                yield key, value
+
+    def _prune_front(self, now: float, limit: int) -> int:
+        removed = 0
+        counters = self.counters
+        while counters and removed < limit:
+            for key in counters:
+                break
+            if not counters[key].is_idle(now):
+                break
+            del counters[key]
+            removed += 1
+        return removed
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удаляет все счетчики с опустевшим окном"""
+        return self._prune_front(time.monotonic() if now is None else now, len(self.counters))
+
+    def get_stats(self) -> Dict:
+        return {'keys': len(self.counters), 'max_keys': self.max_keys, 'evicted': self.evicted}
@@ -0,0 +1,190 @@
+"""
+Локальное хранилище SQLite для Discord бота
+Два соединения на файл (WAL): чтение по индексам прямо в цикле событий через свое
+соединение и запись пачками: строки копятся в памяти и раз в FLUSH_INTERVAL уходят
+одной транзакцией в отдельном потоке. В WAL читатель не ждет писателя, поэтому долгая
+запись не блокирует бота
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('sqlite_store')
+
+FLUSH_INTERVAL = 1.0  # Секунд между записями пачек
+MAX_BATCH = 500  # Пачка такого размера пишется сразу, не дожидаясь таймера
+
+
+class SQLiteStore:
+    """Соединение с файлом базы и очередь пакетной записи"""
+
+    def __init__(self, path: str, schema: str = ""):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()  # Соединение записи: поток записи и изменения схемы
+        # Один поток записи: пачки и операции выполняются строго в порядке постановки
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite_store')
+        self.pending: List[Tuple[str, Sequence]] = []  # (SQL, параметры) в порядке постановки
+        self.writing: List[List[Tuple[str, Sequence]]] = []  # Пачки, переданные в поток записи
+        self.stats = {'flushes': 0, 'rows_written': 0, 'queries': 0, 'errors': 0}
+        self._flush_handle = None
+        self._flush_task: Optional[asyncio.Task] = None
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            if schema:
+                self.connection.executescript(schema)
+            self.connection.commit()
+        # Только для цикла событий; видит последнюю завершенную транзакцию записи
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+        self.reader.execute("PRAGMA query_only=1")
+
+    # --- Запись ---
+
+    @property
+    def pending_rows(self) -> int:
+        return len(self.pending)
+
+    def insert(self, sql: str, row: Sequence):
+        """Ставит строку в очередь; запись на диск - пачкой"""
+        self.pending.append((sql, row))
+        if len(self.pending) >= MAX_BATCH:
+            self._flush_soon(0)
+        else:
+            self._flush_soon(FLUSH_INTERVAL)
+
+    def execute_later(self, sql: str, params: Sequence = ()):
+        """Команда без результата (удаление старых строк) в той же очереди, что и вставки"""
+        self.insert(sql, params)
+
+    def _flush_soon(self, delay: float):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if delay == 0 and self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_handle is None and (self._flush_task is None or self._flush_task.done()):
+            self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_async(batch))
+
+    async def _flush_async(self, batch: List[Tuple[str, Sequence]]):
+        self.writing.append(batch)
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._write, batch)
+        finally:
+            self._written(batch)
+        if self.pending_rows:
+            self._flush_soon(0 if self.pending_rows >= MAX_BATCH else FLUSH_INTERVAL)
+
+    def flush(self):
+        """Синхронно пишет все накопленное (при остановке бота)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            self._write(batch)
+
+    def _written(self, batch: List[Tuple[str, Sequence]]):
+        # Пачка убирается из очереди только в цикле событий, после фиксации: читатель не
+        # застает момент, когда строк уже нет в очереди, но еще нет на диске
+        self.writing = [item for item in self.writing if item is not batch]
+
+    def close(self):
+        """Дожидается пачки в потоке записи, дописывает очередь и закрывает базу"""
+        self.executor.shutdown(wait=True)
+        self.flush()
+        with self.lock:
+            self.connection.close()
+        self.reader.close()
+
+    def _write(self, batch: List[Tuple[str, Sequence]]):
+        rows = len(batch)
+        try:
+            with self.lock:
+                with self.connection:
+                    # Подряд идущие одинаковые команды - одним executemany; порядок команд сохраняется
+                    start = 0
+                    while start < rows:
+                        sql = batch[start][0]
+                        end = start
+                        while end < rows and batch[end][0] == sql:
+                            end += 1
+                        self.connection.executemany(sql, [params for _, params in batch[start:end]])
+                        start = end
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += rows
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Ошибка записи пачки в {self.path} ({rows} строк): {e}")
+
+    # --- Чтение ---
+
+    def query(self, sql: str, params: Sequence = ()) -> List[Tuple]:
+        """Запрос по индексу через соединение чтения; не ждет пачку в потоке записи"""
+        self.stats['queries'] += 1
+        return self.reader.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence = ()):
+        rows = self.query(sql, params)
+        return rows[0] if rows else None
+
+    def queued(self) -> Iterable[Tuple[str, Sequence]]:
+        """Команды, которые читатель еще не видит: пачки в потоке записи и очередь, по порядку"""
+        for batch in self.writing:
+            yield from batch
+        yield from self.pending
+
+    def pending_for(self, sql: str) -> Iterable[Sequence]:
+        """Строки, которые еще не записаны (для учета в подсчетах)"""
+        return (params for pending_sql, params in self.queued() if pending_sql == sql)
+
+    async def run(self, operation: Callable[[sqlite3.Connection], object]):
+        """Выполняет operation(соединение) в потоке записи после всего, что уже в очереди"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self.pending = self.pending, []
+        loop = asyncio.get_running_loop()
+        if batch:
+            self.writing.append(batch)
+            try:
+                await loop.run_in_executor(self.executor, self._write, batch)
+            finally:
+                self._written(batch)
+
+        def call():
+            with self.lock:
+                with self.connection:
+                    return operation(self.connection)
+
+        return await loop.run_in_executor(self.executor, call)
+
+    def get_stats(self) -> Dict:
+        return {'path': self.path, 'pending': self.pending_rows,
+                'writing': sum(len(batch) for batch in self.writing), **self.stats}
+
+
+def get_sqlite_store(bot, path: str, schema: str = "") -> SQLiteStore:
+    """Возвращает хранилище файла path, открывая его при первом обращении"""
+    if not hasattr(bot, 'sqlite_stores'):
+        bot.sqlite_stores = {}
+    store = bot.sqlite_stores.get(path)
+    if store is None:
+        store = bot.sqlite_stores[path] = SQLiteStore(path, schema)
+    elif schema:
+        with store.lock:
+            store.connection.executescript(schema)
+    return store
@@ -0,0 +1,202 @@
+"""
+Граф запуска систем Discord бота
+Описывает системы как этапы с зависимостями, запускает независимые этапы параллельно
+и запоминает готовые этапы, чтобы переподключение к Discord не настраивало всё заново
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('startup_graph')
+
+# Состояния этапа запуска
+STAGE_PENDING = 'pending'
+STAGE_RUNNING = 'running'
+STAGE_READY = 'ready'
+STAGE_FAILED = 'failed'
+STAGE_SKIPPED = 'skipped'
+
+
+class StartupStage:
+    """Этап запуска: одна система бота и её зависимости"""
+
+    def __init__(self, name: str, setup: Callable, depends_on=(), provides: Optional[str] = None,
+                 revalidate: Optional[Callable] = None, description: str = ''):
+        self.name = name
+        self.setup = setup
+        self.depends_on = tuple(depends_on)
+        self.provides = provides          # Атрибут бота, который появляется после успешной настройки
+        self.revalidate = revalidate      # Проверка при переподключении; False - этап нужно выполнить снова
+        self.description = description or name
+        self.state = STAGE_PENDING
+        self.runs = 0
+        self.duration = 0.0               # Время выполнения самого этапа
+        self.time_to_ready = 0.0          # Время от начала запуска графа до готовности этапа
+        self.error: Optional[str] = None
+
+
+class StartupGraph:
+    """Декларативный граф запуска с параллельным выполнением и мемоизацией"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.stages: Dict[str, StartupStage] = {}
+        self.run_count = 0
+        self.last_run_time = 0.0
+        self._current_run: Optional[asyncio.Task] = None
+
+    def add_stage(self, name: str, setup: Callable, depends_on=(), provides: Optional[str] = None,
+                  revalidate: Optional[Callable] = None, description: str = '') -> StartupStage:
+        """Добавляет этап; setup - корутина без аргументов"""
+        if name in self.stages:
+            raise ValueError(f"Этап запуска {name} уже зарегистрирован")
+        stage = StartupStage(name, setup, depends_on, provides, revalidate, description)
+        self.stages[name] = stage
+        return stage
+
+    def stage(self, name: str, depends_on=(), provides: Optional[str] = None,
+              revalidate: Optional[Callable] = None, description: str = ''):
+        """Декоратор для регистрации этапа"""
+        def decorator(setup):
+            self.add_stage(name, setup, depends_on, provides, revalidate, description)
+            return setup
+        return decorator
+
+    def _validate(self):
+        """Проверяет, что все зависимости существуют и в графе нет циклов"""
+        for stage in self.stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise ValueError(f"Этап {stage.name} зависит от неизвестного этапа {dependency}")
+
+        visiting, visited = set(), set()
+
+        def visit(name, path):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Цикл в графе запуска: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name, [])
+
+    async def run(self):
+        """Запускает граф. Повторный вызов во время выполнения ждет текущий запуск"""
+        if self._current_run and not self._current_run.done():
+            logger.info("Запуск систем уже выполняется, ожидаю его завершения")
+            await asyncio.shield(self._current_run)
+            return
+        self._current_run = asyncio.create_task(self._run())
+        await asyncio.shield(self._current_run)
+
+    async def _run(self):
+        self._validate()
+        self.run_count += 1
+        graph_start = time.perf_counter()
+
+        # Готовые этапы только перепроверяются; остальные выполняются заново
+        to_run = set()
+        for stage in self.stages.values():
+            if stage.state == STAGE_READY and await self._is_still_valid(stage):
+                continue
+            to_run.add(stage.name)
+
+        # Этап, зависящий от перезапускаемого, тоже перезапускается
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages.values():
+                if stage.name not in to_run and any(dep in to_run for dep in stage.depends_on):
+                    to_run.add(stage.name)
+                    changed = True
+
+        if not to_run:
+            logger.info(f"Переподключение #{self.run_count}: все системы готовы, повторная настройка не требуется")
+            self.last_run_time = time.perf_counter() - graph_start
+            return
+
+        logger.info(f"Запуск систем #{self.run_count}: этапов к выполнению {len(to_run)} из {len(self.stages)}")
+
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in to_run:
+            self.stages[name].state = STAGE_PENDING
+        for name in to_run:
+            tasks[name] = asyncio.create_task(self._run_stage(self.stages[name], tasks, graph_start))
+        await asyncio.gather(*tasks.values())
+
+        self.last_run_time = time.perf_counter() - graph_start
+        ready = sum(1 for name in to_run if self.stages[name].state == STAGE_READY)
+        logger.info(f"Запуск систем #{self.run_count} завершен за {self.last_run_time:.2f}с: готово {ready}/{len(to_run)}")
+
+    async def _is_still_valid(self, stage: StartupStage) -> bool:
+        """Перепроверяет готовый этап при переподключении"""
+        try:
+            if stage.provides and not hasattr(self.bot, stage.provides):
+                return False
+            if stage.revalidate:
+                return bool(await stage.revalidate())
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка перепроверки этапа {stage.name}: {e}")
+            return False
+
+    async def _run_stage(self, stage: StartupStage, tasks: Dict[str, asyncio.Task], graph_start: float):
+        """Ждет зависимости и выполняет этап"""
+        # Задачи всех этапов создаются до первого переключения контекста, поэтому словарь уже заполнен
+        pending = [tasks[dep] for dep in stage.depends_on if dep in tasks]
+        if pending:
+            await asyncio.gather(*pending)
+
+        failed = [dep for dep in stage.depends_on if self.stages[dep].state != STAGE_READY]
+        if failed:
+            stage.state = STAGE_SKIPPED
+            stage.error = f"не готовы зависимости: {', '.join(failed)}"
+            logger.warning(f"Этап {stage.name} пропущен: {stage.error}")
+            return
+
+        stage.state = STAGE_RUNNING
+        stage.runs += 1
+        start = time.perf_counter()
+        try:
+            await stage.setup()
+            if stage.provides and not hasattr(self.bot, stage.provides):
+                raise RuntimeError(f"после настройки отсутствует bot.{stage.provides}")
+            stage.state = STAGE_READY
+            stage.error = None
+            logger.info(f'{stage.description} настроена')
+        except Exception as e:
+            stage.state = STAGE_FAILED
+            stage.error = str(e)
+            logger.error(f'Ошибка настройки этапа {stage.name}: {e}')
+        finally:
+            now = time.perf_counter()
+            stage.duration = now - start
+            stage.time_to_ready = now - graph_start
+
+    def get_report(self) -> List[Dict]:
+        """Возвращает состояние этапов в порядке готовности"""
+        report = [{
+            'name': stage.name,
+            'state': stage.state,
+            'runs': stage.runs,
+            'duration': stage.duration,
+            'time_to_ready': stage.time_to_ready,
+            'depends_on': list(stage.depends_on),
+            'error': stage.error
+        } for stage in self.stages.values()]
+        report.sort(key=lambda item: item['time_to_ready'])
+        return report
+
+
+def setup_startup_graph(bot) -> StartupGraph:
+    """Возвращает граф запуска бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'startup_graph'):
+        bot.startup_graph = StartupGraph(bot)
+    return bot.startup_graph
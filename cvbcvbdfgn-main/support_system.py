@@ -19,6 +19,7 @@ from config import (
     SUPPORT_ROLE_ID,
     TICKETS_CATEGORY_ID
 )
+from guild_directory import get_guild_directory
 
 logger = logging.getLogger(__name__)
 
@@ -56,11 +57,8 @@ class TicketModal(discord.ui.Modal, title='Создание тикета тех.
             guild = interaction.guild
             support_role = guild.get_role(SUPPORT_ROLE_ID)
             
-            tickets_category = None
-            for category in guild.categories:
-                if category.name == "🎫 Тикеты поддержки":
-                    tickets_category = category
-                    break
+            directory = get_guild_directory(interaction.client)
+            tickets_category = directory.category(guild, "🎫 Тикеты поддержки")
             
             if not tickets_category:
                 # Создаем категорию для тикетов
@@ -76,6 +74,7 @@ class TicketModal(discord.ui.Modal, title='Создание тикета тех.
                         )
                     }
                 )
+                directory.track(tickets_category)
             
             # Создаем приватный канал для тикета
             ticket_name = f"тикет-{interaction.user.name}-{interaction.id}"[:50]
@@ -0,0 +1,276 @@
+"""
+Планировщик отложенных действий Discord бота
+Все таймеры (снятие мутов, возврат ролей, удаление сообщений) хранятся в одной min-куче
+и обслуживаются одной спящей задачей; сохраняемые таймеры переживают перезапуск бота
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import discord
+
+logger = logging.getLogger('timer_scheduler')
+
+TIMERS_FILE = "scheduled_timers.json"
+SAVE_DELAY = 1.0  # Изменения пишутся на диск пачкой не чаще раза в секунду
+
+
+class TimerHandle:
+    """Запланированный таймер; позволяет отменить или перенести действие"""
+
+    __slots__ = ('scheduler', 'key', 'kind', 'when', 'payload', 'persist', 'cancelled')
+
+    def __init__(self, scheduler, key: str, kind: str, when: float, payload, persist: bool):
+        self.scheduler = scheduler
+        self.key = key
+        self.kind = kind
+        self.when = when
+        self.payload = payload
+        self.persist = persist
+        self.cancelled = False
+
+    def cancel(self) -> bool:
+        """Отменяет таймер"""
+        return self.scheduler.cancel(self.key)
+
+    def reschedule(self, delay: Optional[float] = None, when: Optional[float] = None) -> 'TimerHandle':
+        """Переносит таймер на новое время с тем же ключом и данными"""
+        return self.scheduler.schedule(self.kind, delay=delay, when=when, payload=self.payload,
+                                       key=self.key, persist=self.persist)
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.when - time.time())
+
+
+class TimerScheduler:
+    """Min-куча таймеров с одной спящей задачей"""
+
+    def __init__(self, bot, storage_file: str = TIMERS_FILE):
+        self.bot = bot
+        self.storage_file = storage_file
+        self.handlers: Dict[str, Callable] = {}
+        self.timers: Dict[str, TimerHandle] = {}
+        self.heap: List = []
+        self.parked: Dict[str, List[TimerHandle]] = {}  # Загруженные таймеры, чей обработчик еще не зарегистрирован
+        self.sequence = itertools.count()
+        self.stats = {'scheduled': 0, 'fired': 0, 'cancelled': 0, 'errors': 0}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sleeper: Optional[asyncio.Task] = None
+        self._save_handle = None
+        self._load()
+
+    # --- Регистрация и планирование ---
+
+    def register(self, kind: str, handler: Callable):
+        """Регистрирует корутину-обработчик для таймеров вида kind; обработчик получает payload"""
+        self.handlers[kind] = handler
+        for handle in self.parked.pop(kind, []):
+            if not handle.cancelled:
+                self._push(handle)
+        self._ensure_running()
+
+    def schedule(self, kind: str, delay: Optional[float] = None, when: Optional[float] = None, payload=None,
+                 key: Optional[str] = None, persist: bool = False) -> TimerHandle:
+        """Планирует действие через delay секунд или на момент when (unix-время).
+
+        Таймер с тем же ключом заменяется. Для persist=True payload должен сериализоваться в JSON.
+        """
+        if when is None:
+            when = time.time() + (delay or 0)
+        if key is None:
+            key = f"{kind}:{next(self.sequence)}"
+
+        previous = self.timers.get(key)
+        if previous:
+            previous.cancelled = True
+
+        handle = TimerHandle(self, key, kind, when, payload, persist)
+        self.timers[key] = handle
+        self._push(handle)
+        self.stats['scheduled'] += 1
+        if persist or (previous and previous.persist):
+            self._save_soon()
+        self._ensure_running()
+        return handle
+
+    def cancel(self, key: str) -> bool:
+        """Отменяет таймер по ключу; запись в куче удаляется лениво"""
+        handle = self.timers.pop(key, None)
+        if handle is None:
+            return False
+        handle.cancelled = True
+        self.stats['cancelled'] += 1
+        self._compact()
+        if handle.persist:
+            self._save_soon()
+        return True
+
+    def get(self, key: str) -> Optional[TimerHandle]:
+        return self.timers.get(key)
+
+    def _push(self, handle: TimerHandle):
+        heap_was_empty_or_later = not self.heap or handle.when < self.heap[0][0]
+        heapq.heappush(self.heap, (handle.when, next(self.sequence), handle))
+        self._compact()
+        # Будим спящую задачу, только если новый таймер раньше текущего ближайшего
+        if heap_was_empty_or_later and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _compact(self):
+        """Отмененные записи удаляются лениво; если их накопилось много, куча пересобирается"""
+        if len(self.heap) > 2 * len(self.timers) + 64:
+            self.heap = [entry for entry in self.heap
+                         if not entry[2].cancelled and self.timers.get(entry[2].key) is entry[2]]
+            heapq.heapify(self.heap)
+
+    # --- Спящая задача ---
+
+    def _ensure_running(self):
+        """Запускает спящую задачу, если есть работающий цикл событий"""
+        if self._sleeper is not None and not self._sleeper.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wakeup = asyncio.Event()
+        self._sleeper = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                # Отбрасываем отмененные и замененные записи с вершины кучи
+                while self.heap and (self.heap[0][2].cancelled or self.timers.get(self.heap[0][2].key) is not self.heap[0][2]):
+                    heapq.heappop(self.heap)
+
+                self._wakeup.clear()
+                if not self.heap:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = self.heap[0][0] - time.time()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                _, _, handle = heapq.heappop(self.heap)
+                self._fire(handle)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в планировщике таймеров: {e}")
+                await asyncio.sleep(1)
+
+    def _fire(self, handle: TimerHandle):
+        """Снимает таймер и запускает обработчик отдельной задачей"""
+        if self.timers.get(handle.key) is handle:
+            del self.timers[handle.key]
+        if handle.persist:
+            self._save_soon()
+
+        handler = self.handlers.get(handle.kind)
+        if handler is None:
+            logger.warning(f"Нет обработчика для таймера {handle.kind} ({handle.key}), таймер пропущен")
+            return
+        self.stats['fired'] += 1
+        asyncio.create_task(self._call(handler, handle))
+
+    async def _call(self, handler, handle: TimerHandle):
+        try:
+            await handler(handle.payload)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Ошибка выполнения таймера {handle.key}: {e}")
+
+    # --- Сохранение ---
+
+    def _load(self):
+        """Загружает сохраненные таймеры; до регистрации обработчика они ждут в parked"""
+        if not os.path.exists(self.storage_file):
+            return
+        try:
+            with open(self.storage_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for item in data.get('timers', []):
+                handle = TimerHandle(self, item['key'], item['kind'], item['when'], item.get('payload'), True)
+                self.timers[handle.key] = handle
+                self.parked.setdefault(handle.kind, []).append(handle)
+            logger.info(f"Загружено {len(data.get('timers', []))} сохраненных таймеров")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки таймеров: {e}")
+
+    def _save_soon(self):
+        """Откладывает запись на диск, чтобы пачка изменений дала одну запись"""
+        if self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._save_handle = loop.call_later(SAVE_DELAY, self.save)
+
+    def save(self):
+        """Сохраняет таймеры с persist=True"""
+        self._save_handle = None
+        try:
+            timers = [{
+                'key': handle.key,
+                'kind': handle.kind,
+                'when': handle.when,
+                'payload': handle.payload
+            } for handle in self.timers.values() if handle.persist and not handle.cancelled]
+            temp_file = f"{self.storage_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'timers': timers}, f, ensure_ascii=False)
+            os.replace(temp_file, self.storage_file)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения таймеров: {e}")
+
+    # --- Общие действия ---
+
+    def delete_message_later(self, message, delay: float) -> TimerHandle:
+        """Удаляет сообщение через delay секунд"""
+        return self.schedule('delete_message', delay=delay, key=f"delete_message:{message.id}",
+                             payload={'channel_id': message.channel.id, 'message_id': message.id})
+
+    async def _delete_message(self, payload):
+        channel = self.bot.get_channel(payload['channel_id'])
+        if channel is None:
+            return
+        try:
+            await channel.get_partial_message(payload['message_id']).delete()
+        except (discord.NotFound, discord.Forbidden):
+            pass
+
+    def get_stats(self) -> Dict:
+        next_due = None
+        for when, _, handle in self.heap:
+            if not handle.cancelled and self.timers.get(handle.key) is handle:
+                next_due = when if next_due is None else min(next_due, when)
+        return {
+            'pending': len(self.timers),
+            'heap_size': len(self.heap),
+            'next_in': max(0.0, next_due - time.time()) if next_due is not None else None,
+            **self.stats
+        }
+
+
+def get_timer_scheduler(bot) -> TimerScheduler:
+    """Возвращает планировщик бота, создавая его при первом обращении"""
+    if not hasattr(bot, 'timer_scheduler'):
+        scheduler = TimerScheduler(bot)
+        bot.timer_scheduler = scheduler
+        scheduler.register('delete_message', scheduler._delete_message)
+    return bot.timer_scheduler
@@ -11,6 +11,9 @@ import os
 import random
 from datetime import datetime
 from config import LIMONERICX_SERVER_ID
+from event_bus import PRIORITY_PROTECTION
+from message_router import setup_message_router
+from timer_scheduler import get_timer_scheduler
 
 logger = logging.getLogger('verification')
 
@@ -180,6 +183,28 @@ class BeautifulVerificationSystem:
             correct_button = self.button_colors[correct_sequence[current_step]]
             return False, f"Неверно! Нажали: {wrong_button['name']}, нужно было: {correct_button['name']}"
 
+    async def cleanup_channel_message(self, message):
+        """Очистка канала верификации от лишних сообщений"""
+        try:
+            # Удаляем любые сообщения пользователей в канале верификации
+            await message.delete()
+
+            # Отправляем напоминание о кнопке
+            reminder_embed = discord.Embed(
+                title="🔘 Используйте кнопку",
+                description=f"{message.author.mention}, для верификации нажмите кнопку выше!",
+                color=0xff8c00
+            )
+            reminder = await message.channel.send(embed=reminder_embed)
+            get_timer_scheduler(self.bot).delete_message_later(reminder, 5)
+
+        except Exception as e:
+            logger.error(f"Ошибка при очистке канала верификации: {e}")
+            try:
+                await message.delete()
+            except:
+                pass
+
     async def complete_verification(self, user):
         """Завершение верификации и выдача роли"""
         try:
@@ -445,6 +470,14 @@ async def setup_verification_system(bot):
         verification_system = BeautifulVerificationSystem(bot)
         bot.verification_system = verification_system
 
+        # Сообщения в канале верификации удаляются, вместо них показывается напоминание о кнопке
+        setup_message_router(bot).route(
+            'verification_cleanup',
+            verification_system.cleanup_channel_message,
+            priority=PRIORITY_PROTECTION,
+            channel_ids={verification_system.verification_channel_id}
+        )
+
         verification_channel = bot.get_channel(verification_system.verification_channel_id)
         if not verification_channel:
             logger.error(f"Канал верификации не найден: {verification_system.verification_channel_id}")